@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会話履歴の自動圧縮（要約）をターンの途中で行う場合と、バックグラウンドで行う場合のベンチマーク
+
+token_budgetを小さくしたContextAwareAgent / AsyncContextAwareAgentでモックサーバーと会話し、
+  1. 従来方式（ターンの送信前に要約が終わるまで待つ）
+  2. background_compaction=True（要約中も現在の会話履歴のままターンを続ける）
+の1ターンあたりの所要時間（p50 / p95 / 最大）と、要約の回数、最後の会話履歴のメッセージ数を比較します。
+最後に要約の途中で会話を終了した場合に、要約が取り消されることも確認します。
+
+使い方:
+    python benchmarks/bench_background_compaction.py --turns 60 --latency 0.05 --token-budget 300
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import mock_server
+
+
+def _percentile(values, quantile):
+    values = sorted(values)
+    return values[int(quantile * (len(values) - 1))]
+
+
+def _message(i):
+    return f"質問{i}: 魔法エンジニアリングの原理について、前の回答を踏まえて詳しく説明してください。"
+
+
+def run_sync(turns, **options):
+    from agent import ContextAwareAgent
+    from instrumentation import InMemoryExporter, configure_instrumentation
+
+    exporter = InMemoryExporter()
+    configure_instrumentation(exporter)
+    agent = ContextAwareAgent(model="bench", system_prompt="ベンチマーク", **options)
+    durations = []
+    for i in range(turns):
+        started = time.perf_counter()
+        agent.chat(_message(i))
+        durations.append(time.perf_counter() - started)
+    agent.wait_compaction()
+    configure_instrumentation()
+    compactions = sum(1 for record in exporter.spans if record["name"] == "agent.compact")
+    return durations, compactions, len(agent.conversation_history)
+
+
+def run_async(turns, **options):
+    from async_agent import AsyncContextAwareAgent, close_async_session
+    from instrumentation import InMemoryExporter, configure_instrumentation
+
+    async def main():
+        exporter = InMemoryExporter()
+        configure_instrumentation(exporter)
+        agent = AsyncContextAwareAgent(model="bench", system_prompt="ベンチマーク", **options)
+        durations = []
+        try:
+            for i in range(turns):
+                started = time.perf_counter()
+                await agent.chat(_message(i))
+                durations.append(time.perf_counter() - started)
+            await agent.wait_compaction()
+        finally:
+            configure_instrumentation()
+            await close_async_session()
+        compactions = sum(1 for record in exporter.spans if record["name"] == "agent.compact")
+        return durations, compactions, len(agent.conversation_history)
+
+    return asyncio.run(main())
+
+
+def check_cancel(token_budget):
+    from agent import ContextAwareAgent
+
+    agent = ContextAwareAgent(model="bench", system_prompt="ベンチマーク", token_budget=token_budget,
+                              background_compaction=True)
+    while not agent.compaction_pending:
+        agent.chat(_message(0))
+    before = len(agent.conversation_history)
+    agent.close()
+    return not agent.compaction_pending and agent.summary is None and len(agent.conversation_history) == before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="バックグラウンドでの要約のベンチマーク")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-budget", type=int, default=300)
+    args = parser.parse_args()
+
+    with mock_server(args.latency) as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+        options = {"token_budget": args.token_budget, "keep_recent_turns": 2, "compaction_length": 100}
+        cases = (
+            ("ContextAwareAgent", run_sync, {}),
+            ("  + background_compaction", run_sync, {"background_compaction": True}),
+            ("AsyncContextAwareAgent", run_async, {}),
+            ("  + background_compaction", run_async, {"background_compaction": True}),
+        )
+        print(f"ターン数: {args.turns}、疑似レイテンシ: {args.latency}秒、token_budget: {args.token_budget}")
+        print(f"{'方式':<30}{'p50(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}{'要約回数':>10}{'最終履歴':>10}")
+        for name, run, extra in cases:
+            durations, compactions, history = run(args.turns, **options, **extra)
+            print(f"{name:<30}{_percentile(durations, 0.5) * 1e3:>10.1f}{_percentile(durations, 0.95) * 1e3:>10.1f}"
+                  f"{max(durations) * 1e3:>10.1f}{compactions:>10}{history:>10}")
+
+        print(f"\n要約中に会話を終了した場合の取り消し: {'OK' if check_cancel(args.token_budget) else 'NG'}")
+
+
+if __name__ == "__main__":
+    main()
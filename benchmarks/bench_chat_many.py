@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+独立した多数のプロンプトの一括送信のベンチマーク
+
+モックサーバーに対して、同じプロンプトの一覧を
+  1. 従来方式: プロンプトごとにChatAgentを作成し、chat()を1つずつ呼び出す
+  2. ChatAgent.chat_many()（スレッドで並行送信）
+  3. ChatAgent.chat_many(dedupe=True)（同じプロンプトを1回だけ送信）
+  4. AsyncChatAgent.chat_many()
+で送信し、全体の時間を比較します。--duplicates で重複するプロンプトの割合を指定できます。
+
+使い方:
+    python benchmarks/bench_chat_many.py --prompts 200 --latency 0.1 --duplicates 0.25
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import mock_server
+
+
+def make_prompts(count, duplicates):
+    unique = max(1, int(count * (1 - duplicates)))
+    return [f"評価用プロンプト{index % unique}: 魔法エンジニアリングの原理を説明してください。" for index in range(count)]
+
+
+def run_sequential(prompts):
+    from agent import ChatAgent
+
+    return [ChatAgent(model="bench").chat(prompt) for prompt in prompts]
+
+
+def run_async(prompts, concurrency):
+    from async_agent import AsyncChatAgent, close_async_session
+
+    async def main():
+        try:
+            return await AsyncChatAgent(model="bench").chat_many(prompts, max_concurrency=concurrency)
+        finally:
+            await close_async_session()
+
+    return [result["content"] for result in asyncio.run(main())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一括送信のベンチマーク")
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--duplicates", type=float, default=0.25, help="重複するプロンプトの割合")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with mock_server(args.latency) as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+        from agent import ChatAgent
+        from http_session import configure_session
+        from scheduler import configure_scheduler
+
+        configure_session(pool_maxsize=args.concurrency)
+        configure_scheduler(max_concurrency=args.concurrency)
+        prompts = make_prompts(args.prompts, args.duplicates)
+        agent = ChatAgent(model="bench")
+
+        cases = (
+            ("1件ずつchat()", lambda: run_sequential(prompts)),
+            ("chat_many()", lambda: [r["content"] for r in agent.chat_many(prompts)]),
+            ("chat_many(dedupe=True)", lambda: [r["content"] for r in agent.chat_many(prompts, dedupe=True)]),
+            ("AsyncChatAgent.chat_many()", lambda: run_async(prompts, args.concurrency)),
+        )
+        print(f"プロンプト数: {args.prompts}（重複 {args.duplicates:.0%}）、疑似レイテンシ: {args.latency}秒、"
+              f"同時送信数: {args.concurrency}")
+        print(f"{'方式':<30}{'全体(秒)':>10}{'プロンプト/秒':>16}")
+        expected = None
+        for name, func in cases:
+            started = time.perf_counter()
+            replies = func()
+            elapsed = time.perf_counter() - started
+            expected = expected or replies
+            assert replies == expected
+            print(f"{name:<30}{elapsed:>10.2f}{len(prompts) / elapsed:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
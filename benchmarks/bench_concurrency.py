@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+同時セッション数のベンチマーク
+
+モックサーバーに対して、同じ数の会話セッションを
+  1. スレッド + ChatAgent（従来のブロッキング方式）
+  2. asyncio + AsyncChatAgent
+で実行し、クライアントプロセスのCPU時間あたりに処理できたセッション数を比較します。
+
+使い方:
+    python benchmarks/bench_concurrency.py --sessions 200 --turns 3 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import mock_server
+
+
+def _measure(func):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    # エージェントの送信データ出力を計測から除外する
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    return time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+
+def run_threaded(sessions, turns):
+    from agent import ChatAgent
+    from http_session import configure_session
+    from scheduler import configure_scheduler
+
+    configure_session(pool_maxsize=sessions)
+    configure_scheduler(max_concurrency=sessions)
+
+    def session():
+        agent = ChatAgent()
+        for turn in range(turns):
+            agent.chat(f"ターン{turn}")
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(lambda _: session(), range(sessions)))
+
+
+def run_async(sessions, turns):
+    from async_agent import AsyncChatAgent, close_async_session
+    from http_session import configure_session
+    from scheduler import configure_scheduler
+
+    configure_session(pool_maxsize=sessions)
+    configure_scheduler(max_concurrency=sessions)
+
+    async def session():
+        agent = AsyncChatAgent()
+        for turn in range(turns):
+            await agent.chat(f"ターン{turn}")
+
+    async def main():
+        try:
+            await asyncio.gather(*(session() for _ in range(sessions)))
+        finally:
+            await close_async_session()
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同時セッション数のベンチマーク")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with mock_server(args.latency) as url:
+        # エージェントの送信先をモックサーバーにする
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+        print(f"セッション数: {args.sessions}, ターン数: {args.turns}, 疑似レイテンシ: {args.latency}秒")
+        print(f"{'方式':<10}{'経過(秒)':>10}{'CPU(秒)':>10}{'ターン/秒':>12}{'セッション/CPU秒':>18}")
+        for name, runner in (("threaded", run_threaded), ("asyncio", run_async)):
+            wall, cpu = _measure(lambda: runner(args.sessions, args.turns))
+            turns_per_sec = args.sessions * args.turns / wall
+            sessions_per_core = args.sessions / cpu if cpu else float("inf")
+            print(f"{name:<10}{wall:>10.2f}{cpu:>10.2f}{turns_per_sec:>12.1f}{sessions_per_core:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
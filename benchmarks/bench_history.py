@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会話履歴の表現のベンチマーク（メモリとCPU）
+
+10,000ターン以上の会話履歴について、
+  - 従来の辞書のリスト
+  - History（__slots__付きのMessage、エンコード済みJSONのキャッシュ付き）
+の
+  1. メモリ使用量（tracemalloc）
+  2. リクエストのJSONエンコード時間（毎ターン送信する処理に相当）
+  3. 要約用の会話テキストの作成時間（文字列の連結 vs 1回のjoin）
+を比較します。
+
+使い方:
+    python benchmarks/bench_history.py --turns 10000 --repeat 20
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from agent import ContextAwareAgent
+from history import History, Message
+
+
+def make_contents(turns):
+    # 実際の会話に近いよう、メッセージごとに別の文字列を作る
+    return [
+        (f"質問{i}: 魔法エンジニアリングの{i}番目の原理について教えてください。",
+         f"回答{i}: {i}番目の原理は、魔力の流れを回路のように設計することです。" * 2)
+        for i in range(turns)
+    ]
+
+
+def build_dicts(contents):
+    history = [{"role": "system", "content": "あなたは講師です。"}]
+    for question, answer in contents:
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+    return history
+
+
+def build_history(contents):
+    history = History([Message("system", "あなたは講師です。")])
+    for question, answer in contents:
+        history.append(Message("user", question))
+        history.append(Message("assistant", answer))
+    return history
+
+
+def measure_memory(builder, contents, encode=False):
+    gc.collect()
+    tracemalloc.start()
+    history = builder(contents)
+    if encode:
+        history.encode()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, history
+
+
+def encode_legacy(history):
+    request_data = {"model": "bench", "messages": history}
+    return json.dumps(request_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def render_legacy(messages):
+    # 変更前のContextAwareAgent._render_transcriptと同じ処理
+    conversation_text = ""
+    for message in messages:
+        role = "ユーザー" if message["role"] == "user" else "AI"
+        content = message["content"]
+        if (role == "ユーザー" and content.startswith(ContextAwareAgent.SUMMARY_PREFIX)
+                and ContextAwareAgent.MESSAGE_PREFIX in content):
+            content = content.split(ContextAwareAgent.MESSAGE_PREFIX, 1)[1]
+        conversation_text += f"{role}: {content}\n\n"
+    return conversation_text
+
+
+def _best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会話履歴の表現のベンチマーク")
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    contents = make_contents(args.turns)
+    # 文字列本体は両方式で共有されるため、計測対象はメッセージの入れ物だけになる
+    dict_memory, dicts = measure_memory(build_dicts, contents)
+    history_memory, history = measure_memory(build_history, contents)
+    encoded_memory, _ = measure_memory(build_history, contents, encode=True)
+
+    print(f"ターン数: {args.turns}（メッセージ数 {len(dicts)}）")
+    print("メモリ（メッセージの入れ物、内容の文字列を除く）")
+    print(f"  {'辞書のリスト':<28}{dict_memory / 1024:>10.0f} KiB")
+    print(f"  {'History':<28}{history_memory / 1024:>10.0f} KiB")
+    print(f"  {'History（エンコード済みJSONを含む）':<28}{encoded_memory / 1024:>10.0f} KiB")
+
+    agent = ContextAwareAgent(model="bench")
+    agent.conversation_history = history
+    history.encode()  # 2回目以降の送信を想定して、各メッセージのJSONをキャッシュしておく
+
+    rows = (
+        ("リクエストのエンコード", lambda: encode_legacy(dicts),
+         lambda: agent._encode_request(agent._build_request_data())),
+        ("会話テキストの作成", lambda: render_legacy(dicts[1:]),
+         lambda: agent._render_transcript(history[1:])),
+    )
+    print(f"CPU（{args.repeat}回中の最短）")
+    print(f"  {'処理':<20}{'従来(ms)':>12}{'History(ms)':>14}{'倍率':>8}")
+    for name, legacy, current in rows:
+        legacy_time = _best_of(legacy, args.repeat)
+        current_time = _best_of(current, args.repeat)
+        print(f"  {name:<20}{legacy_time * 1000:>12.2f}{current_time * 1000:>14.2f}"
+              f"{legacy_time / current_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
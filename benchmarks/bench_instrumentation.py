@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+計測（instrumentation）のオーバーヘッドのベンチマーク
+
+  1. spanを1回作成して抜けるまでの時間（無効 / InMemoryExporter / PrometheusExporter）
+  2. モックサーバーに対するChatAgent.chatの1ターンあたりの時間（計測の無効 / 有効）
+を表示し、計測を有効にしたときの1ターンの内訳（スパンごとの平均時間とトークン数）を表示します。
+
+使い方:
+    python benchmarks/bench_instrumentation.py --turns 200 --number 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from instrumentation import InMemoryExporter, PrometheusExporter, configure_instrumentation, span
+from mock_openrouter import mock_server
+
+
+def _span_cost(number):
+    def run():
+        with span("bench", model="m") as current:
+            current.set(prompt_tokens=1)
+    return min(timeit.repeat(run, number=number, repeat=3)) / number
+
+
+def _turn_cost(turns):
+    from agent import ChatAgent
+
+    agent = ChatAgent(model="bench")
+    started = time.perf_counter()
+    for i in range(turns):
+        agent.chat(f"質問{i}")
+        agent.reset_conversation()
+    return (time.perf_counter() - started) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="計測のオーバーヘッドのベンチマーク")
+    parser.add_argument("--number", type=int, default=200000, help="spanの計測回数")
+    parser.add_argument("--turns", type=int, default=200, help="モックサーバーに送信するターン数")
+    args = parser.parse_args()
+
+    print(f"{'spanの作成':<28}{'1回あたり(µs)':>16}")
+    for name, exporters in (("無効", ()), ("InMemoryExporter", (InMemoryExporter(max_spans=1000),)),
+                            ("PrometheusExporter", (PrometheusExporter(),))):
+        configure_instrumentation(*exporters)
+        print(f"  {name:<26}{_span_cost(args.number) * 1e6:>16.3f}")
+
+    with mock_server() as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+        configure_instrumentation()
+        _turn_cost(10)  # ウォームアップ（接続の確立）
+        disabled = _turn_cost(args.turns)
+        exporter = InMemoryExporter()
+        configure_instrumentation(exporter, PrometheusExporter())
+        enabled = _turn_cost(args.turns)
+        configure_instrumentation()
+
+    print(f"\nChatAgent.chatの1ターン（モックサーバー、{args.turns}ターン）")
+    print(f"  {'計測なし':<26}{disabled * 1e3:>12.3f} ms")
+    print(f"  {'計測あり':<26}{enabled * 1e3:>12.3f} ms  ({(enabled - disabled) * 1e6:+.1f} µs)")
+
+    print("\nスパンごとの内訳（計測あり）")
+    print(f"  {'スパン':<20}{'回数':>8}{'平均(ms)':>12}{'p95(ms)':>12}{'prompt':>10}{'completion':>12}")
+    for name, stats in exporter.summary().items():
+        print(f"  {name:<20}{stats['count']:>8}{stats['avg'] * 1e3:>12.3f}{stats['p95'] * 1e3:>12.3f}"
+              f"{stats['prompt_tokens']:>10}{stats['completion_tokens']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ModelRouter（用途ごとのモデル、フォールバック、ヘッジング）のベンチマーク
+
+モックサーバーに対して
+  1. フォールバック: 常にエラーを返すモデルを最初の候補にした場合の成功率（ルーターなし / フォールバックあり）
+  2. ヘッジング: 一定の割合で遅い応答を返す状態での1ターンの所要時間（p50 / p95 / p99）と、追加で送信したリクエストの割合
+     （ヘッジングなし / ChatAgent / AsyncChatAgent）と、中止できずに届いて使わなかった応答のトークン数
+  3. 用途ごとのモデル: 要約（cleanup）とツール結果を送るターンが、それぞれのモデルに送信されていること
+を確認します。
+
+使い方:
+    python benchmarks/bench_model_router.py --turns 300 --latency 0.02 --slow-rate 0.05 --slow-latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import STATS_PATH, COMPLETIONS_PATH, mock_server
+
+
+def _percentile(values, quantile):
+    values = sorted(values)
+    return values[int(quantile * (len(values) - 1))]
+
+
+def _server_stats(url):
+    with urllib.request.urlopen(url.replace(COMPLETIONS_PATH, STATS_PATH)) as response:
+        return json.loads(response.read())
+
+
+def run_fallback(turns):
+    from agent import ChatAgent
+    from model_router import ModelRouter
+
+    results = {}
+    for name, router in (("ルーターなし", None),
+                         ("フォールバックあり", ModelRouter(chat="broken", fallbacks=["primary"]))):
+        agent = ChatAgent(model="broken", router=router)
+        ok = 0
+        for i in range(turns):
+            ok += not agent.chat(f"質問{i}").startswith("エラー")
+            agent.reset_conversation()
+        results[name] = ok / turns
+    return results
+
+
+def run_sync(turns, router):
+    from agent import ChatAgent
+
+    agent = ChatAgent(model="primary", router=router)
+    durations = []
+    for i in range(turns):
+        started = time.perf_counter()
+        agent.chat(f"質問{i}")
+        durations.append(time.perf_counter() - started)
+        agent.reset_conversation()
+    return durations
+
+
+def run_async(turns, router):
+    from async_agent import AsyncChatAgent, close_async_session
+
+    async def main():
+        agent = AsyncChatAgent(model="primary", router=router)
+        durations = []
+        try:
+            for i in range(turns):
+                started = time.perf_counter()
+                await agent.chat(f"質問{i}")
+                durations.append(time.perf_counter() - started)
+                agent.reset_conversation()
+        finally:
+            await close_async_session()
+        return durations
+
+    return asyncio.run(main())
+
+
+def run_purposes(url):
+    from agent import ContextAwareAgent
+    from model_router import PURPOSE_TOOL, ModelRouter
+
+    router = ModelRouter(chat="chat-model", summary="summary-model", tool="tool-model")
+    before = _server_stats(url)["models"]
+    agent = ContextAwareAgent(system_prompt="ベンチマーク", router=router)
+    agent.chat("こんにちは")
+    agent.purpose = PURPOSE_TOOL
+    agent.chat("<myname_result>結果</myname_result>")
+    agent.cleanup(50)
+    after = _server_stats(url)["models"]
+    return {model: after.get(model, 0) - before.get(model, 0) for model in ("chat-model", "summary-model", "tool-model")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ModelRouterのベンチマーク")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="遅い応答を返す割合")
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="遅い応答で追加する待ち時間（秒）")
+    args = parser.parse_args()
+
+    with mock_server(args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                     failing_models=("broken",), seed=1) as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+        from http_session import configure_session
+        from model_router import ModelRouter
+
+        # エラー時のリトライ（バックオフ）を待たずに、次の候補モデルを試す
+        configure_session(max_retries=0)
+
+        print("フォールバック（最初の候補のモデルが常にエラーを返す場合の成功率）")
+        for name, rate in run_fallback(20).items():
+            print(f"  {name:<24}{rate:>8.0%}")
+
+        print(f"\nヘッジング（疑似レイテンシ {args.latency}秒、{args.slow_rate:.0%}の応答に +{args.slow_latency}秒、"
+              f"{args.turns}ターン）")
+        print(f"  {'方式':<30}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'追加送信':>10}{'破棄トークン':>10}")
+        cases = (
+            ("ヘッジングなし", run_sync, None),
+            ("ChatAgent + hedge", run_sync, ModelRouter(chat="primary", fallbacks=["backup"], hedge=True)),
+            ("AsyncChatAgent + hedge", run_async, ModelRouter(chat="primary", fallbacks=["backup"], hedge=True)),
+        )
+        for name, run, router in cases:
+            durations = run(args.turns, router)
+            stats = router.stats() if router else {"hedges": 0, "hedge_discarded_tokens": 0}
+            extra = stats["hedges"] / args.turns
+            print(f"  {name:<30}{_percentile(durations, 0.5) * 1e3:>10.1f}{_percentile(durations, 0.95) * 1e3:>10.1f}"
+                  f"{_percentile(durations, 0.99) * 1e3:>10.1f}{max(durations) * 1e3:>10.1f}{extra:>10.1%}"
+                  f"{stats['hedge_discarded_tokens']:>10}")
+            if router:
+                router.close()
+
+        print("\n用途ごとのモデル（モデルごとのリクエスト数）")
+        for model, count in run_purposes(url).items():
+            print(f"  {model:<24}{count:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+プロンプトキャッシュ（システムプロンプトとツール一覧へのcache_control）のベンチマーク
+
+Managerと同じシステムプロンプト（ツール一覧を含む）を使い、モックサーバーに対して
+  1. プロンプトキャッシュなし
+  2. prompt_caching=True
+  3. prompt_caching=True, cache_summary=True（要約をシステムプロンプトの後ろに置く）
+でストリーミングの会話を行い、最初のトークンまでの時間と、キャッシュされた / されていない入力トークン数を比較します。
+モックサーバーは、キャッシュされていない入力トークン1つあたり --prompt-token-latency 秒だけ待ってから応答します。
+
+使い方:
+    python benchmarks/bench_prompt_cache.py --turns 20 --prompt-token-latency 0.00002
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from instrumentation import InMemoryExporter, configure_instrumentation
+from mock_openrouter import mock_server
+
+SUMMARY = "ユーザーはプロンプトキャッシュの効果を確認しており、AIはシステムプロンプトの扱いを説明した。" * 10
+
+
+def run_case(system_prompt, turns, **options):
+    from agent import ContextAwareAgent
+
+    exporter = InMemoryExporter()
+    configure_instrumentation(exporter)
+    agent = ContextAwareAgent(model="bench", system_prompt=system_prompt, **options)
+    if options.get("cache_summary"):
+        agent.summary = SUMMARY
+        agent.reset_conversation()
+    for i in range(turns):
+        for _ in agent.chat_stream(f"質問{i}: ツールの使い方を教えてください。"):
+            pass
+    configure_instrumentation()
+
+    requests = [record for record in exporter.spans if record["name"] == "agent.request"]
+    first_tokens = [record["attributes"]["first_token"] for record in requests]
+    totals = exporter.summary()["agent.request"]
+    return (sum(first_tokens) / len(first_tokens), totals["prompt_tokens"],
+            totals["cached_prompt_tokens"], totals["uncached_prompt_tokens"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="プロンプトキャッシュのベンチマーク")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.00002,
+                        help="キャッシュされていない入力トークン1つあたりの待ち時間（秒）")
+    args = parser.parse_args()
+
+    from manager import Manager
+
+    system_prompt = Manager().system_prompt
+    # 別のManagerでも、送信するシステムメッセージは同じバイト列になる
+    first, second = Manager(prompt_caching=True), Manager(prompt_caching=True)
+    assert first.agent.conversation_history[0].encode() == second.agent.conversation_history[0].encode()
+
+    with mock_server(args.latency, prompt_token_latency=args.prompt_token_latency) as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+        cases = (
+            ("キャッシュなし", {}),
+            ("prompt_caching", {"prompt_caching": True}),
+            ("prompt_caching + cache_summary", {"prompt_caching": True, "cache_summary": True}),
+        )
+        print(f"システムプロンプト: {len(system_prompt)}文字、ターン数: {args.turns}、"
+              f"疑似レイテンシ: {args.latency}秒 + {args.prompt_token_latency}秒/入力トークン")
+        print(f"{'方式':<34}{'最初のトークン(ms)':>20}{'入力':>10}{'キャッシュ':>12}{'キャッシュ外':>12}")
+        for name, options in cases:
+            first_token, prompt, cached, uncached = run_case(system_prompt, args.turns, **options)
+            print(f"{name:<34}{first_token * 1e3:>20.1f}{prompt:>10}{cached:>12}{uncached:>12}")
+
+
+if __name__ == "__main__":
+    main()
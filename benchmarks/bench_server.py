@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+HTTPサーバー（agent_server.py）の負荷テスト
+
+モックサーバーと、それを使うagent_server.pyを別プロセスで起動し、
+  1. --sessions 個の会話を同時に作成し、それぞれ --turns ターンの会話をServer-Sent Eventsで行う
+     （--ask-every ターンごとにask_userを呼び出させ、会話ごとに異なる回答を送る）
+  2. ask_userの回答が、問い合わせた会話の応答にだけ反映されていることを確認する
+  3. 会話を放置し、idle_timeout後に自動で終了されることを確認する
+を行い、1ターンの所要時間（p50 / p99）とスループットを表示します。
+
+使い方:
+    python benchmarks/bench_server.py --sessions 200 --turns 5 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import _free_port, mock_server
+
+
+def _percentile(values, quantile):
+    values = sorted(values)
+    return values[int(quantile * (len(values) - 1))]
+
+
+def start_server(port, api_url, idle_timeout, sweep_interval, max_concurrency):
+    env = dict(os.environ, OPENROUTER_API_URL=api_url)
+    env.setdefault("OPENROUTER_API_KEY", "benchmark")
+    process = subprocess.Popen(
+        [sys.executable, str(current_dir.parent / "scripts" / "agent_server.py"), "--port", str(port),
+         "--model", "bench", "--idle-timeout", str(idle_timeout), "--sweep-interval", str(sweep_interval),
+         "--max-sessions", "100000", "--max-concurrency", str(max_concurrency)],
+        env=env,
+    )
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return process
+
+
+async def _events(response):
+    async for line in response.content:
+        line = line.decode("utf-8").strip()
+        if line.startswith("data: "):
+            yield json.loads(line[6:])
+
+
+async def run_session(client, base, index, turns, ask_every, durations):
+    """
+    1つの会話でturnsターンのやり取りを行う関数
+
+    Returns:
+        int: ask_userの回答が正しく反映されなかったターンの数
+    """
+    async with client.post(f"{base}/sessions") as response:
+        session_id = (await response.json())["session_id"]
+    answer = f"answer-{index}"
+    mismatches = 0
+    for turn in range(turns):
+        asks = ask_every and turn % ask_every == ask_every - 1
+        message = f"会話{index}の質問{turn}" + (" [[tool:ask_user]]" if asks else "")
+        started = time.perf_counter()
+        done = None
+        async with client.post(f"{base}/sessions/{session_id}/messages", json={"message": message}) as response:
+            async for event in _events(response):
+                if event["type"] == "ask":
+                    async with client.post(f"{base}/sessions/{session_id}/answer", json={"answer": answer}):
+                        pass
+                elif event["type"] in ("done", "error"):
+                    done = event
+        durations.append(time.perf_counter() - started)
+        if done is None or done["type"] != "done" or (asks and f"<ask_user_result>{answer}<" not in done["response"]):
+            mismatches += 1
+    return mismatches
+
+
+async def load_test(base, sessions, turns, ask_every):
+    durations = []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None)) as client:
+        started = time.perf_counter()
+        mismatches = await asyncio.gather(*(
+            run_session(client, base, index, turns, ask_every, durations) for index in range(sessions)
+        ))
+        elapsed = time.perf_counter() - started
+        async with client.get(f"{base}/stats") as response:
+            stats = await response.json()
+    return durations, elapsed, sum(mismatches), stats
+
+
+async def wait_eviction(base, timeout):
+    async with aiohttp.ClientSession() as client:
+        deadline = time.perf_counter() + timeout
+        while True:
+            async with client.get(f"{base}/stats") as response:
+                stats = await response.json()
+            if not stats["sessions"] or time.perf_counter() > deadline:
+                return stats
+            await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTPサーバーの負荷テスト")
+    parser.add_argument("--sessions", type=int, default=200, help="同時に会話するクライアントの数")
+    parser.add_argument("--turns", type=int, default=5, help="会話ごとのターン数")
+    parser.add_argument("--ask-every", type=int, default=3, help="ask_userを呼び出させるターンの間隔（0で無効）")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--idle-timeout", type=float, default=1.0)
+    parser.add_argument("--max-concurrency", type=int, default=256, help="サーバーがAPIに同時に送信するリクエスト数の上限")
+    args = parser.parse_args()
+
+    with mock_server(args.latency) as url:
+        port = _free_port()
+        server = start_server(port, url, args.idle_timeout, 0.2, args.max_concurrency)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            durations, elapsed, mismatches, stats = asyncio.run(
+                load_test(base, args.sessions, args.turns, args.ask_every)
+            )
+            print(f"会話数: {args.sessions}、会話ごとのターン数: {args.turns}、疑似レイテンシ: {args.latency}秒、"
+                  f"同時送信数: {args.max_concurrency}")
+            print(f"{'ターン数':<20}{len(durations):>10}")
+            print(f"{'全体(秒)':<20}{elapsed:>10.2f}")
+            print(f"{'ターン/秒':<20}{len(durations) / elapsed:>10.1f}")
+            print(f"{'p50(ms)':<20}{_percentile(durations, 0.5) * 1e3:>10.1f}")
+            print(f"{'p99(ms)':<20}{_percentile(durations, 0.99) * 1e3:>10.1f}")
+            print(f"{'最大(ms)':<20}{max(durations) * 1e3:>10.1f}")
+            print(f"{'サーバーのp99(ms)':<20}{stats['p99'] * 1e3:>10.1f}")
+            print(f"\nask_userの回答の振り分け: {'OK' if not mismatches else f'NG（{mismatches}ターン）'}")
+
+            evicted = asyncio.run(wait_eviction(base, args.idle_timeout + 5))
+            print(f"使われていない会話の自動終了: {'OK' if not evicted['sessions'] else 'NG'}"
+                  f"（{evicted['evicted']}件）")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
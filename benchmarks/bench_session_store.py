@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+セッションストアの追記と再開のベンチマーク
+
+  1. 追記: メッセージを1件ずつ追記（1件ごとにコミット）したときの件数/秒
+  2. 再開: 多数のセッションが保存されたストアから1つのセッションを再開する時間を
+     - SessionStore.load（最新の要約 + それ以降のメッセージ）
+     - 全メッセージの読み直し（SessionStore.iter_messages）
+     - JSONLのログ全体を読み込んで該当セッションを抽出（従来のファイル方式）
+     で比較します
+
+使い方:
+    python benchmarks/bench_session_store.py --sessions 100 --messages 2000 --summary-every 50
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from session_store import SessionStore
+
+CONTENT = "魔法エンジニアリングについての発言です。" * 5
+
+
+def _best_of(func, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="セッションストアの追記と再開のベンチマーク")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=2000, help="1セッションあたりのメッセージ数")
+    parser.add_argument("--summary-every", type=int, default=50, help="要約を保存する間隔（メッセージ数）")
+    parser.add_argument("--append-count", type=int, default=5000, help="追記速度の計測に使うメッセージ数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 1. 追記（1件ずつコミット）
+        store = SessionStore(tmp / "append.db")
+        store.open_session("append")
+        started = time.perf_counter()
+        for i in range(args.append_count):
+            store.append("append", "user" if i % 2 == 0 else "assistant", CONTENT)
+        elapsed = time.perf_counter() - started
+        store.close()
+        print(f"追記: {args.append_count}件 {elapsed:.2f}秒 ({args.append_count / elapsed:,.0f}件/秒, "
+              f"{elapsed / args.append_count * 1e6:.0f}µs/件)")
+
+        # 2. 再開用のデータを作成（ストアとJSONLの両方）
+        store = SessionStore(tmp / "sessions.db")
+        jsonl_path = tmp / "sessions.jsonl"
+        with open(jsonl_path, "w", encoding="utf-8") as jsonl:
+            for s in range(args.sessions):
+                session_id = f"session-{s}"
+                store.open_session(session_id)
+                batch = []
+                for i in range(args.messages):
+                    role = "user" if i % 2 == 0 else "assistant"
+                    batch.append((role, CONTENT))
+                    jsonl.write(json.dumps({"session_id": session_id, "role": role, "content": CONTENT},
+                                           ensure_ascii=False) + "\n")
+                store.append_many(session_id, batch)
+                for upto in range(args.summary_every, args.messages, args.summary_every):
+                    store.save_summary(session_id, f"{upto}件目までの要約", upto - 4)
+        total = args.sessions * args.messages
+        print(f"再開: {args.sessions}セッション × {args.messages}件 = {total:,}件のうち1セッションを再開")
+
+        target = f"session-{args.sessions // 2}"
+
+        def replay_jsonl():
+            messages = []
+            with open(jsonl_path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["session_id"] == target:
+                        messages.append({"role": record["role"], "content": record["content"]})
+            return messages
+
+        rows = (
+            ("store.load", lambda: store.load(target)[1]),
+            ("store全件読み直し", lambda: list(store.iter_messages(target))),
+            ("JSONL全体を読み込み", replay_jsonl),
+        )
+        print(f"{'方式':<20}{'時間(ms)':>12}{'読み込んだ件数':>16}")
+        for name, func in rows:
+            elapsed, messages = _best_of(func, repeat=3 if name.startswith("JSONL") else 5)
+            print(f"{name:<20}{elapsed * 1000:>12.2f}{len(messages):>16}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会話シミュレーションのスループットのベンチマーク
+
+モックサーバーに対して、同じ数の2者会話を
+  1. magic_conversation.py と同じ方式（1会話ずつ順番に、ContextAwareAgentで実行。待機なし）
+  2. SimulationRunner（asyncioで同時実行）
+で実行し、1分あたりに完了した会話数を比較します。
+
+使い方:
+    python benchmarks/bench_simulation.py --conversations 100 --turns 6 --latency 0.05 --concurrency 1 16 64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import mock_server
+
+
+def make_scenarios(count, turns):
+    from simulation import Scenario
+
+    roles = [
+        {"name": "中学生", "system_prompt": "あなたは好奇心旺盛な中学生です。"},
+        {"name": "先生", "system_prompt": "あなたは市民向け科学講座の講師です。"},
+    ]
+    return [
+        Scenario(f"bench-{i}", roles, f"質問{i}: 魔法エンジニアリングって何ですか？", max_turns=turns)
+        for i in range(count)
+    ]
+
+
+def run_sequential(scenarios):
+    from agent import ContextAwareAgent
+
+    for scenario in scenarios:
+        agents = [ContextAwareAgent(scenario.model, role["system_prompt"]) for role in scenario.roles]
+        speaker = 0
+        message = scenario.opening_line
+        for _ in range(scenario.max_turns):
+            speaker = 1 - speaker
+            message, ended = scenario.split_end_tag(agents[speaker].chat(message))
+            if ended:
+                break
+
+
+def run_concurrent(scenarios, concurrency, rps, output_path):
+    from simulation import run_simulations
+
+    return run_simulations(scenarios, output_path, concurrency=concurrency, requests_per_second=rps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会話シミュレーションのスループットのベンチマーク")
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--rps", type=float, default=None, help="全体でのAPIリクエストの上限（毎秒）")
+    args = parser.parse_args()
+
+    with mock_server(args.latency) as url, tempfile.TemporaryDirectory() as tmp:
+        # エージェントの送信先をモックサーバーにする
+        os.environ["OPENROUTER_API_URL"] = url
+        os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+        from http_session import configure_session
+        from scheduler import configure_scheduler
+
+        configure_session(pool_maxsize=max(args.concurrency))
+        configure_scheduler(max_concurrency=max(args.concurrency))
+        scenarios = make_scenarios(args.conversations, args.turns)
+
+        print(f"会話数: {args.conversations}, ターン数: {args.turns}, 疑似レイテンシ: {args.latency}秒, "
+              f"レート制限: {args.rps or 'なし'}")
+        print(f"{'方式':<16}{'経過(秒)':>10}{'会話/分':>12}{'ターン/秒':>12}")
+
+        started = time.perf_counter()
+        run_sequential(scenarios)
+        wall = time.perf_counter() - started
+        total_turns = args.conversations * args.turns
+        print(f"{'sequential':<16}{wall:>10.2f}{args.conversations / wall * 60:>12.1f}{total_turns / wall:>12.1f}")
+
+        for concurrency in args.concurrency:
+            output_path = Path(tmp) / f"transcripts-{concurrency}.jsonl"
+            stats = run_concurrent(scenarios, concurrency, args.rps, output_path)
+            name = f"async x{concurrency}"
+            print(f"{name:<16}{stats['elapsed']:>10.2f}{stats['conversations_per_minute']:>12.1f}"
+                  f"{stats['turns'] / stats['elapsed']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
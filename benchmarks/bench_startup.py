@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+起動時間のベンチマーク
+
+scriptsのエントリポイントとなるモジュールを新しいPythonプロセスで `-X importtime` 付きでインポートし、
+  1. インポート時間（importtimeの累積時間の中央値）
+  2. インポートしただけで読み込まれてしまった重い依存ライブラリ（requests, dotenv, aiohttpなど）
+  3. Managerを作成するまでの時間（プロセス起動を含む）
+を表示します。
+
+--check を付けると、インポート時に重い依存ライブラリが読み込まれた場合や、
+--baseline で指定した基準値より遅くなった場合に終了コード1で終了します（回帰の検出用）。
+
+使い方:
+    python benchmarks/bench_startup.py --runs 7
+    python benchmarks/bench_startup.py --save-baseline benchmarks/startup_baseline.json
+    python benchmarks/bench_startup.py --baseline benchmarks/startup_baseline.json --check
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+scripts_dir = current_dir.parent / "scripts"
+
+# インポート時間を計測するモジュール
+MODULES = ("agent", "manager", "async_agent", "async_manager", "simulation", "tool_router")
+
+# インポートしただけでは読み込まれてはいけないライブラリ（最初のAPI呼び出しで読み込む）
+LAZY_DEPENDENCIES = ("requests", "urllib3", "dotenv", "aiohttp")
+
+
+def _run_python(code, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", f"import sys; sys.path.insert(0, {str(scripts_dir)!r}); {code}"]
+    started = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result
+
+
+def measure_import(module, runs):
+    """
+    モジュールのインポート時間（マイクロ秒、中央値）と、読み込まれた重い依存ライブラリを返す関数
+    """
+    times = []
+    loaded = []
+    check = f"print([m for m in {LAZY_DEPENDENCIES!r} if m in sys.modules])"
+    for _ in range(runs):
+        _, result = _run_python(f"import {module}; {check}", importtime=True)
+        # importtimeの出力は "import time: self | cumulative | モジュール名" の形式
+        for line in result.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].rstrip() == f" {module}":
+                times.append(int(parts[1]))
+        loaded = json.loads(result.stdout.strip().replace("'", '"'))
+    return statistics.median(times), loaded
+
+
+def measure_manager_startup(runs):
+    """
+    プロセスを起動してManagerを作成するまでの時間（ミリ秒、中央値）を返す関数
+    """
+    times = [_run_python("import manager; manager.Manager()")[0] for _ in range(runs)]
+    baseline = [_run_python("pass")[0] for _ in range(runs)]
+    return statistics.median(times) * 1000, statistics.median(baseline) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--baseline", help="比較する基準値のJSONファイル")
+    parser.add_argument("--save-baseline", help="今回の結果を基準値として保存するJSONファイル")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="基準値に対して許容する倍率")
+    parser.add_argument("--check", action="store_true", help="回帰があれば終了コード1で終了する")
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    results = {}
+    failures = []
+
+    print(f"{'モジュール':<16}{'インポート(ms)':>16}{'基準(ms)':>12}  読み込まれた重い依存")
+    for module in MODULES:
+        microseconds, loaded = measure_import(module, args.runs)
+        results[module] = microseconds
+        reference = baseline.get(module)
+        print(f"{module:<16}{microseconds / 1000:>16.1f}"
+              f"{(f'{reference / 1000:.1f}' if reference else '-'):>12}  {', '.join(loaded) or 'なし'}")
+        if loaded:
+            failures.append(f"{module} のインポートで {', '.join(loaded)} が読み込まれました")
+        if reference and microseconds > reference * args.tolerance:
+            failures.append(f"{module} のインポート時間が基準値の{microseconds / reference:.1f}倍です")
+
+    startup, interpreter = measure_manager_startup(args.runs)
+    results["manager_startup_ms"] = startup
+    print(f"\nManager作成までの時間（プロセス起動を含む）: {startup:.1f}ms（Pythonの起動のみ: {interpreter:.1f}ms）")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"基準値を {args.save_baseline} に保存しました。")
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+モックサーバーを使ったエンドツーエンドのベンチマークスイート
+
+本物のAPIを呼ばずに、次のシナリオを実行して指標を表示します。
+  chat        ChatAgent.chat を順番に実行（ターン/秒、p50/p99）
+  stream      ChatAgent.chat_stream を順番に実行（最初の差分までの時間と1ターンのp50/p99）
+  async       AsyncChatAgent の会話を同時に実行（ターン/秒、p50/p99）
+  manager     ツールタグを含む応答を返すManagerのターン（p50/p99、ツール呼び出し1回あたりのディスパッチ時間）
+  errors      一定の割合でHTTPエラーを返すサーバーに対するChatAgent.chat（リトライ込みの成功率とp99）
+  memory      ContextAwareAgent の会話セッション1つあたりのメモリ（tracemalloc）
+  simulation  SimulationRunner による2者会話（会話/分）
+
+--save-baseline で結果を保存し、--baseline で保存した基準値と比較します。
+--check を付けると、基準値より --tolerance 倍以上悪化した指標がある場合に終了コード1で終了します（回帰の検出用）。
+
+計測のぶれで判定が変わらないよう、各シナリオを --repeat 回実行して指標ごとに中央値を使い、
+判定には中央値・逐次実行のスループット・メモリ・成功率だけを使います（p99や同時実行の指標は表示のみ）。
+時間の指標はマシンに依存するため、--check は同じマシンで保存した基準値と比較してください。
+
+使い方:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --only chat manager --turns 500
+    python benchmarks/bench_suite.py --save-baseline benchmarks/suite_baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/suite_baseline.json --check
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from mock_openrouter import mock_server
+
+# 指標ごとの単位、値が大きい方が良いか、回帰の判定に使うか
+# （p99は少ないサンプルではぶれが大きく、同時実行の指標はスケジューリングに左右されるため表示のみ）
+METRICS = {
+    "chat.turns_per_sec": ("ターン/秒", True, True),
+    "chat.p50_ms": ("ms", False, True),
+    "chat.p99_ms": ("ms", False, False),
+    "stream.first_token_p50_ms": ("ms", False, True),
+    "stream.p50_ms": ("ms", False, True),
+    "stream.p99_ms": ("ms", False, False),
+    "async.turns_per_sec": ("ターン/秒", True, False),
+    "async.p50_ms": ("ms", False, False),
+    "async.p99_ms": ("ms", False, False),
+    "manager.p50_ms": ("ms", False, True),
+    "manager.p99_ms": ("ms", False, False),
+    "manager.dispatch_us": ("µs/ツール", False, True),
+    "errors.success_rate": ("%", True, True),
+    "errors.p99_ms": ("ms", False, False),
+    "memory.session_kib": ("KiB/セッション", False, True),
+    "simulation.conversations_per_min": ("会話/分", True, False),
+}
+
+SCENARIOS = ("chat", "stream", "async", "manager", "errors", "memory", "simulation")
+
+
+def percentile(values, fraction):
+    """
+    値のリストの百分位数を返す関数（最も近い順位の値）
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _latency_metrics(prefix, latencies, elapsed=None):
+    metrics = {
+        f"{prefix}.p50_ms": percentile(latencies, 0.50) * 1e3,
+        f"{prefix}.p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+    if elapsed is not None:
+        metrics[f"{prefix}.turns_per_sec"] = len(latencies) / elapsed
+    return metrics
+
+
+@contextlib.contextmanager
+def _server(args, **options):
+    """
+    モックサーバーを起動し、エージェントの送信先をそのサーバーにするコンテキストマネージャ
+    """
+    with mock_server(args.latency, **options) as url:
+        os.environ["OPENROUTER_API_URL"] = url
+        yield url
+
+
+def bench_chat(args):
+    from agent import ChatAgent
+
+    with _server(args):
+        agent = ChatAgent(model="bench")
+        agent.chat("ウォームアップ")
+        latencies = []
+        started = time.perf_counter()
+        for turn in range(args.turns):
+            # 会話履歴が伸び続けないよう、10ターンごとに新しい会話にする
+            if turn % 10 == 0:
+                agent.reset_conversation()
+            turn_started = time.perf_counter()
+            agent.chat(f"ターン{turn}")
+            latencies.append(time.perf_counter() - turn_started)
+        elapsed = time.perf_counter() - started
+    return _latency_metrics("chat", latencies, elapsed)
+
+
+def bench_stream(args):
+    from agent import ChatAgent
+
+    with _server(args, chunk_delay=args.chunk_delay):
+        agent = ChatAgent(model="bench")
+        "".join(agent.chat_stream("ウォームアップ"))
+        latencies = []
+        first_tokens = []
+        for turn in range(args.turns):
+            if turn % 10 == 0:
+                agent.reset_conversation()
+            turn_started = time.perf_counter()
+            first_token = None
+            for _ in agent.chat_stream(f"ターン{turn}"):
+                if first_token is None:
+                    first_token = time.perf_counter() - turn_started
+            latencies.append(time.perf_counter() - turn_started)
+            first_tokens.append(first_token)
+    metrics = _latency_metrics("stream", latencies)
+    metrics["stream.first_token_p50_ms"] = percentile(first_tokens, 0.50) * 1e3
+    return metrics
+
+
+def bench_async(args):
+    from async_agent import AsyncChatAgent, close_async_session
+    from http_session import configure_session
+    from scheduler import configure_scheduler
+
+    configure_session(pool_maxsize=args.sessions)
+    configure_scheduler(max_concurrency=args.sessions)
+    turns_per_session = max(1, args.turns // args.sessions)
+    latencies = []
+
+    async def session(index):
+        agent = AsyncChatAgent(model="bench")
+        for turn in range(turns_per_session):
+            turn_started = time.perf_counter()
+            await agent.chat(f"セッション{index} ターン{turn}")
+            latencies.append(time.perf_counter() - turn_started)
+
+    async def main():
+        try:
+            await session(-1)  # ウォームアップ
+            latencies.clear()
+            started = time.perf_counter()
+            await asyncio.gather(*(session(index) for index in range(args.sessions)))
+            return time.perf_counter() - started
+        finally:
+            await close_async_session()
+
+    with _server(args):
+        elapsed = asyncio.run(main())
+    return _latency_metrics("async", latencies, elapsed)
+
+
+def bench_manager(args):
+    from manager import Manager
+
+    with _server(args):
+        manager = Manager(model="bench", stream=False)
+        agent = manager.agent
+        latencies = []
+        dispatch = []
+        tool_calls = 0
+        for turn in range(args.turns // 2):
+            if turn % 5 == 0:
+                agent.reset_conversation()
+            turn_started = time.perf_counter()
+            # モックサーバーはこの指示に対して <myname.anothername> と <gettime> のタグを含む応答を返す
+            response = agent.chat("[[tool:myname.anothername]][[tool:gettime]]")
+
+            dispatch_started = time.perf_counter()
+            calls = manager.extract_tool_calls(response)
+            results = manager.tool_executor.run(calls)
+            message = "".join(
+                manager._format_tool_result(tool_name, subtool_name, result)
+                for (tool_name, _, subtool_name), result in zip(calls, results)
+            )
+            dispatch.append(time.perf_counter() - dispatch_started)
+            tool_calls += len(calls)
+
+            agent.chat(message)
+            latencies.append(time.perf_counter() - turn_started)
+        manager.tool_executor.shutdown()
+    metrics = _latency_metrics("manager", latencies)
+    metrics["manager.dispatch_us"] = sum(dispatch) / tool_calls * 1e6
+    return metrics
+
+
+def bench_errors(args):
+    from agent import ChatAgent
+    from http_session import configure_session
+
+    # リトライの待ち時間で計測が長くならないよう、バックオフを短くする
+    configure_session(backoff_factor=0.01, max_retries=3)
+    with _server(args, error_rate=args.error_rate, seed=1):
+        agent = ChatAgent(model="bench")
+        latencies = []
+        succeeded = 0
+        for turn in range(args.turns):
+            if turn % 10 == 0:
+                agent.reset_conversation()
+            turn_started = time.perf_counter()
+            response = agent.chat(f"ターン{turn}")
+            latencies.append(time.perf_counter() - turn_started)
+            if not response.startswith("エラー"):
+                succeeded += 1
+    configure_session(backoff_factor=0.5)
+    return {
+        "errors.success_rate": succeeded / args.turns * 100,
+        "errors.p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def bench_memory(args):
+    from agent import ContextAwareAgent
+
+    with _server(args):
+        ContextAwareAgent(model="bench").chat("ウォームアップ")
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        sessions = []
+        for index in range(args.memory_sessions):
+            agent = ContextAwareAgent(model="bench", system_prompt="あなたはベンチマーク用のアシスタントです。")
+            for turn in range(args.memory_turns):
+                agent.chat(f"セッション{index}の{turn}番目の質問です。魔法エンジニアリングについて教えてください。")
+            sessions.append(agent)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"memory.session_kib": (after - before) / len(sessions) / 1024}
+
+
+def bench_simulation(args):
+    from http_session import configure_session
+    from scheduler import configure_scheduler
+    from simulation import Scenario, run_simulations
+
+    configure_session(pool_maxsize=args.sessions)
+    configure_scheduler(max_concurrency=args.sessions)
+    roles = [
+        {"name": "中学生", "system_prompt": "あなたは好奇心旺盛な中学生です。"},
+        {"name": "先生", "system_prompt": "あなたは市民向け科学講座の講師です。"},
+    ]
+    scenarios = [
+        Scenario(f"bench-{index}", roles, f"質問{index}: 魔法エンジニアリングって何ですか？", max_turns=6)
+        for index in range(args.sessions)
+    ]
+    with _server(args), tempfile.TemporaryDirectory() as tmp:
+        stats = run_simulations(scenarios, Path(tmp) / "transcripts.jsonl", concurrency=args.sessions)
+    return {"simulation.conversations_per_min": stats["conversations_per_minute"]}
+
+
+RUNNERS = {
+    "chat": bench_chat,
+    "stream": bench_stream,
+    "async": bench_async,
+    "manager": bench_manager,
+    "errors": bench_errors,
+    "memory": bench_memory,
+    "simulation": bench_simulation,
+}
+
+
+def compare(results, baseline, tolerance):
+    """
+    基準値と比較し、悪化した指標のメッセージのリストを返す関数（判定に使う指標だけを比較する）
+    """
+    failures = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference or name not in METRICS:
+            continue
+        _, higher_is_better, gated = METRICS[name]
+        if not gated:
+            continue
+        ratio = reference / value if higher_is_better else value / reference
+        if value == 0 or ratio > tolerance:
+            failures.append(f"{name} が基準値より悪化しました（{value:.2f}、基準値 {reference:.2f}）")
+    return failures
+
+
+def run_scenario(scenario, repeat, args):
+    """
+    シナリオをrepeat回実行し、指標ごとの中央値を返す関数
+    """
+    runs = []
+    for _ in range(repeat):
+        # ツールの実行結果などの表示を計測から除外する
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.append(RUNNERS[scenario](args))
+    return {name: percentile([run[name] for run in runs], 0.50) for name in runs[0]}
+
+
+def _print_metrics(metrics, baseline):
+    for name, value in metrics.items():
+        reference = baseline.get(name)
+        mark = "" if METRICS[name][2] else "（表示のみ）"
+        print(f"{name:<36}{value:>12.2f}{(f'{reference:.2f}' if reference else '-'):>12}  {METRICS[name][0]}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="モックサーバーを使ったエンドツーエンドのベンチマークスイート")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="実行するシナリオ（デフォルトはすべて）")
+    parser.add_argument("--turns", type=int, default=200, help="シナリオごとのターン数")
+    parser.add_argument("--sessions", type=int, default=32, help="async / simulation の同時セッション数")
+    parser.add_argument("--latency", type=float, default=0.0, help="モックサーバーの応答の待ち時間（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="ストリーミングの差分ごとの待ち時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="errorsシナリオでHTTPエラーを返す割合")
+    parser.add_argument("--memory-sessions", type=int, default=50)
+    parser.add_argument("--memory-turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="シナリオごとの実行回数（指標は中央値を使う）")
+    parser.add_argument("--baseline", help="比較する基準値のJSONファイル")
+    parser.add_argument("--save-baseline", help="今回の結果を基準値として保存するJSONファイル")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="基準値に対して許容する倍率")
+    parser.add_argument("--check", action="store_true", help="回帰があれば終了コード1で終了する")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    results = {}
+
+    print(f"{'指標':<36}{'値':>12}{'基準値':>12}  単位")
+    for scenario in args.only or SCENARIOS:
+        metrics = run_scenario(scenario, args.repeat, args)
+        results.update(metrics)
+        _print_metrics(metrics, baseline)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\n基準値を {args.save_baseline} に保存しました。")
+
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print("\n" + "\n".join(failures))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ツールの実行結果のキャッシュ（<RM_AGENT_TOOL>の「Cache:」）のベンチマーク
+
+一時フォルダに、1回の実行に --tool-latency 秒かかるツールを「Cache: never / pure / 秒数」の3通りで作成し、
+--distinct 種類の引数で --calls 回ずつ呼び出して（モデルが同じ呼び出しを繰り返す状況）、
+全体の時間・実際にツールを実行した回数・キャッシュのヒット率を比較します。
+最後に --max-entries を引数の種類より小さくした場合のLRUでの削除も確認します。
+
+使い方:
+    python benchmarks/bench_tool_cache.py --calls 200 --distinct 20 --tool-latency 0.005
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from tool_router import ToolRegistry, call_tool
+
+TOOL_TEMPLATE = """# <RM_AGENT_TOOL>
+# Tool Name: {name}
+# Description: 時間のかかる検索ツール（ベンチマーク用）
+# Input: 検索語
+# Output: 検索結果
+# Cache: {cache}
+# </RM_AGENT_TOOL>
+
+import time
+
+calls = 0
+
+def {name}(arg):
+    global calls
+    calls += 1
+    time.sleep({latency})
+    return f"{{arg}}の検索結果"
+"""
+
+
+def run_case(registry, tool_name, calls, distinct):
+    started = time.perf_counter()
+    for i in range(calls):
+        call_tool(tool_name, f"検索語{i % distinct}", registry=registry)
+    elapsed = time.perf_counter() - started
+    executed = registry.get_function(tool_name).__globals__["calls"]
+    return elapsed, executed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツールの実行結果のキャッシュのベンチマーク")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20, help="引数の種類")
+    parser.add_argument("--tool-latency", type=float, default=0.005, help="ツール1回の実行時間（秒）")
+    args = parser.parse_args()
+
+    cases = (("never", "never"), ("pure", "pure"), ("ttl_60", "60"))
+    with tempfile.TemporaryDirectory() as tools_dir:
+        for name, cache in cases:
+            with open(os.path.join(tools_dir, f"{name}.py"), "w", encoding="utf-8") as f:
+                f.write(TOOL_TEMPLATE.format(name=name, cache=cache, latency=args.tool_latency))
+
+        print(f"呼び出し回数: {args.calls}、引数の種類: {args.distinct}、ツールの実行時間: {args.tool_latency}秒")
+        print(f"{'Cache:':<14}{'全体(ms)':>10}{'実行回数':>10}{'ヒット率':>10}")
+        for name, cache in cases:
+            registry = ToolRegistry(tools_dir)
+            elapsed, executed = run_case(registry, name, args.calls, args.distinct)
+            stats = registry.results.stats()
+            print(f"{cache:<14}{elapsed * 1e3:>10.1f}{executed:>10}{stats['hit_rate']:>10.0%}")
+
+        # 件数の上限が引数の種類より小さい場合は、古いエントリから削除される
+        max_entries = max(1, args.distinct // 2)
+        registry = ToolRegistry(tools_dir, max_cached_results=max_entries)
+        run_case(registry, "pure", args.calls, args.distinct)
+        stats = registry.results.stats()
+        print(f"\nmax_cached_results={max_entries}: エントリ数 {stats['entries']}、ヒット率 {stats['hit_rate']:.0%}"
+              f"（{'OK' if stats['entries'] <= max_entries else 'NG'}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ツール呼び出しのディスパッチ時間のマイクロベンチマーク
+
+呼び出しごとにモジュールを読み込み直す従来方式と、
+ToolRegistryでキャッシュする方式の1回あたりの時間を比較します。
+
+使い方:
+    python benchmarks/bench_tool_dispatch.py --number 2000
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import timeit
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+import tool_router
+from tool_router import ToolRegistry, call_tool
+
+TOOLS_DIR = os.path.join(os.path.dirname(tool_router.__file__), "tools")
+
+
+def legacy_call_tool(tool_name, arg, subtool=None):
+    """
+    従来のcall_tool（毎回モジュールを読み込んで実行する）
+    """
+    module_path = os.path.join(TOOLS_DIR, f"{tool_name}.py")
+    if not os.path.exists(module_path):
+        raise ImportError(f"ツール '{tool_name}' が見つかりません")
+    spec = importlib.util.spec_from_file_location(tool_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, subtool if subtool else tool_name)(arg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツールディスパッチのマイクロベンチマーク")
+    parser.add_argument("--number", type=int, default=2000, help="1計測あたりの呼び出し回数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    no_check = ToolRegistry(auto_reload=False)
+    cases = {
+        "legacy (毎回exec_module)": lambda: legacy_call_tool("myname", None, "anothername"),
+        "registry (mtime確認あり)": lambda: call_tool("myname", None, "anothername", use_cache=False),
+        "registry + 結果キャッシュ": lambda: call_tool("myname", None, "anothername"),
+        "registry (auto_reload=False)": lambda: no_check.get_function("myname", "anothername")(None),
+    }
+
+    print(f"{'方式':<32}{'1回あたり(µs)':>16}")
+    results = {}
+    for name, func in cases.items():
+        func()  # ウォームアップ
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        results[name] = best / args.number * 1e6
+        print(f"{name:<32}{results[name]:>16.2f}")
+
+    legacy = results["legacy (毎回exec_module)"]
+    for name, value in results.items():
+        if value != legacy:
+            print(f"{name}: 従来比 {legacy / value:.0f}倍高速")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ツールのプロセス分離実行（ToolProcessPool）とインライン実行のベンチマーク
+
+  1. 1回あたりの呼び出し時間（軽いツール）: プロセス間通信のオーバーヘッド
+  2. CPUを使うツールを同時に呼び出したときの全体の時間: インライン（スレッド、GILあり）とプロセスプール
+  3. タイムアウトしたツールのその後: インラインではスレッドが動き続け、プールではプロセスごと終了する
+を表示します。CPUを使うツールの並列化の効果は、コア数が多いほど大きくなります。
+
+使い方:
+    python benchmarks/bench_tool_isolation.py --processes 4 --calls 16 --work 2000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from tool_process_pool import ToolProcessPool
+from tool_router import ToolRegistry, call_tool
+
+BENCH_TOOL = '''"""
+<RM_AGENT_TOOL>
+###bench
+ベンチマーク用のツールです。
+</RM_AGENT_TOOL>
+"""
+import time
+
+
+def bench(arg):
+    return "ok"
+
+
+def spin(arg):
+    total = 0
+    for i in range(int(arg)):
+        total += i * i
+    return total
+
+
+def sleep(arg):
+    time.sleep(float(arg))
+    return "done"
+'''
+
+
+def _per_call(func, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - started) / number
+
+
+def _run_parallel(func, calls, workers):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda _: func(), range(calls)))
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツールのプロセス分離実行のベンチマーク")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--calls", type=int, default=16, help="同時に呼び出すCPUを使うツールの数")
+    parser.add_argument("--work", type=int, default=2000000, help="CPUを使うツール1回あたりのループ回数")
+    parser.add_argument("--number", type=int, default=2000, help="呼び出し時間の計測回数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tools_dir:
+        with open(os.path.join(tools_dir, "bench.py"), "w", encoding="utf-8") as f:
+            f.write(BENCH_TOOL)
+        registry = ToolRegistry(tools_dir)
+
+        started = time.perf_counter()
+        pool = ToolProcessPool(processes=args.processes, timeout=None, tools_dir=tools_dir).start()
+        pool.call("bench", None)  # すべてのワーカーの起動を待つ代わりに1回呼び出しておく
+        print(f"ワーカー数: {args.processes}（CPUコア数 {os.cpu_count()}）、起動 {time.perf_counter() - started:.2f}秒")
+
+        inline_call = _per_call(lambda: call_tool("bench", None, registry=registry), args.number)
+        pool_call = _per_call(lambda: pool.call("bench", None), args.number)
+        print("\n1回あたりの呼び出し時間（軽いツール）")
+        print(f"  {'インライン':<20}{inline_call * 1e6:>12.1f} µs")
+        print(f"  {'プロセスプール':<20}{pool_call * 1e6:>12.1f} µs")
+
+        work = str(args.work)
+        inline_time, inline_results = _run_parallel(
+            lambda: call_tool("bench", work, "spin", registry=registry), args.calls, args.processes)
+        pool_time, pool_results = _run_parallel(
+            lambda: pool.call("bench", work, "spin"), args.calls, args.processes)
+        assert inline_results == pool_results
+        print(f"\nCPUを使うツールを{args.calls}回同時に呼び出したときの全体の時間")
+        print(f"  {'インライン（スレッド）':<20}{inline_time:>12.2f} 秒")
+        print(f"  {'プロセスプール':<20}{pool_time:>12.2f} 秒{inline_time / pool_time:>8.1f}x")
+
+        print("\n0.2秒でタイムアウトする2秒のツール")
+        threads_before = threading.active_count()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(call_tool, "bench", "2", "sleep", registry=registry)
+            try:
+                future.result(timeout=0.2)
+            except Exception:
+                pass
+            print(f"  インライン: タイムアウト後も実行中のスレッド {threading.active_count() - threads_before} 個"
+                  f"（終了を待つと {2 - 0.2:.1f}秒ほどブロックされます）")
+            future.cancel()
+        started = time.perf_counter()
+        result = pool.call("bench", "2", "sleep", timeout=0.2)
+        recovered = pool.call("bench", None)
+        print(f"  プロセスプール: {result}（再起動を含めて次の呼び出しまで {time.perf_counter() - started:.2f}秒、"
+              f"次の結果 {recovered!r}）")
+        print(f"\n{pool.stats()}")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
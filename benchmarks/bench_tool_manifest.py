@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ツール一覧（システムプロンプト用のツール説明）の取得時間のベンチマーク
+
+ツール数を変えて、
+  1. 従来方式: 毎回toolsフォルダの全ファイルを開き、コンパイルしていない正規表現で説明を抽出
+  2. 初回の読み込み: ToolRegistry.get_manifest()（全ファイルを1回読み込む）
+  3. キャッシュ: 2回目以降のget_manifest()（フォルダの更新日時を確認するだけ）
+  4. manifest.json: デプロイ時に作成したファイルからの読み込み（新しいプロセスの初回に相当）
+の1回あたりの時間を比較します。Managerを作成するたびに従来方式のコストがかかっていました。
+
+使い方:
+    python benchmarks/bench_tool_manifest.py --tools 10 100 1000
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from tool_router import ToolRegistry
+
+TOOL_TEMPLATE = '''"""
+<RM_AGENT_TOOL>
+###tool_{index}
+ツール{index}の説明です。引数に文字列を受け取り、結果を返します。
+使い方: <tool_{index}>引数</tool_{index}>
+</RM_AGENT_TOOL>
+"""
+
+def tool_{index}(arg):
+    return "結果: " + str(arg)
+''' + "\n".join(f"# 実装の一部 {i}" for i in range(60))
+
+
+def legacy_get_tool_list(tools_dir):
+    # 変更前のtool_router.get_tool_listと同じ処理
+    files = os.listdir(tools_dir)
+    py_files = [f for f in files if f.endswith('.py')]
+    tool_descriptions = []
+    for py_file in py_files:
+        file_path = os.path.join(tools_dir, py_file)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            pattern = r'<RM_AGENT_TOOL>(.*?)</RM_AGENT_TOOL>'
+            matches = re.findall(pattern, content, re.DOTALL)
+            if matches:
+                tool_descriptions.append(matches[0])
+    return '\n'.join(tool_descriptions)
+
+
+def _per_call(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツール一覧の取得時間のベンチマーク")
+    parser.add_argument("--tools", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'ツール数':>8}{'従来(ms)':>12}{'初回(ms)':>12}{'キャッシュ(µs)':>16}{'manifest.json(ms)':>20}")
+    for count in args.tools:
+        with tempfile.TemporaryDirectory() as tools_dir:
+            for index in range(count):
+                with open(os.path.join(tools_dir, f"tool_{index}.py"), "w", encoding="utf-8") as f:
+                    f.write(TOOL_TEMPLATE.format(index=index))
+
+            legacy = _per_call(lambda: legacy_get_tool_list(tools_dir), args.repeat)
+            cold = _per_call(lambda: ToolRegistry(tools_dir).get_manifest(), args.repeat)
+            registry = ToolRegistry(tools_dir)
+            registry.get_manifest()
+            cached = _per_call(registry.get_manifest, args.repeat * 100)
+
+            ToolRegistry(tools_dir).build_manifest()
+            from_file = _per_call(lambda: ToolRegistry(tools_dir).get_manifest(), args.repeat)
+
+            assert ToolRegistry(tools_dir).get_manifest().tool_list.count("<tool_") == count
+            print(f"{count:>8}{legacy * 1e3:>12.2f}{cold * 1e3:>12.2f}{cached * 1e6:>16.2f}{from_file * 1e3:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
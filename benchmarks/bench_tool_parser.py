@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ツール呼び出し抽出のベンチマーク
+
+100KB以上の応答に対して、
+  1. 従来のManager.extract_tool_calls（2つの正規表現で2回走査）
+  2. ToolCallParser.parse（1回の走査）
+  3. ToolCallParser.feed（ストリーミングで断片ごとに渡す）
+の処理時間を比較します。
+
+使い方:
+    python benchmarks/bench_tool_parser.py --size 200000
+"""
+
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+
+# scriptsフォルダのモジュールをインポートできるようにする
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent / "scripts"))
+
+from tool_parser import ToolCallParser
+
+TOOL_NAMES = ["ask_user", "gettime", "myname"]
+
+
+def legacy_extract_tool_calls(message):
+    """
+    従来のManager.extract_tool_calls
+    """
+    standard_matches = re.findall(r'<([a-zA-Z0-9_]+)>(.*?)</\1>', message, re.DOTALL)
+    subtool_matches = re.findall(r'<([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)>(.*?)</\1\.\2>', message, re.DOTALL)
+    result = [(tool_name, arg, None) for tool_name, arg in standard_matches]
+    result += [(tool_name, arg, subtool_name) for tool_name, subtool_name, arg in subtool_matches]
+    return result
+
+
+def build_response(size):
+    """
+    ツール呼び出しとHTML風のタグを含む、指定サイズ以上の応答を作成する関数
+    """
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        block = (
+            f"[think]ステップ{i}: <b>重要</b> な点を <i>確認</i> します。[/think]\n"
+            f"[message]途中経過 {i} です。[/message]\n"
+        )
+        if i % 10 == 0:
+            block += "<gettime></gettime>\n<myname.anothername></myname.anothername>\n"
+        parts.append(block)
+        length += len(block)
+        i += 1
+    return "".join(parts)
+
+
+def stream_parse(text, chunk_size):
+    parser = ToolCallParser(TOOL_NAMES)
+    calls = []
+    for i in range(0, len(text), chunk_size):
+        calls.extend(parser.feed(text[i:i + chunk_size]))
+    calls.extend(parser.close())
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツール呼び出し抽出のベンチマーク")
+    parser.add_argument("--size", type=int, default=200_000, help="応答の文字数")
+    parser.add_argument("--chunk", type=int, default=16, help="ストリーミング時の断片の文字数")
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    text = build_response(args.size)
+    print(f"応答サイズ: {len(text.encode('utf-8')) / 1024:.0f}KB ({len(text)}文字)")
+
+    cases = {
+        "legacy (2回走査)": lambda: legacy_extract_tool_calls(text),
+        "ToolCallParser.parse": lambda: ToolCallParser.parse(text, TOOL_NAMES),
+        f"ToolCallParser.feed ({args.chunk}文字ずつ)": lambda: stream_parse(text, args.chunk),
+    }
+    print(f"{'方式':<36}{'1回あたり(ms)':>14}{'抽出数':>8}")
+    for name, func in cases.items():
+        calls = func()
+        best = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        print(f"{name:<36}{best * 1000:>14.2f}{len(calls):>8}")
+
+    # 1回の走査で抽出した結果は、応答中の出現順に並んでいる
+    assert stream_parse(text, args.chunk) == ToolCallParser.parse(text, TOOL_NAMES)
+
+
+if __name__ == "__main__":
+    main()
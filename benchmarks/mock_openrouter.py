@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ベンチマーク用のOpenRouter互換モックサーバー
+
+/api/v1/chat/completions を受け付け、最後のユーザーメッセージを元にした
+決まった応答を返します。本物のAPIを呼ばずにエージェントの性能を測るために使います。
+
+- ストリーミング（SSE）と通常のJSONの両方に対応し、usageフィールドも返します
+- 応答の待ち時間（固定値 + ゆらぎ）と、ストリーミングの差分ごとの待ち時間を設定できます
+- 一定の割合でツールタグを含む応答（ツール結果を受け取った後は通常の応答）を返せます
+- 一定の割合でHTTPエラー（429/5xx）や、ストリーミング途中のエラーを返せます（エラー注入）
+- 最後のメッセージに次の指示を含めると、その応答を必ず返します（ベンチマークのシナリオ用）
+    [[tool:ツール名]] / [[tool:ツール名.サブツール名]]  ツールタグを含む応答（複数指定可）
+    [[error:ステータスコード]]                            HTTPエラー
+    [[end]]                                               終了タグ（<<END>>）を含む応答
+- cache_controlの区切りまでのプロンプトを覚え、2回目以降はusageのprompt_tokens_details.cached_tokensで
+  キャッシュされたトークン数を返します（キャッシュされていない入力トークンごとの待ち時間も設定できます）
+- 一定の割合で遅い応答（テールレイテンシ）を返せます。モデルごとの追加の待ち時間や、常にエラーを返すモデルも設定できます
+- GET /stats でリクエスト数・エラー数・モデルごとのリクエスト数などの統計を返します
+
+使い方:
+    python benchmarks/mock_openrouter.py --port 8765 --latency 0.05
+    python benchmarks/mock_openrouter.py --port 8765 --tool-rate 0.5 --error-rate 0.05 --seed 1
+    OPENROUTER_API_URL=http://127.0.0.1:8765/api/v1/chat/completions python scripts/manager.py
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+STATS_PATH = "/stats"
+
+# 応答の内容を指定する指示（[[tool:myname.anothername]] など）
+DIRECTIVE_PATTERN = re.compile(r"\[\[(tool|error|end)(?::([^\]]*))?\]\]")
+
+# ツール結果のタグ（これを含むメッセージにはツールを呼び出さずに応答する）
+TOOL_RESULT_PATTERN = re.compile(r"<[\w.]+_result>")
+
+# エラー注入で返すステータスコードのデフォルト
+DEFAULT_ERROR_STATUSES = (429, 500, 502, 503)
+
+# デフォルトのモックサーバーの設定
+DEFAULT_OPTIONS = {
+    "latency": 0.0,             # 応答までの待ち時間（秒）
+    "jitter": 0.0,              # 待ち時間に加える一様乱数の最大値（秒）
+    "chunk_size": 8,            # ストリーミングで1回に返す文字数
+    "chunk_delay": 0.0,         # ストリーミングの差分ごとの待ち時間（秒）
+    "tool_rate": 0.0,           # ツールタグを含む応答を返す割合
+    "tools": ("myname",),       # ツールタグを含む応答で呼び出すツール（"ツール名" または "ツール名.サブツール名"）
+    "error_rate": 0.0,          # HTTPエラーを返す割合
+    "error_statuses": DEFAULT_ERROR_STATUSES,
+    "stream_error_rate": 0.0,   # ストリーミングの途中でエラーイベントを返す割合
+    "prompt_token_latency": 0.0,  # キャッシュされていない入力トークン1つあたりの待ち時間（秒）
+    "slow_rate": 0.0,           # 遅い応答を返す割合
+    "slow_latency": 1.0,        # 遅い応答で追加する待ち時間（秒）
+    "model_latency": (),        # モデルごとの追加の待ち時間（"モデル名=秒" のリスト）
+    "failing_models": (),       # 常にHTTPエラー（503）を返すモデル
+    "seed": None,               # 乱数のシード（指定すると応答の種類が再現できる）
+}
+
+
+def _text(content):
+    # contentはテキストパートのリスト（cache_control付きなど）の場合もある
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) for part in content)
+    return str(content or "")
+
+
+def _last_content(request_data):
+    messages = request_data.get("messages") or [{"content": ""}]
+    return _text(messages[-1].get("content"))
+
+
+def prompt_prefixes(request_data):
+    """
+    cache_controlの区切りまでのプロンプトの接頭辞を列挙する関数
+
+    Args:
+        request_data (dict): 受け取ったリクエスト
+
+    Returns:
+        list: (接頭辞のハッシュ, 接頭辞のトークン数) のリスト（区切りの順）
+    """
+    digest = hashlib.sha256(str(request_data.get("model")).encode("utf-8"))
+    tokens = 0
+    prefixes = []
+    for message in request_data.get("messages") or []:
+        digest.update(f"\0{message.get('role')}\0".encode("utf-8"))
+        content = message.get("content")
+        for part in content if isinstance(content, list) else [{"text": _text(content)}]:
+            text = str(part.get("text", ""))
+            digest.update(text.encode("utf-8"))
+            tokens += len(text)
+            if part.get("cache_control"):
+                prefixes.append((digest.hexdigest(), tokens))
+    return prefixes
+
+
+def build_reply(request_data):
+    """
+    リクエストに対する応答文を作成する関数
+
+    Args:
+        request_data (dict): 受け取ったリクエスト
+
+    Returns:
+        str: 応答文
+    """
+    last = DIRECTIVE_PATTERN.sub("", _last_content(request_data))
+    return f"モック応答: {last[:40]}"
+
+
+def build_tool_reply(tools):
+    """
+    ツールタグを含む応答文を作成する関数
+
+    Args:
+        tools (list): 呼び出すツール（"ツール名" または "ツール名.サブツール名"）
+
+    Returns:
+        str: 応答文
+    """
+    tags = "".join(f"<{tool}></{tool}>" for tool in tools)
+    return f"ツールを呼び出します。{tags}"
+
+
+def count_prompt_tokens(request_data):
+    """
+    リクエストの入力トークン数を概算する関数（文字数をトークン数とみなす）
+
+    Args:
+        request_data (dict): 受け取ったリクエスト
+
+    Returns:
+        int: 入力トークン数
+    """
+    return sum(len(_text(message.get("content"))) for message in request_data.get("messages") or [])
+
+
+def build_usage(request_data, reply, cached_tokens=0):
+    """
+    OpenRouterのusageフィールドを模したトークン数を作成する関数（文字数から概算する）
+
+    Args:
+        request_data (dict): 受け取ったリクエスト
+        reply (str): 応答文
+        cached_tokens (int): 入力トークンのうちプロンプトキャッシュから読み込んだ数
+
+    Returns:
+        dict: prompt_tokens, completion_tokens, total_tokens, prompt_tokens_details
+    """
+    prompt_tokens = count_prompt_tokens(request_data)
+    completion_tokens = len(reply)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+
+def _error_body(status):
+    return {"error": {"code": status, "message": f"モックサーバーが注入したエラーです（{status}）"}}
+
+
+def create_app(latency=0.0, **options):
+    """
+    モックサーバーのaiohttpアプリケーションを作成する関数
+
+    Args:
+        latency (float): 応答までの疑似的な待ち時間（秒）
+        **options: DEFAULT_OPTIONSのキーと同じ名前の設定値
+
+    Returns:
+        web.Application: アプリケーション
+
+    Raises:
+        KeyError: 未知の設定名が指定された場合
+    """
+    for key in options:
+        if key not in DEFAULT_OPTIONS:
+            raise KeyError(f"未知のモックサーバー設定です: {key}")
+    config = dict(DEFAULT_OPTIONS, latency=latency, **options)
+    rng = random.Random(config["seed"])
+    stats = {"requests": 0, "stream_requests": 0, "tool_replies": 0, "errors": 0, "stream_errors": 0,
+             "prompt_tokens": 0, "cached_tokens": 0, "slow_replies": 0, "models": {}}
+    model_latency = {}
+    for item in config["model_latency"]:
+        model, _, seconds = item.rpartition("=")
+        model_latency[model] = float(seconds)
+    prompt_cache = set()  # キャッシュ済みの接頭辞のハッシュ
+
+    def read_prompt_cache(request_data):
+        """
+        キャッシュ済みの最長の接頭辞のトークン数を返し、このリクエストの接頭辞をキャッシュに追加する
+        """
+        prefixes = prompt_prefixes(request_data)
+        cached = max((tokens for key, tokens in prefixes if key in prompt_cache), default=0)
+        prompt_cache.update(key for key, _ in prefixes)
+        return cached
+
+    def plan(request_data):
+        """
+        リクエストに対して返す応答の種類を決める（指示があればそれに従い、なければ設定の割合で選ぶ）
+
+        Returns:
+            tuple: (HTTPエラーのステータスコード（ない場合はNone）, 応答文, ストリーミング途中でエラーにするか)
+        """
+        last = _last_content(request_data)
+        directives = DIRECTIVE_PATTERN.findall(last)
+        tools = [value for kind, value in directives if kind == "tool" and value]
+        errors = [int(value) for kind, value in directives if kind == "error" and value]
+        if errors:
+            return errors[0], None, False
+        if not directives and rng.random() < config["error_rate"]:
+            return rng.choice(config["error_statuses"]), None, False
+
+        is_tool_result = TOOL_RESULT_PATTERN.search(last) is not None
+        if not tools and not directives and not is_tool_result and rng.random() < config["tool_rate"]:
+            tools = [rng.choice(config["tools"])]
+        reply = build_tool_reply(tools) if tools else build_reply(request_data)
+        if any(kind == "end" for kind, _ in directives):
+            reply += "<<END>>"
+        if tools:
+            stats["tool_replies"] += 1
+        stream_error = not directives and rng.random() < config["stream_error_rate"]
+        return None, reply, stream_error
+
+    async def completions(request):
+        request_data = await request.json()
+        stats["requests"] += 1
+        model = request_data.get("model")
+        stats["models"][model] = stats["models"].get(model, 0) + 1
+        prompt_tokens = count_prompt_tokens(request_data)
+        cached_tokens = read_prompt_cache(request_data)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        delay = config["latency"] + (rng.uniform(0, config["jitter"]) if config["jitter"] else 0.0)
+        # キャッシュされていない入力トークンの処理時間（プロンプトキャッシュが効くと最初のトークンまでが短くなる）
+        delay += config["prompt_token_latency"] * (prompt_tokens - cached_tokens)
+        delay += model_latency.get(model, 0.0)
+        if config["slow_rate"] and rng.random() < config["slow_rate"]:
+            stats["slow_replies"] += 1
+            delay += config["slow_latency"]
+        if delay:
+            await asyncio.sleep(delay)
+        status, reply, stream_error = plan(request_data)
+        if model in config["failing_models"]:
+            status = 503
+
+        if status is not None:
+            stats["errors"] += 1
+            return web.json_response(_error_body(status), status=status)
+
+        if not request_data.get("stream"):
+            return web.json_response({
+                "id": "mock",
+                "model": request_data.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+                "usage": build_usage(request_data, reply, cached_tokens),
+            })
+
+        # SSEで数文字ずつ返す
+        stats["stream_requests"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        size = max(1, config["chunk_size"])
+        for i in range(0, len(reply), size):
+            if stream_error and i >= len(reply) // 2:
+                # OpenRouterと同様に、途中でエラーが起きた場合はエラーイベントを送って終了する
+                stats["stream_errors"] += 1
+                await response.write(f"data: {json.dumps(_error_body(502), ensure_ascii=False)}\n\n".encode("utf-8"))
+                await response.write_eof()
+                return response
+            if config["chunk_delay"]:
+                await asyncio.sleep(config["chunk_delay"])
+            event = {"choices": [{"index": 0, "delta": {"content": reply[i:i + size]}}]}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        # 最後のイベントでトークン使用量を返す
+        event = {"choices": [{"index": 0, "delta": {}}], "usage": build_usage(request_data, reply, cached_tokens)}
+        await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post(COMPLETIONS_PATH, completions)
+    app.router.add_get(STATS_PATH, get_stats)
+    return app
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _command_line_options(options):
+    """
+    create_appの設定値を、このスクリプトのコマンドライン引数に変換する関数
+    """
+    arguments = []
+    for key, value in options.items():
+        if key not in DEFAULT_OPTIONS:
+            raise KeyError(f"未知のモックサーバー設定です: {key}")
+        if value is None:
+            continue
+        flag = "--" + key.replace("_", "-")
+        if isinstance(value, (list, tuple)):
+            arguments += [flag, *(str(item) for item in value)]
+        else:
+            arguments += [flag, str(value)]
+    return arguments
+
+
+@contextlib.contextmanager
+def mock_server(latency=0.0, **options):
+    """
+    モックサーバーを別プロセスで起動するコンテキストマネージャ
+    （サーバーのCPU時間が計測に混ざらないよう別プロセスにする）
+
+    Args:
+        latency (float): 応答までの疑似的な待ち時間（秒）
+        **options: DEFAULT_OPTIONSのキーと同じ名前の設定値（tool_rate, error_rate など）
+
+    Yields:
+        str: モックサーバーのAPIのURL
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__)), "--port", str(port), "--latency", str(latency),
+         *_command_line_options(options)]
+    )
+    try:
+        # 起動を待つ
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}{COMPLETIONS_PATH}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenRouter互換モックサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの待ち時間（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="待ち時間に加えるゆらぎの最大値（秒）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_OPTIONS["chunk_size"],
+                        help="ストリーミングで1回に返す文字数")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="ストリーミングの差分ごとの待ち時間（秒）")
+    parser.add_argument("--tool-rate", type=float, default=0.0, help="ツールタグを含む応答を返す割合")
+    parser.add_argument("--tools", nargs="+", default=list(DEFAULT_OPTIONS["tools"]),
+                        help="呼び出すツール（ツール名 または ツール名.サブツール名）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTPエラーを返す割合")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=list(DEFAULT_ERROR_STATUSES),
+                        help="エラー注入で返すステータスコード")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0,
+                        help="ストリーミングの途中でエラーイベントを返す割合")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0,
+                        help="キャッシュされていない入力トークン1つあたりの待ち時間（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="遅い応答を返す割合")
+    parser.add_argument("--slow-latency", type=float, default=DEFAULT_OPTIONS["slow_latency"],
+                        help="遅い応答で追加する待ち時間（秒）")
+    parser.add_argument("--model-latency", nargs="*", default=[], help="モデルごとの追加の待ち時間（モデル名=秒）")
+    parser.add_argument("--failing-models", nargs="*", default=[], help="常にHTTPエラーを返すモデル")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    args = parser.parse_args()
+
+    app = create_app(
+        args.latency, jitter=args.jitter, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay,
+        tool_rate=args.tool_rate, tools=tuple(args.tools), error_rate=args.error_rate,
+        error_statuses=tuple(args.error_statuses), stream_error_rate=args.stream_error_rate,
+        prompt_token_latency=args.prompt_token_latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        model_latency=tuple(args.model_latency), failing_models=tuple(args.failing_models), seed=args.seed,
+    )
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,8 +20,9 @@ current_dir = Path(__file__).parent
 parent_dir = current_dir.parent
 sys.path.append(str(parent_dir))
 
-# ContextAwareAgentクラスをインポート
+# ContextAwareAgentクラスとセッションストアをインポート
 from scripts.agent import ContextAwareAgent
+from scripts.session_store import SessionStore
 
 def main():
     """
@@ -42,19 +43,30 @@ def main():
     # エージェントの作成
     teacher = ContextAwareAgent(
         model="google/gemini-2.0-flash-lite-001",
-        system_prompt_path=professor_prompt_path
+        system_prompt=professor_prompt_path.read_text(encoding="utf-8")
     )
     
     student = ContextAwareAgent(
         model="google/gemini-2.0-flash-lite-001",
-        system_prompt_path=student_prompt_path
+        system_prompt=student_prompt_path.read_text(encoding="utf-8")
     )
     
+    session_id = time.strftime("magic-%Y%m%d-%H%M%S")
+    
     # 会話の初期メッセージ（中学生からの最初の質問）
     initial_question = "先生、魔法エンジニアリングって何ですか？アニメで見た魔法と同じものなんですか？"
     
-    # 会話ログを保存するリスト
+    # 会話ログを保存するリスト（ファイルにも発言ごとに追記する）
     conversation_log = []
+    log_file_path = current_dir / "conversation_log.txt"
+    # セッションストアとログファイルはtryの中で開き、途中でエラーが起きてもfinallyで閉じる
+    store = None
+    log_file = None
+
+    def record(line):
+        conversation_log.append(line)
+        log_file.write(line + "\n")
+        log_file.flush()
     
     # 現在の話者と次の話者を設定
     current_speaker = "中学生"
@@ -65,11 +77,17 @@ def main():
     turn_count = 0
     
     try:
+        # 各エージェントの会話を1件ずつセッションストアに追記する（途中で異常終了しても失われない）
+        store = SessionStore(current_dir / "conversations.db")
+        teacher.attach_session(store, f"{session_id}-teacher")
+        student.attach_session(store, f"{session_id}-student")
+        log_file = open(log_file_path, "w", encoding="utf-8")
+        
         # 会話ループ
         while turn_count < max_turns:
             # 現在のメッセージを表示
             print(f"\n{current_speaker}: {current_message}")
-            conversation_log.append(f"{current_speaker}: {current_message}")
+            record(f"{current_speaker}: {current_message}")
             
             # 次の話者とエージェントを設定
             if current_speaker == "中学生":
@@ -93,7 +111,7 @@ def main():
                 current_message = response
                 # 現在のメッセージを表示
                 print(f"\n{current_speaker}: {current_message}")
-                conversation_log.append(f"{current_speaker}: {current_message}")
+                record(f"{current_speaker}: {current_message}")
                 # 会話を終了
                 print("\n会話が自然に終了しました。")
                 break
@@ -126,13 +144,14 @@ def main():
         for message in conversation_log:
             print(message)
         
-        # 会話ログをファイルに保存
-        log_file_path = current_dir / "conversation_log.txt"
-        with open(log_file_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(conversation_log))
+        if log_file is not None:
+            log_file.close()
+        if store is not None:
+            store.close()
         
         print("\n" + "=" * 80)
         print(f"会話ログは {log_file_path} に保存されました。")
+        print(f"セッション {session_id} は {current_dir / 'conversations.db'} に保存されました。")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,455 @@
-import requests
+import concurrent.futures
+import contextlib
+import contextvars
 import json
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .agent_logging import get_logger, log_request
+    from .history import CachedMessage, History, Message, encode_messages
+    from .http_session import get_api_url, get_config, get_session, get_timeout, load_env
+    from .instrumentation import current_span, record_usage, span
+    from .model_router import PURPOSE_CHAT, PURPOSE_SUMMARY, HedgeCancelled, ModelResponseError, hedge_abort_event
+    from .scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_scheduler
+    from .summarizer import Summarizer
+    from .tokens import estimate_messages_tokens
+except ImportError:
+    from agent_logging import get_logger, log_request
+    from history import CachedMessage, History, Message, encode_messages
+    from http_session import get_api_url, get_config, get_session, get_timeout, load_env
+    from instrumentation import current_span, record_usage, span
+    from model_router import PURPOSE_CHAT, PURPOSE_SUMMARY, HedgeCancelled, ModelResponseError, hedge_abort_event
+    from scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_scheduler
+    from summarizer import Summarizer
+    from tokens import estimate_messages_tokens
+
+logger = get_logger("agent")
+
+# APIキーが未設定の場合のエラーメッセージ
+API_KEY_ERROR = "エラー: OpenRouterのAPIキーが設定されていません。.envファイルを確認してください。"
+
+# バックグラウンドでの要約に使う、プロセス内で共有するスレッドプール（最初に使うときに作成する）
+COMPACTION_WORKERS = 4
+_compaction_executor = None
+_compaction_lock = threading.Lock()
+
+
+def get_compaction_executor():
+    """
+    バックグラウンドでの要約に使う共有のスレッドプールを取得する関数
+
+    Returns:
+        ThreadPoolExecutor: スレッドプール
+    """
+    global _compaction_executor
+    with _compaction_lock:
+        if _compaction_executor is None:
+            _compaction_executor = ThreadPoolExecutor(max_workers=COMPACTION_WORKERS, thread_name_prefix="compaction")
+        return _compaction_executor
+
+
+def parse_sse_line(line):
+    """
+    OpenRouterのSSEストリームの1行を解析する関数
+
+    Args:
+        line (str): SSEの1行
+
+    Returns:
+        tuple: (種別, 値)
+               種別は "delta"（応答の差分）, "usage"（トークン使用量）, "done"（ストリーム終了）,
+               "error"（エラー）, None（読み飛ばす行）のいずれか
+    """
+    # 空行とコメント行（": OPENROUTER PROCESSING" など）は読み飛ばす
+    if not line or line.startswith(":") or not line.startswith("data:"):
+        return None, None
+
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return "done", None
+
+    event = json.loads(data)
+    if "error" in event:
+        return "error", event["error"]
+
+    choices = event.get("choices") or []
+    delta = choices[0].get("delta", {}).get("content") if choices else None
+    if not delta:
+        # 最後のイベントにはトークン使用量が含まれる
+        if event.get("usage"):
+            return "usage", event["usage"]
+        return None, None
+    return "delta", delta
 
-# .envファイルから環境変数を読み込む
-load_dotenv()
 
 class ChatAgent:
     """
     OpenRouterのAPIを使用してAIとマルチターンの会話を行うクラス
     """
     
-    def __init__(self, model="google/gemini-2.0-flash-lite-001"):
+    def __init__(self, model="google/gemini-2.0-flash-lite-001", cache=None, temperature=None,
+                 priority=PRIORITY_INTERACTIVE, scheduler=None, router=None, purpose=PURPOSE_CHAT):
         """
         ChatAgentクラスのコンストラクタ
         
         Args:
             model (str): 使用するAIモデルの名前
+            cache (ResponseCache, optional): 応答キャッシュ。指定した場合、temperatureが0または未指定の
+                                             リクエストは同じ内容であればキャッシュから応答を返す
+            temperature (float, optional): 生成時のtemperature。Noneの場合はモデルのデフォルト
+            priority (int): リクエストの優先度（PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND）
+            scheduler (RequestScheduler, optional): 使用するスケジューラ。Noneの場合はプロセス全体で共有するもの
+            router (ModelRouter, optional): 用途ごとのモデルの選択・フォールバック・ヘッジングを行うルーター。
+                                            指定した場合、modelの代わりにルーターが選んだモデルを使う
+            purpose (str): リクエストの用途（PURPOSE_CHAT / PURPOSE_SUMMARY / PURPOSE_TOOL）。ルーターがモデルの選択に使う
         """
-        self.model = model
-        self.conversation_history = []  # 会話履歴を保存するリスト
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        
+        self.router = router
+        self.purpose = purpose
+        self.model = router.model_for(purpose) if router is not None else model
+        self.cache = cache
+        self.temperature = temperature
+        self.priority = priority
+        self.scheduler = scheduler
+        self.conversation_history = History()  # 会話履歴（Messageのリスト）
+        self._api_key = None  # 最初に使うときに環境変数から読み込む
+        self.last_usage = None  # 直前のリクエストのトークン使用量（APIのusageフィールド）
+        self.store = None  # 会話を追記するセッションストア（attach_sessionで設定）
+        self.session_id = None
+        self._session = None
+
+    @property
+    def api_key(self):
+        """
+        OpenRouterのAPIキー
+        最初に使うときに.envファイルと環境変数OPENROUTER_API_KEYから読み込みます
+        """
+        if self._api_key is None:
+            load_env()
+            self._api_key = os.getenv("OPENROUTER_API_KEY")
+        return self._api_key
+
+    @api_key.setter
+    def api_key(self, value):
+        self._api_key = value
+
+    @property
+    def session(self):
+        """
+        HTTP通信に使うrequests.Session
+        指定しない場合は、プロセス全体で共有するコネクションプール（最初の送信時に作成される）
+        """
+        return self._session if self._session is not None else get_session()
+
+    @session.setter
+    def session(self, value):
+        self._session = value
+
+    @property
+    def conversation_history(self):
+        """
+        会話履歴（History）
+        リストを代入した場合もHistoryに変換されるため、要素は常にMessageです
+        """
+        return self._history
+
+    @conversation_history.setter
+    def conversation_history(self, messages):
+        self._history = messages if isinstance(messages, History) else History(messages)
+
+    def attach_session(self, store, session_id):
+        """
+        セッションストアを設定し、以降の会話のメッセージを1件ずつ追記するメソッド
+        （設定前の会話履歴は追記されません）
+
+        Args:
+            store (SessionStore): セッションストア
+            session_id (str): セッションID
+        """
+        self.store = store
+        self.session_id = session_id
+        self._write_store(store.open_session, session_id, self.model, getattr(self, "system_prompt", None))
+
+    @classmethod
+    def resume(cls, store, session_id, max_messages=None, **options):
+        """
+        セッションストアから会話を再開するメソッド
+        最新の要約とそれ以降のメッセージだけを読み込み、以降の会話は同じセッションに追記されます
+
+        Args:
+            store (SessionStore): セッションストア
+            session_id (str): セッションID
+            max_messages (int, optional): 読み込むメッセージ数の上限（末尾から数える）
+            **options: コンストラクタに渡す引数（modelを省略した場合は保存されているモデル）
+
+        Returns:
+            ChatAgent: 会話を再開したエージェント
+        """
+        info = store.get_session(session_id)
+        if info and info["model"]:
+            options.setdefault("model", info["model"])
+        agent = cls(**options)
+        summary, messages = store.load(session_id, max_messages)
+        agent._restore_history(summary, messages)
+        agent.attach_session(store, session_id)
+        return agent
+
+    def _restore_history(self, summary, messages):
+        """
+        セッションストアから読み込んだ会話履歴を復元する内部メソッド
+        ChatAgentは要約を扱わないため、要約以降のメッセージだけを復元します
+
+        Args:
+            summary (str or None): 最新の要約
+            messages (list): 要約以降のメッセージのリスト
+        """
+        self.conversation_history.extend(messages)
+
+    def _append_message(self, role, content):
+        """
+        メッセージを会話履歴に追加し、セッションストアがあれば追記する内部メソッド
+
+        Args:
+            role (str): メッセージのロール
+            content (str): メッセージの内容
+        """
+        self.conversation_history.append(Message(role, content))
+        if self.store is not None:
+            self._write_store(self.store.append, self.session_id, role, content)
+
+    def _write_store(self, method, *args):
+        """
+        セッションストアに書き込む内部メソッド（asyncio版では、イベントループを止めないようにスレッドで書き込む）
+
+        Args:
+            method (callable): 書き込みを行うセッションストアのメソッド（または関数）
+            *args: methodに渡す引数
+        """
+        method(*args)
+
+    def _has_api_key(self):
+        """
+        APIキーが設定されているかを確認する内部メソッド
+
+        Returns:
+            bool: APIキーが設定されている場合はTrue
+        """
+        return bool(self.api_key) and self.api_key != "your_openrouter_api_key"
+
+    def _request_slot(self, model=None):
+        """
+        スケジューラから送信枠を取得するコンテキストマネージャを返す内部メソッド
+
+        Args:
+            model (str, optional): 送信するモデル。Noneの場合はself.model
+
+        Returns:
+            contextmanager: withブロックの間、送信枠を保持する
+        """
+        scheduler = self.scheduler or get_scheduler()
+        return scheduler.slot(model or self.model, self.api_key, self.priority)
+
+    def _build_headers(self):
+        """
+        APIリクエストのヘッダーを作成する内部メソッド
+
+        Returns:
+            dict: リクエストヘッダー
+        """
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "HTTP-Referer": "http://localhost",  # ローカル開発用
+            "X-Title": "ChatAgent",  # アプリケーション名
+            "Content-Type": "application/json",
+        }
+
+    def _candidate_models(self):
+        """
+        リクエストを送信するモデルを試す順に返す内部メソッド
+
+        Returns:
+            list: ルーターがある場合は用途のモデルとフォールバックのモデル、ない場合はself.modelだけ
+        """
+        if self.router is None:
+            return [self.model]
+        return self.router.candidates(self.purpose)
+
+    def _build_request_data(self, messages=None, model=None):
+        """
+        APIリクエストのデータを作成する内部メソッド
+
+        Args:
+            messages (History, optional): 送信するメッセージ。Noneの場合は会話履歴
+            model (str, optional): 送信するモデル。Noneの場合は最初に試すモデル
+
+        Returns:
+            dict: リクエストデータ
+        """
+        request_data = {
+            "model": model or self._candidate_models()[0],
+            "messages": self.conversation_history if messages is None else messages
+        }
+        if self.temperature is not None:
+            request_data["temperature"] = self.temperature
+        return request_data
+
+    def _encode_request(self, request_data, stream=False):
+        """
+        リクエストデータを1回だけJSONにシリアライズし、ログに記録する内部メソッド
+
+        Args:
+            request_data (dict): リクエストデータ
+            stream (bool): ストリーミングモードで送信する場合はTrue
+
+        Returns:
+            tuple: (streamフラグを除いたJSON（キャッシュのキーに使う）, 送信するJSON) いずれもbytes
+        """
+        fields = {key: value for key, value in request_data.items() if key != "messages"}
+        head = json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        # メッセージは各メッセージのエンコード済みのJSONを再利用し、末尾に連結する
+        payload = (
+            head[:-1] + (b"," if fields else b"")
+            + b'"messages":' + encode_messages(request_data["messages"]) + b"}"
+        )
+        # streamフラグは末尾に追加するだけなので、シリアライズし直さない
+        body = payload[:-1] + b',"stream":true}' if stream else payload
+        log_request(logger, request_data, body)
+        return payload, body
+
+    def _cache_key(self, payload):
+        """
+        応答キャッシュのキーを返す内部メソッド
+
+        Args:
+            payload (bytes): streamフラグを除いたリクエストのJSON
+
+        Returns:
+            str or None: キー（キャッシュが無効な場合や、temperatureが0以外のリクエストはNone）
+        """
+        if self.cache is None or self.temperature not in (None, 0):
+            return None
+        return self.cache.make_key(payload)
+
+    def _use_cached(self, cached):
+        # キャッシュから返した応答もAIの応答として会話履歴に追加する
+        self.last_usage = None
+        current_span().set(cached=True)
+        self._append_message("assistant", cached)
+
+    def _lookup_cache(self, payload):
+        """
+        応答キャッシュを参照する内部メソッド
+        キャッシュが無効な場合や、temperatureが0以外のリクエストは参照しません
+
+        Args:
+            payload (bytes): streamフラグを除いたリクエストのJSON
+
+        Returns:
+            tuple: (キャッシュのキー（対象外の場合はNone）, キャッシュされた応答（ない場合はNone）)
+        """
+        cache_key = self._cache_key(payload)
+        if cache_key is None:
+            return None, None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._use_cached(cached)
+        return cache_key, cached
+
+    def _store_cache(self, cache_key, content):
+        """
+        応答を応答キャッシュに保存する内部メソッド
+
+        Args:
+            cache_key (str): キャッシュのキー
+            content (str): AIからの応答
+        """
+        self.cache.set(cache_key, content)
+
+    def _post_request(self, body, model=None):
+        """
+        スケジューラの送信枠を得てからAPIリクエストを送信し、レスポンスのJSONを返す内部メソッド
+        （共有セッションでコネクションを再利用する）
+        ヘッジングで送信している場合、送信枠を得るまでに別のモデルが先に応答したら、送信せずに中止します
+
+        Args:
+            body (bytes): 送信するJSON
+            model (str, optional): bodyのモデル。Noneの場合はself.model
+
+        Returns:
+            dict: JSONとして解析したレスポンス
+
+        Raises:
+            HedgeCancelled: ヘッジングで別のモデルが先に応答したため、リクエストを中止した場合
+        """
+        abort = hedge_abort_event()
+        with self._request_slot(model):
+            if abort is not None and abort.is_set():
+                raise HedgeCancelled()
+            with span("http.post", model=model or self.model):
+                response = self.session.post(
+                    url=get_api_url(),
+                    headers=self._build_headers(),
+                    data=body,
+                    timeout=get_timeout()
+                )
+            with span("agent.decode", bytes=len(response.content)):
+                return response.json()
+
+    def _post_routed(self, request_data, body):
+        """
+        ルーターの候補モデルに、フォールバックとヘッジングをしながらリクエストを送信する内部メソッド
+
+        Args:
+            request_data (dict): 最初のモデルのリクエストデータ
+            body (bytes): 最初のモデルの送信するJSON
+
+        Returns:
+            dict: 応答したモデルのレスポンス（すべて失敗した場合は最後のエラーのレスポンス）
+        """
+        if self.router is None:
+            return self._post_request(body)
+
+        def send(model):
+            # 最初のモデル以外は、モデル名を差し替えてエンコードし直す
+            data = body
+            if model != request_data["model"]:
+                data = self._encode_request(dict(request_data, model=model))[1]
+            response_data = self._post_request(data, model)
+            if not response_data.get("choices"):
+                raise ModelResponseError(response_data)
+            return response_data
+
+        try:
+            model, response_data = self.router.call(self.purpose, send)
+        except ModelResponseError as e:
+            return e.response_data
+        current_span().set(model=model)
+        return response_data
+
+    def _handle_response_data(self, response_data, cache_key=None):
+        """
+        APIのレスポンスからAIの応答を取り出し、会話履歴に追加する内部メソッド
+
+        Args:
+            response_data (dict): JSONとして解析したレスポンス
+            cache_key (str, optional): 応答をキャッシュに保存する場合のキー
+
+        Returns:
+            str: AIからの応答メッセージ（またはエラーメッセージ）
+        """
+        self.last_usage = response_data.get("usage")
+        record_usage(self.last_usage)
+        if "choices" in response_data and len(response_data["choices"]) > 0:
+            ai_message = response_data["choices"][0]["message"]["content"]
+            # AIの応答を会話履歴に追加
+            self._append_message("assistant", ai_message)
+            if cache_key is not None:
+                self._store_cache(cache_key, ai_message)
+            return ai_message
+        return f"エラー: 予期しないレスポンス形式です。\n{json.dumps(response_data, indent=2, ensure_ascii=False)}"
+
     def chat(self, message):
         """
         ユーザーメッセージを送信し、AIからの応答を取得するメソッド
@@ -33,7 +461,7 @@ class ChatAgent:
             str: AIからの応答メッセージ
         """
         # ユーザーメッセージを会話履歴に追加
-        self.conversation_history.append({"role": "user", "content": message})
+        self._append_message("user", message)
         
         # APIリクエストを送信し、応答を取得
         response = self._send_api_request()
@@ -49,73 +477,384 @@ class ChatAgent:
             str: AIからの応答メッセージ
         """
         # APIキーのチェック
-        if not self.api_key or self.api_key == "your_openrouter_api_key":
-            return "エラー: OpenRouterのAPIキーが設定されていません。.envファイルを確認してください。"
+        if not self._has_api_key():
+            return API_KEY_ERROR
         
-        try:
-            # リクエストデータの準備
-            request_data = {
-                "model": self.model,
-                "messages": self.conversation_history
-            }
-            
-            # リクエストデータを青色で出力
-            print("\033[94m" + "OpenRouterへの送信データ:" + "\033[0m")
-            print("\033[94m" + json.dumps(request_data, indent=2, ensure_ascii=False) + "\033[0m")
-            
-            # APIリクエストを送信
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "HTTP-Referer": "http://localhost",  # ローカル開発用
-                    "X-Title": "ChatAgent",  # アプリケーション名
-                },
-                data=json.dumps(request_data)
-            )
-            
-            # レスポンスをJSONとして解析
-            response_data = response.json()
-            
-            # レスポンスからAIの応答を抽出
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                ai_message = response_data["choices"][0]["message"]["content"]
-                # AIの応答を会話履歴に追加
-                self.conversation_history.append({"role": "assistant", "content": ai_message})
-                return ai_message
-            else:
-                return f"エラー: 予期しないレスポンス形式です。\n{json.dumps(response_data, indent=2, ensure_ascii=False)}"
+        with span("agent.request", model=self.model, stream=False) as request_span:
+            try:
+                # リクエストデータの準備（JSONへのシリアライズは1回だけ行う）
+                request_data = self._build_request_data()
+                payload, body = self._encode_request(request_data)
                 
-        except Exception as e:
-            return f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}"
+                # 同じリクエストの応答がキャッシュにあればそれを返す
+                cache_key, cached = self._lookup_cache(payload)
+                if cached is not None:
+                    return cached
+                
+                # スケジューラの送信枠を得てからAPIリクエストを送信（共有セッションでコネクションを再利用する）
+                # ルーターがある場合は、エラー時に次の候補モデルを試し、遅い応答にはヘッジングする
+                response_data = self._post_routed(request_data, body)
+                
+                # レスポンスをJSONとして解析し、AIの応答を抽出
+                return self._handle_response_data(response_data, cache_key)
+                    
+            except Exception as e:
+                request_span.set_error(str(e))
+                return f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}"
             
+    def chat_stream(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答をストリーミングで受け取るメソッド
+        応答が完了すると、全体の応答が会話履歴に追加されます
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Yields:
+            str: AIからの応答の差分（トークン単位の断片）
+        """
+        # ユーザーメッセージを会話履歴に追加
+        self._append_message("user", message)
+
+        # ストリーミングでAPIリクエストを送信し、差分をそのまま返す
+        yield from self._send_api_request_stream()
+
+    def _send_api_request_stream(self):
+        """
+        OpenRouterのAPIにストリーミング（SSE）でリクエストを送信する内部メソッド
+
+        Yields:
+            str: AIからの応答の差分
+        """
+        # APIキーのチェック
+        if not self._has_api_key():
+            yield API_KEY_ERROR
+            return
+
+        started = time.perf_counter()
+        self.last_usage = None
+        with span("agent.request", model=self.model, stream=True) as request_span:
+            try:
+                # リクエストデータの準備（JSONへのシリアライズは1回だけ行う）
+                request_data = self._build_request_data()
+                payload, body = self._encode_request(request_data, stream=True)
+
+                # 同じリクエストの応答がキャッシュにあれば、1つの差分としてまとめて返す
+                cache_key, cached = self._lookup_cache(payload)
+                if cached is not None:
+                    yield cached
+                    return
+
+                # 候補モデルに順に送信する（ルーターがない場合はself.modelだけ）
+                # 最初の差分を返す前に失敗した場合は、次の候補モデルで送信し直す
+                models = self._candidate_models()
+                chunks = []
+                completed = False
+                for index, model in enumerate(models):
+                    if index:
+                        request_span.set(model=model, fallback=index)
+                        body = self._encode_request(self._build_request_data(model=model), stream=True)[1]
+                    error = None
+                    try:
+                        with contextlib.closing(self._stream_events(body, model)) as events:
+                            for kind, value in events:
+                                if kind == "done":
+                                    completed = True
+                                    break
+                                if kind == "http_error":
+                                    # ストリーミングが開始できなかった場合は通常のJSONとしてエラーを返す
+                                    error = f"エラー: 予期しないレスポンス形式です。\n{value}"
+                                    break
+                                if kind == "error":
+                                    error = f"エラー: APIリクエスト中に問題が発生しました。\n{json.dumps(value, ensure_ascii=False)}"
+                                    break
+                                if kind == "usage":
+                                    self.last_usage = value
+                                    record_usage(value)
+                                if kind == "delta":
+                                    if not chunks:
+                                        request_span.set(first_token=time.perf_counter() - started)
+                                    chunks.append(value)
+                                    yield value
+                    except Exception as e:
+                        if chunks or index == len(models) - 1:
+                            raise
+                        error = str(e)
+                    if self.router is not None:
+                        self.router.record(model, ok=error is None)
+                    if error is None:
+                        break
+                    if chunks or index == len(models) - 1:
+                        yield error
+                        return
+
+                # 最終的な応答を会話履歴に追加
+                ai_message = "".join(chunks)
+                self._append_message("assistant", ai_message)
+                if cache_key is not None and completed:
+                    self._store_cache(cache_key, ai_message)
+
+            except Exception as e:
+                request_span.set_error(str(e))
+                yield f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}"
+
+    def _stream_events(self, body, model=None):
+        """
+        スケジューラの送信枠を得てからストリーミングでAPIリクエストを送信し、SSEのイベントを順に返す内部メソッド
+        送信枠はストリームを読み終えるまで（ジェネレーターを閉じるまで）保持します
+
+        Args:
+            body (bytes): 送信するJSON
+            model (str, optional): bodyのモデル。Noneの場合はself.model
+
+        Yields:
+            tuple: parse_sse_lineと同じ (種別, 値)。ストリーミングを開始できなかった場合は ("http_error", レスポンスの本文)
+        """
+        with self._request_slot(model):
+            with span("http.post", model=model or self.model):
+                response = self.session.post(
+                    url=get_api_url(),
+                    headers=self._build_headers(),
+                    data=body,
+                    timeout=get_timeout(),
+                    stream=True
+                )
+
+            with response:
+                if response.status_code != 200:
+                    yield "http_error", response.text
+                    return
+
+                # SSEはUTF-8で送られてくる
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    kind, value = parse_sse_line(line)
+                    if kind is not None:
+                        yield kind, value
+
+    @staticmethod
+    def _batch_result(content=None, error=None, usage=None, cached=False):
+        return {"content": content, "error": error, "usage": usage, "cached": cached}
+
+    def _plan_batch(self, histories, dedupe):
+        """
+        一括送信する会話をエンコードし、送信するリクエストの一覧を作成する内部メソッド
+
+        Args:
+            histories (list): 会話（メッセージのリスト、または1件のユーザーメッセージとしての文字列）のリスト
+            dedupe (bool): Trueの場合、送信データがまったく同じ会話は1回だけ送信する
+
+        Returns:
+            tuple: (入力ごとのリクエストのキー, {キー: (リクエストデータ, body, キャッシュのキー)}, {キー: 送信前に決まった結果})
+        """
+        keys = []
+        requests = {}
+        results = {}
+        for index, history in enumerate(histories):
+            try:
+                if isinstance(history, str):
+                    history = [Message("user", history)]
+                request_data = self._build_request_data(History(history))
+                payload, body = self._encode_request(request_data)
+            except Exception as e:
+                keys.append(index)
+                results[index] = self._batch_result(error=f"エラー: 会話を送信できる形式に変換できません。\n{str(e)}")
+                continue
+
+            key = body if dedupe else index
+            keys.append(key)
+            if key in requests or key in results:
+                continue
+            cache_key = self._cache_key(payload)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    results[key] = self._batch_result(content=cached, cached=True)
+                    continue
+            requests[key] = (request_data, body, cache_key)
+        return keys, requests, results
+
+    def _finish_batch_item(self, response_data, cache_key):
+        """
+        一括送信した1件のレスポンスから結果を作成する内部メソッド（会話履歴は変更しない）
+
+        Args:
+            response_data (dict): JSONとして解析したレスポンス
+            cache_key (str, optional): 応答をキャッシュに保存する場合のキー
+
+        Returns:
+            dict: content, error, usage, cached
+        """
+        usage = response_data.get("usage")
+        record_usage(usage)
+        choices = response_data.get("choices")
+        if not choices:
+            return self._batch_result(
+                error=f"エラー: 予期しないレスポンス形式です。\n{json.dumps(response_data, indent=2, ensure_ascii=False)}",
+                usage=usage,
+            )
+        content = choices[0]["message"]["content"]
+        if cache_key is not None:
+            self._store_cache(cache_key, content)
+        return self._batch_result(content=content, usage=usage)
+
+    def _send_batch_item(self, request_data, body, cache_key):
+        with span("agent.request", model=request_data["model"], stream=False, batch=True) as request_span:
+            try:
+                return self._finish_batch_item(self._post_routed(request_data, body), cache_key)
+            except Exception as e:
+                request_span.set_error(str(e))
+                return self._batch_result(error=f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}")
+
+    def chat_many(self, histories, max_concurrency=None, dedupe=False):
+        """
+        独立した複数の会話を同時に送信し、それぞれのAIの応答を入力と同じ順に返すメソッド
+        このエージェントのモデル（ルーターがある場合はフォールバックとヘッジングも）・temperature・応答キャッシュ・優先度を使い、会話履歴は変更しません
+
+        - リクエストは共有のコネクションプールを使って並行に送信され、スケジューラのレート制限に従います
+        - 1件の失敗は他の会話に影響せず、その会話の結果のerrorに記録されます
+        - dedupe=Trueの場合、送信データがまったく同じ会話は1回だけ送信し、結果を共有します
+          （temperatureが0以外の場合は、同じ会話でも別の応答を得たいことがあるため、既定では無効です）
+
+        Args:
+            histories (list): 会話（{"role", "content"} の辞書・Messageのリスト、
+                              または1件のユーザーメッセージとしての文字列）のリスト
+            max_concurrency (int, optional): 同時に送信するリクエスト数の上限。デフォルトはコネクションプールのサイズ
+            dedupe (bool): Trueの場合、同じ送信データの会話をまとめて1回だけ送信する
+
+        Returns:
+            list: 入力と同じ順の結果 {"content": 応答, "error": エラーメッセージ（成功時はNone）,
+                  "usage": トークン使用量, "cached": キャッシュから返した場合はTrue}
+        """
+        if not self._has_api_key():
+            return [self._batch_result(error=API_KEY_ERROR) for _ in histories]
+
+        keys, requests, results = self._plan_batch(histories, dedupe)
+        if requests:
+            workers = min(len(requests), max_concurrency or get_config()["pool_maxsize"])
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat_many") as executor:
+                futures = {key: executor.submit(self._send_batch_item, *request) for key, request in requests.items()}
+                for key, future in futures.items():
+                    results[key] = future.result()
+        # 重複をまとめた会話にも、それぞれ別の辞書を返す
+        return [dict(results[key]) for key in keys]
+
     def reset_conversation(self):
         """
         会話履歴をリセットするメソッド
         """
-        self.conversation_history = []
+        self.conversation_history = History()
 
 class ContextAwareAgent(ChatAgent):
     """
     ChatAgentを拡張し、会話履歴を圧縮する機能とシステムプロンプトを使用する機能を持つクラス
     """
     
-    def __init__(self, model="google/gemini-2.0-flash-lite-001", system_prompt=None):
+    # 要約を含むメッセージの接頭辞（要約対象の会話からは取り除く）
+    SUMMARY_PREFIX = "これまでの会話の概要："
+    MESSAGE_PREFIX = "\n\nメッセージ："
+
+    def __init__(self, model="google/gemini-2.0-flash-lite-001", system_prompt=None,
+                 token_budget=None, keep_recent_turns=4, compaction_length=400, max_summary_attempts=3,
+                 cache=None, temperature=None, priority=PRIORITY_INTERACTIVE, scheduler=None,
+                 prompt_caching=False, cache_summary=False, router=None, purpose=PURPOSE_CHAT,
+                 background_compaction=False):
         """
         ContextAwareAgentクラスのコンストラクタ
         
         Args:
             model (str): 使用するAIモデルの名前
             system_prompt (str, optional): 直接指定するシステムプロンプト。デフォルトはNone
+            token_budget (int, optional): 会話履歴の推定トークン数の上限。超えると古い会話を自動で要約する。
+                                          Noneの場合は自動圧縮しない
+            keep_recent_turns (int): 自動圧縮時に要約せずそのまま残す直近のターン数
+            compaction_length (int): 自動圧縮で作成する要約の目標文字数
+            max_summary_attempts (int): 1回の要約で要約用エージェントに依頼する回数の上限
+            cache (ResponseCache, optional): 応答キャッシュ（ChatAgentと同じ）
+            temperature (float, optional): 生成時のtemperature（ChatAgentと同じ）
+            priority (int): リクエストの優先度（ChatAgentと同じ）。要約のリクエストは常にPRIORITY_BACKGROUND
+            scheduler (RequestScheduler, optional): 使用するスケジューラ（ChatAgentと同じ）
+            prompt_caching (bool): Trueの場合、システムプロンプトにプロンプトキャッシュの区切り（cache_control）を付けて送信する
+            cache_summary (bool): prompt_cachingと併用した場合、要約をユーザーメッセージに付加せず、
+                                  システムプロンプトの後ろに区切りを付けて置く
+            router (ModelRouter, optional): モデルのルーター（ChatAgentと同じ）。要約にはルーターの要約用のモデルを使う
+            purpose (str): リクエストの用途（ChatAgentと同じ）
+            background_compaction (bool): Trueの場合、自動圧縮の要約をバックグラウンドで行い、
+                                          要約中も現在の会話履歴のままターンを続ける
         """
-        super().__init__(model)
+        super().__init__(model, cache=cache, temperature=temperature, priority=priority, scheduler=scheduler,
+                         router=router, purpose=purpose)
         self.summary = None  # 会話の要約を保存する変数
         self.system_prompt = None  # システムプロンプトを保存する変数
+        self.prompt_caching = prompt_caching
+        self.cache_summary = cache_summary
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.compaction_length = compaction_length
+        self.max_summary_attempts = max_summary_attempts
+        self.last_summary_metrics = None  # 直前の要約の試行回数・トークン数・所要時間
+        self.background_compaction = background_compaction
+        self._compaction = None  # 実行中のバックグラウンドの要約 (Future, 要約する古いメッセージ, 中止イベント)
         
         # システムプロンプトが指定されている場合
         if system_prompt:
             self._set_system_prompt(system_prompt)
     
+    def _create_summary_agent(self):
+        """
+        要約用のエージェントを作成する内部メソッド
+        要約のリクエストは対話のターンより後回しにされるよう、バックグラウンドの優先度で送信します
+        ルーターがある場合は、要約用のモデル（PURPOSE_SUMMARY）を使います
+
+        Returns:
+            ChatAgent: 要約用のエージェント
+        """
+        return ChatAgent(self.model, priority=PRIORITY_BACKGROUND, scheduler=self.scheduler,
+                         router=self.router, purpose=PURPOSE_SUMMARY)
+
+    @classmethod
+    def resume(cls, store, session_id, max_messages=None, **options):
+        """
+        セッションストアから会話を再開するメソッド（システムプロンプトを省略した場合は保存されているもの）
+
+        Args:
+            store (SessionStore): セッションストア
+            session_id (str): セッションID
+            max_messages (int, optional): 読み込むメッセージ数の上限（末尾から数える）
+            **options: コンストラクタに渡す引数
+
+        Returns:
+            ContextAwareAgent: 会話を再開したエージェント
+        """
+        info = store.get_session(session_id)
+        if info and info["system_prompt"]:
+            options.setdefault("system_prompt", info["system_prompt"])
+        return super().resume(store, session_id, max_messages, **options)
+
+    def _restore_history(self, summary, messages):
+        self.summary = summary
+        self._refresh_system_message()
+        self.conversation_history.extend(messages)
+
+    def _save_summary(self, kept_messages=0):
+        """
+        要約をセッションストアに保存する内部メソッド
+        再開時は、この要約と、会話履歴に残した直近のメッセージ以降が読み込まれます
+
+        Args:
+            kept_messages (int): 要約せずに会話履歴に残したメッセージの数
+        """
+        if self.store is None:
+            return
+        store, session_id, summary = self.store, self.session_id, self.summary
+
+        def save():
+            # 連番は、それまでの追記がすべて書き込まれた時点で数える
+            upto_seq = max(0, store.next_seq(session_id) - kept_messages)
+            store.save_summary(session_id, summary, upto_seq)
+
+        self._write_store(save)
+
     def _set_system_prompt(self, prompt_text):
         """
         システムプロンプトを直接設定するメソッド
@@ -127,18 +866,384 @@ class ContextAwareAgent(ChatAgent):
             self.system_prompt = prompt_text
             # 会話履歴の先頭にシステムプロンプトを追加
             if not self.conversation_history or self.conversation_history[0].get("role") != "system":
-                self.conversation_history.insert(0, {"role": "system", "content": self.system_prompt})
-    
+                self.conversation_history.insert(0, self._build_system_message())
+
+    @property
+    def _summary_in_prefix(self):
+        """
+        要約をシステムメッセージに置く（ユーザーメッセージに付加しない）場合はTrue
+        """
+        return self.prompt_caching and self.cache_summary
+
+    def _build_system_message(self):
+        """
+        会話履歴の先頭に置くシステムメッセージを作成する内部メソッド
+        プロンプトキャッシュが有効な場合は、システムプロンプト（ツール一覧を含む）と要約を別々のパートにし、
+        それぞれの末尾にキャッシュの区切りを付けます。要約が変わってもシステムプロンプトの部分はキャッシュが効きます
+
+        Returns:
+            Message or None: システムメッセージ（システムプロンプトも要約もない場合はNone）
+        """
+        if not self.prompt_caching:
+            return Message("system", self.system_prompt) if self.system_prompt else None
+        parts = [self.system_prompt] if self.system_prompt else []
+        if self._summary_in_prefix and self.summary:
+            separator = "\n\n" if parts else ""
+            parts.append(f"{separator}{self.SUMMARY_PREFIX}{self.summary}")
+        return CachedMessage("system", parts) if parts else None
+
+    def _refresh_system_message(self):
+        """
+        システムプロンプトや要約の変更を、会話履歴の先頭のシステムメッセージに反映する内部メソッド
+        """
+        history = self.conversation_history
+        message = self._build_system_message()
+        has_system = bool(history) and history[0].get("role") == "system"
+        if message is None:
+            if has_system:
+                del history[0]
+        elif has_system:
+            history[0] = message
+        else:
+            history.insert(0, message)
+
     def reset_conversation(self):
         """
         会話履歴をリセットするメソッド
         システムプロンプトは保持する
         """
-        self.conversation_history = []
+        self.conversation_history = History()
         # システムプロンプトがある場合は再追加
-        if self.system_prompt:
-            self.conversation_history.append({"role": "system", "content": self.system_prompt})
+        message = self._build_system_message()
+        if message is not None:
+            self.conversation_history.append(message)
     
+    def _get_messages_to_summarize(self):
+        """
+        システムプロンプトを除外した、要約対象の会話履歴を取得する内部メソッド
+
+        Returns:
+            list: 要約対象のメッセージのリスト
+        """
+        return [msg for msg in self.conversation_history if msg.get("role") != "system"]
+
+    def _render_transcript(self, messages):
+        """
+        メッセージのリストを要約用の会話テキストに変換する内部メソッド
+        ユーザーメッセージに付加した過去の要約は取り除きます
+
+        Args:
+            messages (list): Messageのリスト
+
+        Returns:
+            str: 「ユーザー: ...」「AI: ...」形式の会話テキスト
+        """
+        parts = []
+        for message in messages:
+            content = message.content
+            if message.role != "user":
+                parts.append(f"AI: {content}\n\n")
+                continue
+            if content.startswith(self.SUMMARY_PREFIX) and self.MESSAGE_PREFIX in content:
+                content = content.split(self.MESSAGE_PREFIX, 1)[1]
+            parts.append(f"ユーザー: {content}\n\n")
+        # 文字列の連結を繰り返さず、最後に1回だけ結合する
+        return "".join(parts)
+
+    def _build_summary_prompt(self, messages, target_length):
+        """
+        要約を依頼するプロンプトを作成する内部メソッド
+
+        Args:
+            messages (list): 要約対象のメッセージのリスト
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            str: 要約指示のプロンプト
+        """
+        # 会話履歴を文字列化
+        conversation_text = self._render_transcript(messages)
+        
+        # 要約指示のプロンプト
+        return f"""
+以下の会話を{target_length}文字程度に要約してください。
+要約は、会話の重要なポイントを含み、文脈を理解できるものにしてください。
+私の発言とあなたの発言が明確に区別できるような要約文にしてください。
+
+会話：
+{conversation_text}
+
+要約文字数: {target_length}文字程度
+"""
+
+    def _build_enhanced_message(self, message):
+        """
+        要約がある場合に、要約を含むメッセージを作成する内部メソッド
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Returns:
+            str: 送信するメッセージ
+        """
+        # 要約をシステムメッセージに置いている場合は付加しない
+        if self.summary and not self._summary_in_prefix:
+            return f"{self.SUMMARY_PREFIX}{self.summary}{self.MESSAGE_PREFIX}{message}"
+        return message
+
+    def _build_request_data(self, messages=None, model=None):
+        """
+        APIリクエストのデータを作成する内部メソッド
+        会話履歴を送信する場合は、最後のユーザーメッセージに要約を付加します
+        （会話履歴には要約を付加しないため、要約が残したメッセージごとに重複して送信・推定されません）
+
+        Args:
+            messages (History, optional): 送信するメッセージ。Noneの場合は会話履歴
+            model (str, optional): 送信するモデル。Noneの場合は最初に試すモデル
+
+        Returns:
+            dict: リクエストデータ
+        """
+        if messages is None and self.summary and not self._summary_in_prefix:
+            messages = History(self.conversation_history)
+            for index in range(len(messages) - 1, -1, -1):
+                if messages[index].role == "user":
+                    messages[index] = Message("user", self._build_enhanced_message(messages[index].content))
+                    break
+        return super()._build_request_data(messages, model)
+
+    def _select_compaction_window(self):
+        """
+        自動圧縮で要約する古い会話と、そのまま残す直近の会話を選ぶ内部メソッド
+        会話履歴の推定トークン数がtoken_budgetを超えていない場合や、
+        直近のターンより古い会話がない場合はNoneを返します
+        直近のターンだけでtoken_budgetを超える場合は、要約しても予算を下回らず毎ターン圧縮することになるため、
+        要約する古い会話だけでtoken_budgetを超えるまで待ちます
+
+        Returns:
+            tuple or None: (要約する古いメッセージのリスト, 残す直近のメッセージのリスト)
+        """
+        if self.token_budget is None:
+            return None
+        total_tokens = estimate_messages_tokens(self.conversation_history)
+        if total_tokens <= self.token_budget:
+            return None
+
+        messages = self._get_messages_to_summarize()
+        # ターンの区切り（ユーザーメッセージの位置）
+        turn_starts = [i for i, message in enumerate(messages) if message["role"] == "user"]
+        if len(turn_starts) <= self.keep_recent_turns:
+            return None
+
+        cut = turn_starts[-self.keep_recent_turns] if self.keep_recent_turns > 0 else len(messages)
+        if cut == 0:
+            return None
+        old_tokens = estimate_messages_tokens(messages[:cut])
+        if total_tokens - old_tokens > self.token_budget and old_tokens <= self.token_budget:
+            return None
+        return messages[:cut], messages[cut:]
+
+    def _build_compaction_prompt(self, messages):
+        """
+        既存の要約に古い会話を追加して要約し直すプロンプトを作成する内部メソッド
+
+        Args:
+            messages (list): 要約に追加する古いメッセージのリスト
+
+        Returns:
+            str: 要約指示のプロンプト
+        """
+        return f"""
+これまでの会話の要約と、その続きの会話があります。
+要約に続きの会話の重要なポイントを追加し、{self.compaction_length}文字程度の新しい要約を作成してください。
+要約は、会話の重要なポイントを含み、文脈を理解できるものにしてください。
+私の発言とあなたの発言が明確に区別できるような要約文にしてください。
+
+これまでの要約：
+{self.summary or "（なし）"}
+
+続きの会話：
+{self._render_transcript(messages)}
+
+要約文字数: {self.compaction_length}文字程度
+"""
+
+    def _apply_compaction(self, summary, recent_messages):
+        """
+        新しい要約を保存し、会話履歴を直近のメッセージだけに置き換える内部メソッド
+
+        Args:
+            summary (str): 新しい要約
+            recent_messages (list): そのまま残す直近のメッセージのリスト
+        """
+        self.summary = summary
+        self.reset_conversation()
+        self.conversation_history.extend(recent_messages)
+        self._save_summary(len(recent_messages))
+
+    def compact(self):
+        """
+        会話履歴がトークン予算を超えている場合に、古い会話だけを要約して圧縮するメソッド
+        直近keep_recent_turnsターンはそのまま残し、新しい要約は既存の要約に積み上げます
+
+        Returns:
+            str or None: 更新後の要約（圧縮しなかった場合はNone）
+        """
+        window = self._select_compaction_window()
+        if window is None:
+            return None
+        old_messages, recent_messages = window
+
+        summary = self._summarize_compaction(self._build_compaction_prompt(old_messages), len(old_messages))
+        # 要約に失敗した場合は会話履歴を変更しない
+        if summary is None:
+            return None
+
+        self._apply_compaction(summary, recent_messages)
+        return summary
+
+    def _summarize_compaction(self, prompt, message_count, cancelled=None):
+        """
+        自動圧縮の要約を作成する内部メソッド（バックグラウンドのスレッドからも呼ばれる）
+
+        Args:
+            prompt (str): 要約指示のプロンプト
+            message_count (int): 要約するメッセージの数（計測用）
+            cancelled (threading.Event, optional): 設定されると要約を中止するイベント
+
+        Returns:
+            str or None: 新しい要約（失敗した場合や中止した場合はNone）
+        """
+        summarizer = Summarizer(self._create_summary_agent(), max_attempts=self.max_summary_attempts,
+                                cancelled=cancelled)
+        with span("agent.compact", model=self.model, messages=message_count, background=cancelled is not None):
+            summary, self.last_summary_metrics = summarizer.summarize(prompt, self.compaction_length)
+        return summary
+
+    def _launch_compaction(self, prompt, message_count, cancelled):
+        """
+        要約をバックグラウンドで開始する内部メソッド
+
+        Returns:
+            Future: done() / result() / cancel() を持つ実行中の要約
+        """
+        # スパンの親子関係を保つため、呼び出し元のコンテキストで実行する
+        return get_compaction_executor().submit(
+            contextvars.copy_context().run, self._summarize_compaction, prompt, message_count, cancelled
+        )
+
+    @property
+    def compaction_pending(self):
+        """
+        バックグラウンドの要約が実行中（または結果を反映する前）の場合はTrue
+        """
+        return self._compaction is not None
+
+    def start_compaction(self):
+        """
+        会話履歴がトークン予算を超えている場合に、古い会話の要約をバックグラウンドで開始するメソッド
+        要約中も現在の会話履歴のままターンを続けられ、要約が終わった後の最初のターン
+        （またはpoll_compaction / wait_compaction）で、要約と会話履歴を置き換えます
+
+        Returns:
+            bool: 要約を開始した場合はTrue（実行中の要約がある場合や、圧縮の必要がない場合はFalse）
+        """
+        if self._compaction is not None:
+            return False
+        window = self._select_compaction_window()
+        if window is None:
+            return False
+        old_messages, _ = window
+        # 要約のプロンプトは開始時点の要約と会話から作る
+        prompt = self._build_compaction_prompt(old_messages)
+        cancelled = threading.Event()
+        self._compaction = (self._launch_compaction(prompt, len(old_messages), cancelled), old_messages, cancelled)
+        return True
+
+    def _finish_compaction(self, summary, old_messages):
+        """
+        バックグラウンドの要約の結果を会話履歴に反映する内部メソッド
+        要約の開始後に届いたターンは、直近のメッセージと一緒にそのまま残します
+        要約中に会話履歴がリセットされた場合（cleanupなど）は、結果を捨てます
+
+        Args:
+            summary (str or None): 新しい要約
+            old_messages (list): 要約した古いメッセージのリスト
+
+        Returns:
+            str or None: 反映した要約（反映しなかった場合はNone）
+        """
+        if summary is None:
+            return None
+        messages = self._get_messages_to_summarize()
+        if len(messages) < len(old_messages) or any(a is not b for a, b in zip(messages, old_messages)):
+            return None
+        self._apply_compaction(summary, messages[len(old_messages):])
+        return summary
+
+    def poll_compaction(self):
+        """
+        バックグラウンドの要約が終わっていれば、その結果を会話履歴に反映するメソッド（待たずに戻る）
+
+        Returns:
+            str or None: 反映した要約（実行中・失敗・反映しなかった場合はNone）
+        """
+        if self._compaction is None or not self._compaction[0].done():
+            return None
+        job, old_messages, _ = self._compaction
+        self._compaction = None
+        if job.cancelled() or job.exception() is not None:
+            return None
+        return self._finish_compaction(job.result(), old_messages)
+
+    def wait_compaction(self, timeout=None):
+        """
+        バックグラウンドの要約が終わるまで待ち、その結果を会話履歴に反映するメソッド
+
+        Args:
+            timeout (float, optional): 待つ時間の上限（秒）。Noneの場合は終わるまで待つ
+
+        Returns:
+            str or None: 反映した要約
+        """
+        if self._compaction is None:
+            return None
+        concurrent.futures.wait([self._compaction[0]], timeout=timeout)
+        return self.poll_compaction()
+
+    def cancel_compaction(self):
+        """
+        実行中のバックグラウンドの要約を取り消すメソッド
+        送信中の要約のリクエストは止められないため、次の依頼の前に中止し、結果は使いません
+
+        Returns:
+            bool: 取り消した場合はTrue
+        """
+        if self._compaction is None:
+            return False
+        job, _, cancelled = self._compaction
+        self._compaction = None
+        cancelled.set()
+        job.cancel()
+        return True
+
+    def close(self):
+        """
+        会話を終了するメソッド（実行中のバックグラウンドの要約を取り消す）
+        """
+        self.cancel_compaction()
+
+    def _compact_before_turn(self):
+        """
+        ターンの送信前に、会話履歴がトークン予算を超えていれば圧縮する内部メソッド
+        background_compactionの場合は、終わった要約を反映し、必要なら次の要約をバックグラウンドで開始します
+        """
+        if not self.background_compaction:
+            self.compact()
+            return
+        self.poll_compaction()
+        self.start_compaction()
+
     def cleanup(self, target_length):
         """
         会話履歴を圧縮するメソッド
@@ -155,52 +1260,31 @@ class ContextAwareAgent(ChatAgent):
             return None
             
         # システムプロンプトを除外した会話履歴を取得
-        conversation_to_summarize = [msg for msg in self.conversation_history if msg.get("role") != "system"]
+        conversation_to_summarize = self._get_messages_to_summarize()
         if not conversation_to_summarize:
             return None
-            
-        # 新たなChatAgentインスタンスを作成
-        summarizer = ChatAgent(self.model)
-        
-        # 会話履歴を文字列化
-        conversation_text = ""
-        for message in conversation_to_summarize:
-            role = "ユーザー" if message["role"] == "user" else "AI"
-            conversation_text += f"{role}: {message['content']}\n\n"
-        
-        # 要約指示のプロンプト
-        prompt = f"""
-以下の会話を{target_length}文字程度に要約してください。
-要約は、会話の重要なポイントを含み、文脈を理解できるものにしてください。
-私の発言とあなたの発言が明確に区別できるような要約文にしてください。
 
-会話：
-{conversation_text}
-
-要約文字数: {target_length}文字程度
-"""
-        
-        # 要約を依頼
-        summary = summarizer.chat(prompt)
+        # 実行中のバックグラウンドの要約は、会話全体を要約するため不要になる
+        self.cancel_compaction()
+            
+        # 新たなChatAgentインスタンスで要約を作成する
+        # （文字数の誤差が30%以上ある場合は修正を依頼し、上限回数を超えたら文の区切りで切り詰める）
+        summarizer = Summarizer(self._create_summary_agent(), max_attempts=self.max_summary_attempts)
+        with span("agent.cleanup", model=self.model, messages=len(conversation_to_summarize)):
+            summary, self.last_summary_metrics = summarizer.summarize(
+                self._build_summary_prompt(conversation_to_summarize, target_length), target_length
+            )
         
-        # 文字数をチェック
-        while abs(len(summary) - target_length) / target_length > 0.3:
-            # 誤差が30%以上ある場合は修正を依頼
-            adjustment_prompt = f"""
-先ほどの要約の文字数は{len(summary)}文字でした。
-目標は{target_length}文字です。
-{'より短く' if len(summary) > target_length else 'より詳細に'}要約し直してください。
-
-元の要約：
-{summary}
-"""
-            summary = summarizer.chat(adjustment_prompt)
+        # 要約に失敗した場合は会話履歴を変更しない
+        if summary is None:
+            return None
         
         # 要約を保存
         self.summary = summary
         
         # 会話履歴をリセット（システムプロンプトは保持される）
         self.reset_conversation()
+        self._save_summary()
         
         return summary
     
@@ -215,18 +1299,31 @@ class ContextAwareAgent(ChatAgent):
         Returns:
             str: AIからの応答メッセージ
         """
-        # 要約がある場合は、要約を含むプロンプトを作成
-        if self.summary:
-            enhanced_message = f"これまでの会話の概要：{self.summary}\n\nメッセージ：{message}"
-            return super().chat(enhanced_message)
-        else:
-            # 要約がない場合は通常のchatメソッドを使用
-            return super().chat(message)
+        # 会話履歴がトークン予算を超えていれば、古い会話を要約して圧縮する
+        self._compact_before_turn()
+
+        # 要約がある場合は、送信時に要約を含むプロンプトを使用（会話履歴には元のメッセージを残す）
+        return super().chat(message)
+
+    def chat_stream(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答をストリーミングで受け取るメソッド
+        要約がある場合は、要約を含むプロンプトを使用
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Yields:
+            str: AIからの応答の差分
+        """
+        self._compact_before_turn()
+        yield from super().chat_stream(message)
 
 
 # テスト用コード（直接実行された場合のみ実行）
 if __name__ == "__main__":
     import argparse
+    import sys
     
     # コマンドライン引数の解析
     parser = argparse.ArgumentParser(description='AIチャットエージェント')
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+
+# このプロジェクトのロガーの親の名前
+LOGGER_NAME = "my_agent"
+
+# ログの既定値（環境変数で変更可能）
+#   AGENT_LOG_LEVEL: DEBUG / INFO / WARNING / ERROR
+#   AGENT_LOG_SINK:  stderr / off / ログファイルのパス
+DEFAULT_LEVEL = "WARNING"
+DEFAULT_SINK = "stderr"
+
+# ダイジェスト表示で最後のメッセージを何文字まで表示するか
+PREVIEW_LENGTH = 80
+
+_configured = False
+_lock = threading.Lock()
+
+
+def configure_logging(level=None, sink=None):
+    """
+    ログのレベルと出力先を設定する関数
+
+    Args:
+        level (str or int, optional): ログレベル。Noneの場合は環境変数AGENT_LOG_LEVEL（既定はWARNING）
+        sink (str, optional): 出力先。"stderr"、"off"、またはファイルのパス。
+                              Noneの場合は環境変数AGENT_LOG_SINK（既定はstderr）
+    """
+    global _configured
+    level = level if level is not None else os.getenv("AGENT_LOG_LEVEL", DEFAULT_LEVEL)
+    sink = sink if sink is not None else os.getenv("AGENT_LOG_SINK", DEFAULT_SINK)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+
+    with _lock:
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+        if sink == "off":
+            handler = logging.NullHandler()
+        elif sink == "stderr":
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            handler = logging.FileHandler(sink, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        logger.addHandler(handler)
+        logger.setLevel(logging.CRITICAL + 1 if sink == "off" else level)
+        logger.propagate = False
+        _configured = True
+
+
+def _configure_default():
+    """
+    ハンドラが設定されていない場合だけ、環境変数の設定でログを構成する内部関数
+    """
+    global _configured
+    with _lock:
+        if logging.getLogger(LOGGER_NAME).handlers:
+            _configured = True
+            return
+    configure_logging()
+
+
+def get_logger(name=None):
+    """
+    このプロジェクトのロガーを取得する関数
+    初回呼び出し時に環境変数の設定でログを構成します
+    （組み込み先のアプリが "my_agent" ロガーにハンドラを設定済みの場合は、その設定をそのまま使います）
+
+    Args:
+        name (str, optional): 子ロガーの名前（例: "agent"）
+
+    Returns:
+        logging.Logger: ロガー
+    """
+    if not _configured:
+        _configure_default()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def log_request(logger, request_data, body):
+    """
+    APIに送信するリクエストをログに記録する関数
+    DEBUGの場合は送信データ全体を、INFOの場合はダイジェストだけを記録します
+    （どちらも無効な場合は何もしないため、送信のたびに余計な処理は発生しません）
+
+    Args:
+        logger (logging.Logger): ロガー
+        request_data (dict): リクエストデータ
+        body (bytes): 送信するJSON
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenRouterへの送信データ: %s", body.decode("utf-8"))
+    elif logger.isEnabledFor(logging.INFO):
+        messages = request_data.get("messages") or []
+        last = str(messages[-1].get("content", "")) if messages else ""
+        if len(last) > PREVIEW_LENGTH:
+            last = last[:PREVIEW_LENGTH] + "..."
+        logger.info(
+            "OpenRouterへ送信: model=%s messages=%d bytes=%d sha256=%s last=%r",
+            request_data.get("model"), len(messages), len(body),
+            hashlib.sha256(body).hexdigest()[:12], last,
+        )
@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多数の会話（AsyncManager）を1つのプロセスで提供するHTTP / WebSocketサーバー
+
+- POST   /sessions                   会話を作成する（{"session_id": ...} を返す）
+- DELETE /sessions/{id}              会話を終了する
+- POST   /sessions/{id}/messages     {"message": ...} を送信し、応答をServer-Sent Eventsで受け取る
+- POST   /sessions/{id}/answer       ask_userの問い合わせに {"answer": ...} で回答する
+- GET    /sessions/{id}/ws           WebSocketで {"type": "message", "message": ...} と
+                                     {"type": "answer", "answer": ...} を送り、イベントを受け取る
+- GET    /stats                      会話数・ターン数・ターンの所要時間（p50 / p99）などの統計
+
+イベントはJSONで、次の種類があります
+    {"type": "output", "text": ...}                     応答・ツール実行の出力（ストリーミングの差分を含む）
+    {"type": "ask", "prompt": ...}                      ask_userの問い合わせ（answerで回答する）
+    {"type": "done", "response": ..., "ended": ...}     ターンの終了（ended=Trueの場合は会話も終了）
+    {"type": "error", "error": ...}                     エラー
+
+一定時間使われていない会話は自動で終了します。ツールを実行するToolExecutorはすべての会話で共有します。
+
+使い方:
+    python scripts/agent_server.py --port 8080 --idle-timeout 600
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+import uuid
+
+from aiohttp import WSMsgType, web
+
+try:
+    from .agent_logging import get_logger
+    from .async_agent import close_async_session
+    from .async_manager import AsyncManager
+    from .http_session import configure_session
+    from .instrumentation import span
+    from .scheduler import configure_scheduler
+    from .tool_executor import ToolExecutor
+except ImportError:
+    from agent_logging import get_logger
+    from async_agent import close_async_session
+    from async_manager import AsyncManager
+    from http_session import configure_session
+    from instrumentation import span
+    from scheduler import configure_scheduler
+    from tool_executor import ToolExecutor
+
+logger = get_logger("server")
+
+DEFAULT_MODEL = "google/gemini-2.5-pro-preview-03-25"
+
+# ask_userに回答がなかった場合にツールの結果として返す文字列
+NO_ANSWER = "（ユーザーから回答がありませんでした）"
+
+
+class SessionIO:
+    """
+    AsyncManagerの入出力を、実行中のターンのイベントキューに送るクラス
+    ask_userの問い合わせは "ask" イベントとしてクライアントに送り、answer()で回答を受け取ります
+    """
+
+    def __init__(self, ask_timeout: float = 300.0):
+        """
+        SessionIOクラスのコンストラクタ
+
+        Args:
+            ask_timeout (float): ask_userの回答を待つ時間（秒）。過ぎた場合はNO_ANSWERを返す
+        """
+        self.ask_timeout = ask_timeout
+        self._events = None
+        self._answer = None
+
+    def begin_turn(self) -> asyncio.Queue:
+        """
+        ターンを開始し、そのターンのイベントを受け取るキューを返すメソッド
+        """
+        self._events = asyncio.Queue()
+        return self._events
+
+    def end_turn(self):
+        """
+        ターンを終了するメソッド（回答待ちの問い合わせは取り消す）
+        """
+        self._events = None
+        if self._answer is not None and not self._answer.done():
+            self._answer.cancel()
+
+    def emit(self, event: dict):
+        """
+        実行中のターンにイベントを送るメソッド（ターンの外では何もしない）
+        """
+        if self._events is not None:
+            self._events.put_nowait(event)
+
+    @property
+    def waiting(self) -> bool:
+        """
+        ask_userの回答を待っているかどうか
+        """
+        return self._answer is not None and not self._answer.done()
+
+    def answer(self, text: str) -> bool:
+        """
+        ask_userの問い合わせに回答するメソッド
+
+        Args:
+            text (str): 回答
+
+        Returns:
+            bool: 回答を待っていた場合はTrue
+        """
+        if not self.waiting:
+            return False
+        self._answer.set_result(text)
+        return True
+
+    async def read(self, prompt: str) -> str:
+        """
+        クライアントに問い合わせ、回答を待つメソッド
+
+        Args:
+            prompt (str): 問い合わせのメッセージ
+
+        Returns:
+            str: クライアントの回答（時間内に回答がなければNO_ANSWER）
+        """
+        self._answer = asyncio.get_running_loop().create_future()
+        self.emit({"type": "ask", "prompt": prompt.strip()})
+        try:
+            return await asyncio.wait_for(self._answer, self.ask_timeout)
+        except asyncio.TimeoutError:
+            return NO_ANSWER
+        finally:
+            self._answer = None
+
+    async def write(self, text: str = "", end: str = "\n") -> None:
+        """
+        クライアントに出力を送るメソッド
+        """
+        self.emit({"type": "output", "text": text + end})
+
+
+class ServerSession:
+    """
+    サーバーが管理する1つの会話
+    """
+
+    __slots__ = ("session_id", "manager", "io", "created", "last_active", "turn", "turns")
+
+    def __init__(self, session_id: str, manager: AsyncManager, io: SessionIO):
+        self.session_id = session_id
+        self.manager = manager
+        self.io = io
+        self.created = self.last_active = time.monotonic()
+        self.turn = None  # 実行中のターンのTask
+        self.turns = 0
+
+    @property
+    def busy(self) -> bool:
+        """
+        ターンを実行中かどうか
+        """
+        return self.turn is not None and not self.turn.done()
+
+
+class AgentServer:
+    """
+    多数の会話を1つのイベントループで管理し、HTTP / WebSocketで提供するクラス
+
+    - 会話ごとにAsyncManagerを作成し、ToolExecutorとHTTPセッションは全体で共有します
+    - ターンは会話ごとに1つずつ実行します（実行中に次のメッセージを送ると409）
+    - ask_userの問い合わせは、その会話のクライアントにだけ送られます
+    - idle_timeout秒より長く使われていない会話は、sweep_interval秒ごとに終了します
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, stream: bool = True, max_sessions: int = 1000,
+                 idle_timeout: float = 600.0, ask_timeout: float = 300.0, sweep_interval: float = 30.0,
+                 tool_executor: ToolExecutor = None, max_tool_workers: int = 16, tool_timeout: float = 30.0,
+                 window: int = 10000, **manager_options):
+        """
+        AgentServerクラスのコンストラクタ
+
+        Args:
+            model (str): 使用するAIモデルの名前
+            stream (bool): Trueの場合、応答をストリーミングでクライアントに送る
+            max_sessions (int): 同時に存在できる会話の最大数（超えた場合、会話の作成は503）
+            idle_timeout (float): この時間（秒）より長く使われていない会話を終了する
+            ask_timeout (float): ask_userの回答を待つ時間（秒）
+            sweep_interval (float): 使われていない会話を探す間隔（秒）
+            tool_executor (ToolExecutor, optional): 共有するToolExecutor。Noneの場合は作成する
+            max_tool_workers (int): tool_executorを作成する場合の、同時に実行するツールの最大数
+            tool_timeout (float): tool_executorを作成する場合の、ツール1回あたりのタイムアウト（秒）
+            window (int): 統計に使う直近のターンの所要時間の数
+            **manager_options: AsyncManagerに渡すその他の設定（prompt_caching, router）
+        """
+        self.model = model
+        self.stream = stream
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.ask_timeout = ask_timeout
+        self.sweep_interval = sweep_interval
+        self.manager_options = manager_options
+        self._owns_executor = tool_executor is None
+        if tool_executor is None:
+            tool_executor = ToolExecutor(max_workers=max_tool_workers, timeout=tool_timeout)
+        self.tool_executor = tool_executor
+        self.sessions = {}
+        self._latencies = collections.deque(maxlen=window)
+        self._counters = {"created": 0, "closed": 0, "evicted": 0, "turns": 0, "errors": 0}
+        self._sweeper = None
+
+    def create_manager(self, io: SessionIO) -> AsyncManager:
+        """
+        会話に使うAsyncManagerを作成するメソッド（サブクラスで差し替え可能）
+        """
+        return AsyncManager(model=self.model, stream=self.stream, io=io, tool_executor=self.tool_executor,
+                            **self.manager_options)
+
+    def create_session(self) -> ServerSession:
+        """
+        会話を作成するメソッド
+
+        Returns:
+            ServerSession: 作成した会話。会話数が上限に達している場合はNone
+        """
+        if len(self.sessions) >= self.max_sessions:
+            return None
+        io = SessionIO(self.ask_timeout)
+        session = ServerSession(uuid.uuid4().hex, self.create_manager(io), io)
+        self.sessions[session.session_id] = session
+        self._counters["created"] += 1
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        """
+        会話を終了するメソッド（実行中のターンは取り消す）
+
+        Returns:
+            bool: 会話が存在した場合はTrue
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        if session.busy:
+            session.turn.cancel()
+        session.io.end_turn()
+        session.manager.close()
+        self._counters["closed"] += 1
+        return True
+
+    def evict_idle(self, now: float = None) -> int:
+        """
+        idle_timeout秒より長く使われていない会話を終了するメソッド（ターンの実行中の会話は除く）
+
+        Returns:
+            int: 終了した会話の数
+        """
+        now = time.monotonic() if now is None else now
+        expired = [session.session_id for session in self.sessions.values()
+                   if not session.busy and now - session.last_active > self.idle_timeout]
+        for session_id in expired:
+            self.close_session(session_id)
+        self._counters["evicted"] += len(expired)
+        if expired:
+            logger.info("使われていない会話を終了しました: %d件", len(expired))
+        return len(expired)
+
+    def start_turn(self, session: ServerSession, message: str) -> asyncio.Queue:
+        """
+        会話のターンを開始するメソッド
+
+        Args:
+            session (ServerSession): 会話
+            message (str): ユーザーからのメッセージ
+
+        Returns:
+            asyncio.Queue: ターンのイベントを受け取るキュー（最後にNoneが入る）。ターンの実行中の場合はNone
+        """
+        if session.busy:
+            return None
+        session.last_active = time.monotonic()
+        queue = session.io.begin_turn()
+        session.turn = asyncio.create_task(self._run_turn(session, message, queue))
+        return queue
+
+    async def _run_turn(self, session: ServerSession, message: str, queue: asyncio.Queue):
+        """
+        ターンを実行し、結果をイベントキューに送る内部メソッド
+        """
+        started = time.perf_counter()
+        ended = False
+        try:
+            with span("server.turn", session=session.session_id):
+                response, ended = await session.manager.process_message(message)
+            queue.put_nowait({"type": "done", "response": response, "ended": ended})
+            self._latencies.append(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            queue.put_nowait({"type": "error", "error": "会話が終了しました"})
+            raise
+        except Exception as e:
+            logger.exception("ターンの実行中にエラーが発生しました")
+            self._counters["errors"] += 1
+            queue.put_nowait({"type": "error", "error": str(e)})
+        finally:
+            self._counters["turns"] += 1
+            session.turns += 1
+            session.last_active = time.monotonic()
+            session.io.end_turn()
+            queue.put_nowait(None)
+        if ended:
+            session.turn = None
+            self.close_session(session.session_id)
+
+    def stats(self) -> dict:
+        """
+        会話数・ターン数・ターンの所要時間などの統計を返すメソッド
+
+        Returns:
+            dict: {sessions, busy, created, closed, evicted, turns, errors, p50, p99}（所要時間は秒）
+        """
+        latencies = sorted(self._latencies)
+        return {
+            "sessions": len(self.sessions),
+            "busy": sum(1 for session in self.sessions.values() if session.busy),
+            **self._counters,
+            "p50": latencies[int(0.50 * (len(latencies) - 1))] if latencies else None,
+            "p99": latencies[int(0.99 * (len(latencies) - 1))] if latencies else None,
+        }
+
+    # --- HTTP / WebSocket ---
+
+    def _get_session(self, request) -> ServerSession:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text="会話が見つかりません")
+        return session
+
+    @staticmethod
+    async def _read_field(request, name: str) -> str:
+        try:
+            data = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="JSONを送信してください")
+        if not isinstance(data, dict) or not isinstance(data.get(name), str):
+            raise web.HTTPBadRequest(text=f"{name}を指定してください")
+        return data[name]
+
+    async def _handle_create(self, request):
+        session = self.create_session()
+        if session is None:
+            raise web.HTTPServiceUnavailable(text="会話数が上限に達しています")
+        return web.json_response({"session_id": session.session_id}, status=201)
+
+    async def _handle_delete(self, request):
+        if not self.close_session(request.match_info["session_id"]):
+            raise web.HTTPNotFound(text="会話が見つかりません")
+        return web.json_response({"closed": True})
+
+    async def _handle_message(self, request):
+        session = self._get_session(request)
+        message = await self._read_field(request, "message")
+        queue = self.start_turn(session, message)
+        if queue is None:
+            raise web.HTTPConflict(text="前のメッセージを処理中です")
+
+        # クライアントが切断してもターンは最後まで実行する（ask_userはask_timeoutで打ち切られる）
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def _handle_answer(self, request):
+        session = self._get_session(request)
+        answer = await self._read_field(request, "answer")
+        session.last_active = time.monotonic()
+        if not session.io.answer(answer):
+            raise web.HTTPConflict(text="回答を待っている問い合わせはありません")
+        return web.json_response({"accepted": True})
+
+    @staticmethod
+    async def _forward(ws, queue: asyncio.Queue):
+        """
+        ターンのイベントをWebSocketに送る内部メソッド
+        """
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            if not ws.closed:
+                await ws.send_json(event)
+
+    async def _handle_websocket(self, request):
+        session = self._get_session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        forwarders = set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    await ws.send_json({"type": "error", "error": "JSONを送信してください"})
+                    continue
+                kind = data.get("type") if isinstance(data, dict) else None
+
+                if session.session_id not in self.sessions:
+                    await ws.send_json({"type": "error", "error": "会話が終了しています"})
+                elif kind == "message":
+                    queue = self.start_turn(session, str(data.get("message", "")))
+                    if queue is None:
+                        await ws.send_json({"type": "error", "error": "前のメッセージを処理中です"})
+                        continue
+                    # 応答を送っている間も、ask_userの回答を受け取れるよう別のTaskで送る
+                    task = asyncio.create_task(self._forward(ws, queue))
+                    forwarders.add(task)
+                    task.add_done_callback(forwarders.discard)
+                elif kind == "answer":
+                    session.last_active = time.monotonic()
+                    if not session.io.answer(str(data.get("answer", ""))):
+                        await ws.send_json({"type": "error", "error": "回答を待っている問い合わせはありません"})
+                else:
+                    await ws.send_json({"type": "error", "error": f"未知のメッセージの種類です: {kind}"})
+        finally:
+            for task in list(forwarders):
+                task.cancel()
+        return ws
+
+    async def _handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    async def _on_startup(self, app):
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _on_cleanup(self, app):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        await close_async_session()
+        if self._owns_executor:
+            self.tool_executor.shutdown()
+
+    def create_app(self) -> web.Application:
+        """
+        サーバーのaiohttpアプリケーションを作成するメソッド
+
+        Returns:
+            web.Application: アプリケーション
+        """
+        app = web.Application()
+        app.router.add_post("/sessions", self._handle_create)
+        app.router.add_delete("/sessions/{session_id}", self._handle_delete)
+        app.router.add_post("/sessions/{session_id}/messages", self._handle_message)
+        app.router.add_post("/sessions/{session_id}/answer", self._handle_answer)
+        app.router.add_get("/sessions/{session_id}/ws", self._handle_websocket)
+        app.router.add_get("/stats", self._handle_stats)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIエージェントのHTTP / WebSocketサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--no-stream", action="store_true", help="応答をストリーミングしない")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="同時に存在できる会話の最大数")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="使われていない会話を終了するまでの時間（秒）")
+    parser.add_argument("--ask-timeout", type=float, default=300.0, help="ask_userの回答を待つ時間（秒）")
+    parser.add_argument("--sweep-interval", type=float, default=30.0, help="使われていない会話を探す間隔（秒）")
+    parser.add_argument("--max-tool-workers", type=int, default=16, help="同時に実行するツールの最大数")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="APIに同時に送信するリクエスト数の上限（コネクション数も合わせる）")
+    parser.add_argument("--prompt-caching", action="store_true", help="プロンプトキャッシュの区切りを付けて送信する")
+    args = parser.parse_args()
+
+    if args.max_concurrency:
+        configure_session(pool_maxsize=args.max_concurrency)
+        configure_scheduler(max_concurrency=args.max_concurrency)
+
+    server = AgentServer(
+        model=args.model, stream=not args.no_stream, max_sessions=args.max_sessions,
+        idle_timeout=args.idle_timeout, ask_timeout=args.ask_timeout, sweep_interval=args.sweep_interval,
+        max_tool_workers=args.max_tool_workers, prompt_caching=args.prompt_caching,
+    )
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+import asyncio
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .agent import API_KEY_ERROR, ChatAgent, ContextAwareAgent, parse_sse_line
+    from .agent_logging import get_logger
+    from .http_session import RETRY_STATUS_CODES, get_api_url, get_config
+    from .instrumentation import current_span, record_usage, span
+    from .model_router import PURPOSE_SUMMARY, ModelResponseError
+    from .scheduler import PRIORITY_BACKGROUND, get_scheduler
+    from .summarizer import AsyncSummarizer
+except ImportError:
+    from agent import API_KEY_ERROR, ChatAgent, ContextAwareAgent, parse_sse_line
+    from agent_logging import get_logger
+    from http_session import RETRY_STATUS_CODES, get_api_url, get_config
+    from instrumentation import current_span, record_usage, span
+    from model_router import PURPOSE_SUMMARY, ModelResponseError
+    from scheduler import PRIORITY_BACKGROUND, get_scheduler
+    from summarizer import AsyncSummarizer
+
+logger = get_logger("agent")
+
+# イベントループごとに共有するaiohttpのセッション（セッションはループをまたいで使えない）
+_sessions = weakref.WeakKeyDictionary()
+
+# セッションストアごとの書き込み用スレッド（追記の順序を保つため、1つのスレッドで順に書き込む）
+_store_writers = weakref.WeakKeyDictionary()
+_store_writers_lock = threading.Lock()
+
+
+def get_async_session():
+    """
+    実行中のイベントループで共有するaiohttp.ClientSessionを取得する関数
+    接続設定はhttp_sessionの設定（プールサイズ、タイムアウト）を使用します
+
+    Returns:
+        aiohttp.ClientSession: 共有セッション
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        # aiohttpはインポートに時間がかかるため、最初にセッションを作成するときに読み込む
+        import aiohttp
+
+        config = get_config()
+        connector = aiohttp.TCPConnector(
+            limit=config["pool_maxsize"] * config["pool_connections"],
+            limit_per_host=config["pool_maxsize"],
+            keepalive_timeout=30,
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=config["connect_timeout"],
+            sock_read=config["read_timeout"],
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """
+    実行中のイベントループの共有セッションを閉じる関数
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def _get_store_writer(store):
+    """
+    セッションストアに書き込むスレッド（1スレッドのThreadPoolExecutor）を取得する関数
+
+    Args:
+        store (SessionStore): セッションストア
+
+    Returns:
+        ThreadPoolExecutor: ストアへの書き込みを順に実行するエグゼキュータ
+    """
+    with _store_writers_lock:
+        writer = _store_writers.get(store)
+        if writer is None:
+            writer = _store_writers[store] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session_store")
+        return writer
+
+
+def _log_store_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("セッションストアへの書き込みに失敗しました: %s", future.exception())
+
+
+async def _post_with_retry(session, headers, body):
+    """
+    429/5xx の場合にバックオフ付きでリトライしながらPOSTする関数
+
+    Args:
+        session (aiohttp.ClientSession): 使用するセッション
+        headers (dict): リクエストヘッダー
+        body (bytes): リクエストボディ
+
+    Returns:
+        aiohttp.ClientResponse: レスポンス（呼び出し側でreleaseする）
+    """
+    config = get_config()
+    url = get_api_url()
+    attempt = 0
+    while True:
+        response = await session.post(url, headers=headers, data=body)
+        if response.status not in RETRY_STATUS_CODES or attempt >= config["max_retries"]:
+            return response
+
+        # Retry-Afterヘッダーがあればそれに従い、なければ指数バックオフで待機する
+        retry_after = response.headers.get("Retry-After")
+        response.release()
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = config["backoff_factor"] * (2 ** attempt)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class AsyncChatAgent(ChatAgent):
+    """
+    ChatAgentのasyncio版
+    1つのイベントループで多数の会話を同時に扱えるように、HTTP通信をaiohttpで行うクラス
+    """
+
+    _store_write = None  # 最後にセッションストアに依頼した書き込み
+
+    @classmethod
+    async def aresume(cls, store, session_id, max_messages=None, **options):
+        """
+        resumeのasyncio版（セッションストアの読み込みをスレッドで行い、イベントループを止めない）
+        引数と戻り値はresume()と同じです
+        """
+        return await asyncio.to_thread(cls.resume, store, session_id, max_messages, **options)
+
+    def _write_store(self, method, *args):
+        """
+        セッションストアに書き込む内部メソッド
+        書き込みはストアごとの1つのスレッドで依頼した順に行い、完了は待ちません（flush_session()で待てます）
+
+        Args:
+            method (callable): 書き込みを行うセッションストアのメソッド（または関数）
+            *args: methodに渡す引数
+        """
+        self._store_write = _get_store_writer(self.store).submit(method, *args)
+        self._store_write.add_done_callback(_log_store_error)
+
+    async def flush_session(self):
+        """
+        セッションストアへの書き込みがすべて終わるまで待つメソッド
+        """
+        if self._store_write is not None:
+            await asyncio.wrap_future(self._store_write)
+
+    def _request_slot(self, model=None):
+        """
+        スケジューラから送信枠を取得する非同期コンテキストマネージャを返す内部メソッド
+
+        Args:
+            model (str, optional): 送信するモデル。Noneの場合はself.model
+
+        Returns:
+            asynccontextmanager: async withブロックの間、送信枠を保持する
+        """
+        scheduler = self.scheduler or get_scheduler()
+        return scheduler.aslot(model or self.model, self.api_key, self.priority)
+
+    async def _alookup_cache(self, payload):
+        """
+        _lookup_cacheのasyncio版
+        ディスク上のキャッシュ（SQLite）はスレッドで読み込み、イベントループを止めません
+
+        Args:
+            payload (bytes): streamフラグを除いたリクエストのJSON
+
+        Returns:
+            tuple: (キャッシュのキー（対象外の場合はNone）, キャッシュされた応答（ない場合はNone）)
+        """
+        cache_key = self._cache_key(payload)
+        if cache_key is None:
+            return None, None
+        if self.cache.persistent:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+        else:
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._use_cached(cached)
+        return cache_key, cached
+
+    def _store_cache(self, cache_key, content):
+        """
+        応答を応答キャッシュに保存する内部メソッド
+        ディスク上のキャッシュ（SQLite）への書き込みは、完了を待たずにスレッドで行います
+
+        Args:
+            cache_key (str): キャッシュのキー
+            content (str): AIからの応答
+        """
+        # メモリ上のキャッシュにはすぐに保存し、続く同じリクエストからも使えるようにする
+        self.cache.set(cache_key, content, persist=False)
+        if self.cache.persistent:
+            asyncio.get_running_loop().run_in_executor(None, self.cache.persist, cache_key, content)
+
+    async def _post_request(self, body, model=None):
+        """
+        スケジューラの送信枠を得てからAPIリクエストを送信し、レスポンスのJSONを返す内部メソッド
+
+        Args:
+            body (bytes): 送信するJSON
+            model (str, optional): bodyのモデル。Noneの場合はself.model
+
+        Returns:
+            dict: JSONとして解析したレスポンス
+        """
+        async with self._request_slot(model):
+            with span("http.post", model=model or self.model):
+                response = await _post_with_retry(get_async_session(), self._build_headers(), body)
+            async with response:
+                raw = await response.read()
+        with span("agent.decode", bytes=len(raw)):
+            return json.loads(raw)
+
+    async def _post_routed(self, request_data, body):
+        """
+        ルーターの候補モデルに、フォールバックとヘッジングをしながらリクエストを送信する内部メソッド
+        （ヘッジングで遅かった方のリクエストは取り消す）
+
+        Args:
+            request_data (dict): 最初のモデルのリクエストデータ
+            body (bytes): 最初のモデルの送信するJSON
+
+        Returns:
+            dict: 応答したモデルのレスポンス（すべて失敗した場合は最後のエラーのレスポンス）
+        """
+        if self.router is None:
+            return await self._post_request(body)
+
+        async def send(model):
+            data = body
+            if model != request_data["model"]:
+                data = self._encode_request(dict(request_data, model=model))[1]
+            response_data = await self._post_request(data, model)
+            if not response_data.get("choices"):
+                raise ModelResponseError(response_data)
+            return response_data
+
+        try:
+            model, response_data = await self.router.acall(self.purpose, send)
+        except ModelResponseError as e:
+            return e.response_data
+        current_span().set(model=model)
+        return response_data
+
+    async def _stream_events(self, body, model=None):
+        """
+        スケジューラの送信枠を得てからストリーミングでAPIリクエストを送信し、SSEのイベントを順に返す内部メソッド
+        送信枠はストリームを読み終えるまで（ジェネレーターを閉じるまで）保持します
+
+        Args:
+            body (bytes): 送信するJSON
+            model (str, optional): bodyのモデル。Noneの場合はself.model
+
+        Yields:
+            tuple: parse_sse_lineと同じ (種別, 値)。ストリーミングを開始できなかった場合は ("http_error", レスポンスの本文)
+        """
+        async with self._request_slot(model):
+            with span("http.post", model=model or self.model):
+                response = await _post_with_retry(get_async_session(), self._build_headers(), body)
+            async with response:
+                if response.status != 200:
+                    yield "http_error", await response.text()
+                    return
+
+                # aiohttpのStreamReaderは行単位で読み込める
+                async for raw_line in response.content:
+                    kind, value = parse_sse_line(raw_line.decode("utf-8").strip())
+                    if kind is not None:
+                        yield kind, value
+
+    async def _send_batch_item(self, request_data, body, cache_key):
+        with span("agent.request", model=request_data["model"], stream=False, batch=True) as request_span:
+            try:
+                return self._finish_batch_item(await self._post_routed(request_data, body), cache_key)
+            except Exception as e:
+                request_span.set_error(str(e))
+                return self._batch_result(error=f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}")
+
+    async def chat_many(self, histories, max_concurrency=None, dedupe=False):
+        """
+        独立した複数の会話を同時に送信し、それぞれのAIの応答を入力と同じ順に返すメソッド（asyncio版）
+        引数と戻り値はChatAgent.chat_many()と同じです
+
+        Args:
+            histories (list): 会話（メッセージのリスト、または1件のユーザーメッセージとしての文字列）のリスト
+            max_concurrency (int, optional): 同時に送信するリクエスト数の上限。デフォルトはコネクションプールのサイズ
+            dedupe (bool): Trueの場合、同じ送信データの会話をまとめて1回だけ送信する
+
+        Returns:
+            list: 入力と同じ順の結果 {"content", "error", "usage", "cached"}
+        """
+        if not self._has_api_key():
+            return [self._batch_result(error=API_KEY_ERROR) for _ in histories]
+
+        if self.cache is not None and self.cache.persistent:
+            # ディスク上のキャッシュの参照でイベントループを止めないよう、スレッドで準備する
+            keys, requests, results = await asyncio.to_thread(self._plan_batch, histories, dedupe)
+        else:
+            keys, requests, results = self._plan_batch(histories, dedupe)
+        semaphore = asyncio.Semaphore(max_concurrency or get_config()["pool_maxsize"])
+
+        async def send(key, request_data, body, cache_key):
+            async with semaphore:
+                results[key] = await self._send_batch_item(request_data, body, cache_key)
+
+        await asyncio.gather(*(send(key, *request) for key, request in requests.items()))
+        return [dict(results[key]) for key in keys]
+
+    async def chat(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答を取得するメソッド
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Returns:
+            str: AIからの応答メッセージ
+        """
+        # ユーザーメッセージを会話履歴に追加
+        self._append_message("user", message)
+
+        # APIリクエストを送信し、応答を取得
+        return await self._send_api_request()
+
+    async def _send_api_request(self):
+        """
+        OpenRouterのAPIにリクエストを送信する内部メソッド
+
+        Returns:
+            str: AIからの応答メッセージ
+        """
+        # APIキーのチェック
+        if not self._has_api_key():
+            return API_KEY_ERROR
+
+        with span("agent.request", model=self.model, stream=False) as request_span:
+            try:
+                request_data = self._build_request_data()
+                payload, body = self._encode_request(request_data)
+                cache_key, cached = await self._alookup_cache(payload)
+                if cached is not None:
+                    return cached
+
+                response_data = await self._post_routed(request_data, body)
+                return self._handle_response_data(response_data, cache_key)
+
+            except Exception as e:
+                request_span.set_error(str(e))
+                return f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}"
+
+    async def chat_stream(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答をストリーミングで受け取るメソッド
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Yields:
+            str: AIからの応答の差分
+        """
+        self._append_message("user", message)
+        async for delta in self._send_api_request_stream():
+            yield delta
+
+    async def _send_api_request_stream(self):
+        """
+        OpenRouterのAPIにストリーミング（SSE）でリクエストを送信する内部メソッド
+
+        Yields:
+            str: AIからの応答の差分
+        """
+        # APIキーのチェック
+        if not self._has_api_key():
+            yield API_KEY_ERROR
+            return
+
+        started = time.perf_counter()
+        self.last_usage = None
+        with span("agent.request", model=self.model, stream=True) as request_span:
+            try:
+                payload, body = self._encode_request(self._build_request_data(), stream=True)
+                cache_key, cached = await self._alookup_cache(payload)
+                if cached is not None:
+                    yield cached
+                    return
+
+                # 候補モデルに順に送信する（最初の差分を返す前に失敗した場合は、次の候補モデルで送信し直す）
+                models = self._candidate_models()
+                chunks = []
+                completed = False
+                for index, model in enumerate(models):
+                    if index:
+                        request_span.set(model=model, fallback=index)
+                        body = self._encode_request(self._build_request_data(model=model), stream=True)[1]
+                    error = None
+                    events = self._stream_events(body, model)
+                    try:
+                        async for kind, value in events:
+                            if kind == "done":
+                                completed = True
+                                break
+                            if kind == "http_error":
+                                error = f"エラー: 予期しないレスポンス形式です。\n{value}"
+                                break
+                            if kind == "error":
+                                error = f"エラー: APIリクエスト中に問題が発生しました。\n{json.dumps(value, ensure_ascii=False)}"
+                                break
+                            if kind == "usage":
+                                self.last_usage = value
+                                record_usage(value)
+                            if kind == "delta":
+                                if not chunks:
+                                    request_span.set(first_token=time.perf_counter() - started)
+                                chunks.append(value)
+                                yield value
+                    except Exception as e:
+                        if chunks or index == len(models) - 1:
+                            raise
+                        error = str(e)
+                    finally:
+                        await events.aclose()
+                    if self.router is not None:
+                        self.router.record(model, ok=error is None)
+                    if error is None:
+                        break
+                    if chunks or index == len(models) - 1:
+                        yield error
+                        return
+
+                # 最終的な応答を会話履歴に追加
+                ai_message = "".join(chunks)
+                self._append_message("assistant", ai_message)
+                if cache_key is not None and completed:
+                    self._store_cache(cache_key, ai_message)
+
+            except Exception as e:
+                request_span.set_error(str(e))
+                yield f"エラー: APIリクエスト中に問題が発生しました。\n{str(e)}"
+
+
+class AsyncContextAwareAgent(AsyncChatAgent, ContextAwareAgent):
+    """
+    ContextAwareAgentのasyncio版
+    システムプロンプトと会話要約の機能を持ち、通信はaiohttpで行うクラス
+    """
+
+    def _create_summary_agent(self):
+        return AsyncChatAgent(self.model, priority=PRIORITY_BACKGROUND, scheduler=self.scheduler,
+                              router=self.router, purpose=PURPOSE_SUMMARY)
+
+    async def cleanup(self, target_length):
+        """
+        会話履歴を圧縮するメソッド
+        要約後、会話履歴をリセットし、要約を元に新しい会話を開始します
+
+        Args:
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            str: 生成された要約文
+        """
+        if not self.conversation_history:
+            return None
+
+        conversation_to_summarize = self._get_messages_to_summarize()
+        if not conversation_to_summarize:
+            return None
+
+        # 実行中のバックグラウンドの要約は、会話全体を要約するため不要になる
+        self.cancel_compaction()
+
+        summarizer = AsyncSummarizer(self._create_summary_agent(), max_attempts=self.max_summary_attempts)
+        with span("agent.cleanup", model=self.model, messages=len(conversation_to_summarize)):
+            summary, self.last_summary_metrics = await summarizer.summarize(
+                self._build_summary_prompt(conversation_to_summarize, target_length), target_length
+            )
+        if summary is None:
+            return None
+
+        self.summary = summary
+        self.reset_conversation()
+        self._save_summary()
+        return summary
+
+    async def compact(self):
+        """
+        会話履歴がトークン予算を超えている場合に、古い会話だけを要約して圧縮するメソッド
+
+        Returns:
+            str or None: 更新後の要約（圧縮しなかった場合はNone）
+        """
+        window = self._select_compaction_window()
+        if window is None:
+            return None
+        old_messages, recent_messages = window
+
+        summary = await self._summarize_compaction(self._build_compaction_prompt(old_messages), len(old_messages))
+        if summary is None:
+            return None
+
+        self._apply_compaction(summary, recent_messages)
+        return summary
+
+    async def _summarize_compaction(self, prompt, message_count, cancelled=None):
+        summarizer = AsyncSummarizer(self._create_summary_agent(), max_attempts=self.max_summary_attempts,
+                                     cancelled=cancelled)
+        with span("agent.compact", model=self.model, messages=message_count, background=cancelled is not None):
+            summary, self.last_summary_metrics = await summarizer.summarize(prompt, self.compaction_length)
+        return summary
+
+    def _launch_compaction(self, prompt, message_count, cancelled):
+        """
+        要約を実行中のイベントループのTaskとして開始する内部メソッド（取り消すと送信中のリクエストも止まる）
+
+        Returns:
+            asyncio.Task: 実行中の要約
+        """
+        return asyncio.get_running_loop().create_task(self._summarize_compaction(prompt, message_count, cancelled))
+
+    async def wait_compaction(self, timeout=None):
+        """
+        バックグラウンドの要約が終わるまで待ち、その結果を会話履歴に反映するメソッド
+
+        Args:
+            timeout (float, optional): 待つ時間の上限（秒）。Noneの場合は終わるまで待つ
+
+        Returns:
+            str or None: 反映した要約
+        """
+        if self._compaction is None:
+            return None
+        await asyncio.wait([self._compaction[0]], timeout=timeout)
+        return self.poll_compaction()
+
+    async def _compact_before_turn(self):
+        if not self.background_compaction:
+            await self.compact()
+            return
+        self.poll_compaction()
+        self.start_compaction()
+
+    async def chat(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答を取得するメソッド
+        要約がある場合は、要約を含むプロンプトを使用
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Returns:
+            str: AIからの応答メッセージ
+        """
+        await self._compact_before_turn()
+        return await super().chat(message)
+
+    async def chat_stream(self, message):
+        """
+        ユーザーメッセージを送信し、AIからの応答をストリーミングで受け取るメソッド
+        要約がある場合は、要約を含むプロンプトを使用
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Yields:
+            str: AIからの応答の差分
+        """
+        await self._compact_before_turn()
+        async for delta in super().chat_stream(message):
+            yield delta
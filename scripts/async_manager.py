@@ -0,0 +1,252 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+try:
+    from .async_agent import AsyncContextAwareAgent, close_async_session
+    from .manager import Manager
+    from .model_router import PURPOSE_CHAT, PURPOSE_TOOL
+    from .tool_executor import INTERACTIVE_TOOLS
+    from .tool_parser import ToolCallParser
+except ImportError:
+    from async_agent import AsyncContextAwareAgent, close_async_session
+    from manager import Manager
+    from model_router import PURPOSE_CHAT, PURPOSE_TOOL
+    from tool_executor import INTERACTIVE_TOOLS
+    from tool_parser import ToolCallParser
+
+
+class ConsoleIO:
+    """
+    AsyncManagerの入出力をコンソールで行うクラス
+    input()はブロッキングするため、別スレッドで実行します
+
+    独自の入出力（WebSocketやキューなど）を使う場合は、
+    同じ read / write メソッドを持つオブジェクトをAsyncManagerに渡してください
+    """
+
+    async def read(self, prompt: str) -> str:
+        """
+        ユーザーからの入力を受け取るメソッド
+
+        Args:
+            prompt (str): 入力を促すメッセージ
+
+        Returns:
+            str: ユーザーの入力
+        """
+        return await asyncio.to_thread(input, prompt)
+
+    async def write(self, text: str = "", end: str = "\n") -> None:
+        """
+        ユーザーに出力するメソッド
+
+        Args:
+            text (str): 出力するテキスト
+            end (str): 末尾に付加する文字列
+        """
+        print(text, end=end, flush=True)
+
+
+class AsyncManager(Manager):
+    """
+    Managerのasyncio版
+    入出力を差し替え可能にし、1つのイベントループで多数の会話を同時に管理できるクラス
+    """
+
+    agent_class = AsyncContextAwareAgent
+
+    def __init__(self, model: str = "google/gemini-2.5-pro-preview-03-25", stream: bool = True, io=None,
+                 **executor_options):
+        """
+        AsyncManagerクラスのコンストラクタ
+
+        Args:
+            model (str): 使用するAIモデルの名前
+            stream (bool): Trueの場合、応答をストリーミングで出力し、ツールを逐次実行する
+            io: read / write メソッドを持つ入出力オブジェクト。デフォルトはConsoleIO
+            **executor_options: Managerと同じツール実行の設定（max_tool_workers, tool_timeout, tool_timeouts, tool_pool）
+                                とprompt_caching, router, tool_executor
+        """
+        super().__init__(model=model, stream=stream, **executor_options)
+        self.io = io if io is not None else ConsoleIO()
+        # 対話型ツールは入出力を共有するため1つずつ実行する
+        self._interactive_lock = asyncio.Lock()
+
+    async def _run_tool(self, tool_name: str, arg: str, subtool_name: str = None):
+        """
+        ツールを呼び出し、結果を返すメソッド
+        ask_userなどの対話型ツールは入出力オブジェクト経由でユーザーに問い合わせます
+
+        Args:
+            tool_name (str): ツール名
+            arg (str): ツールに渡す引数
+            subtool_name (str, optional): サブツール名
+
+        Returns:
+            ツールの実行結果
+        """
+        if tool_name in INTERACTIVE_TOOLS:
+            async with self._interactive_lock:
+                return await self.io.read(f"{arg}\n")
+        # ツールは同期関数のため、イベントループを止めないようスレッドプールで実行する
+        return await self.tool_executor.arun_call(tool_name, arg, subtool_name)
+
+    def _dispatch_tool(self, tool_name: str, arg: str, subtool_name: str = None):
+        """
+        対話型でないツールの実行をバックグラウンドで開始するメソッド
+
+        Returns:
+            Optional[asyncio.Task]: 実行中のTask（対話型ツールの場合はNone）
+        """
+        if tool_name in INTERACTIVE_TOOLS:
+            return None
+        return asyncio.create_task(self._run_tool(tool_name, arg, subtool_name))
+
+    async def _collect_tool_results(self, tool_calls: List[Tuple[str, str, str]], tasks: list) -> str:
+        """
+        ツール呼び出しの結果を呼び出し順に受け取り、タグでフォーマットするメソッド
+
+        Args:
+            tool_calls (List[Tuple[str, str, str]]): ツール呼び出しのリスト（ツール名, 引数, サブツール名）
+            tasks (list): 各ツール呼び出しに対応するTaskまたはNone（Noneの場合はここで実行する）
+
+        Returns:
+            str: <ツール名_result>～</ツール名_result> 形式のツール結果を連結したもの
+        """
+        tool_all_result = ""
+        for (tool_name, arg, subtool_name), task in zip(tool_calls, tasks):
+            if task is not None:
+                result = await task
+            else:
+                result = await self._run_tool(tool_name, arg, subtool_name)
+
+            if subtool_name:
+                await self.io.write(f"[ツール実行: {tool_name}.{subtool_name}]")
+            else:
+                await self.io.write(f"[ツール実行: {tool_name}]")
+            await self.io.write(f"[ツール結果: {result}]")
+
+            tool_all_result += self._format_tool_result(tool_name, subtool_name, result)
+        return tool_all_result
+
+    async def _get_response(self, message: str) -> Tuple[str, Optional[List[Tuple[str, str, str]]], list]:
+        """
+        エージェントにメッセージを送信し、応答を出力するメソッド
+        ストリーミング時は、終了タグが届いた副作用のないツール（Managerの_starts_early）をその時点で実行開始します
+
+        Args:
+            message (str): エージェントに送信するメッセージ
+
+        Returns:
+            Tuple[str, Optional[List[Tuple[str, str, str]]], list]:
+                応答全体、抽出されたツール呼び出し（非ストリーミング時はNone）、
+                各ツール呼び出しに対応するTaskまたはNone（まだ開始していない場合）
+        """
+        if not self.stream:
+            agent_response = await self.agent.chat(message)
+            await self.io.write(f"\nAI: {agent_response}")
+            return agent_response, None, []
+
+        parser = ToolCallParser(self.tool_names)
+        tool_calls = []
+        tasks = []
+        chunks = []
+
+        await self.io.write("\nAI: ", end="")
+        async for delta in self.agent.chat_stream(message):
+            await self.io.write(delta, end="")
+            chunks.append(delta)
+            for tool_name, arg, subtool_name in parser.feed(delta):
+                tool_calls.append((tool_name, arg, subtool_name))
+                tasks.append(self._dispatch_tool(tool_name, arg, subtool_name)
+                             if self._starts_early(tool_name) else None)
+        await self.io.write()
+        for tool_name, arg, subtool_name in parser.close():
+            tool_calls.append((tool_name, arg, subtool_name))
+            tasks.append(self._dispatch_tool(tool_name, arg, subtool_name) if self._starts_early(tool_name) else None)
+        return "".join(chunks), tool_calls, tasks
+
+    async def process_message(self, message: str) -> Tuple[str, bool]:
+        """
+        ユーザーメッセージを1件処理するメソッド
+        エージェントがツールを呼び出さなくなるまで、ツール実行と結果の送信を繰り返します
+
+        Args:
+            message (str): ユーザーからのメッセージ
+
+        Returns:
+            Tuple[str, bool]: 最後のエージェントの応答と、会話が終了したかどうか
+        """
+        current_message = message
+        self.agent.purpose = PURPOSE_CHAT
+        while True:
+            agent_response, tool_calls, tasks = await self._get_response(current_message)
+
+            # <<END>>タグがあるか確認
+            if "<<END>>" in agent_response:
+                # 先に開始した副作用のないツールの結果は使わない
+                for task in tasks:
+                    if task is not None:
+                        task.cancel()
+                await self.io.write("AIが会話を終了しました")
+                return agent_response.replace("<<END>>", ""), True
+
+            # ツール呼び出しを抽出し、まだ開始していないものを並行して実行を開始
+            if tool_calls is None:
+                tool_calls = self.extract_tool_calls(agent_response)
+                tasks = [None] * len(tool_calls)
+            tasks = [self._dispatch_tool(tool_name, arg, subtool_name) if task is None else task
+                     for (tool_name, arg, subtool_name), task in zip(tool_calls, tasks)]
+
+            # ツール呼び出しがない場合はユーザーの入力待ちに戻る
+            if not tool_calls:
+                return agent_response, False
+
+            # 結果を呼び出し順にまとめてエージェントに送信する（ルーターがある場合はツール結果用のモデルを使う）
+            current_message = await self._collect_tool_results(tool_calls, tasks)
+            self.agent.purpose = PURPOSE_TOOL
+
+    async def run(self):
+        """
+        会話ループを実行するメソッド
+        """
+        await self.io.write("=" * 80)
+        await self.io.write("AIエージェントとの会話を開始します")
+        await self.io.write("終了するには 'exit' と入力してください")
+        await self.io.write("=" * 80)
+
+        try:
+            while True:
+                user_input = await self.io.read("\nユーザー: ")
+
+                # 終了コマンド
+                if user_input.lower() == "exit":
+                    await self.io.write("会話を終了します")
+                    break
+
+                _, ended = await self.process_message(user_input)
+                if ended:
+                    break
+
+        except KeyboardInterrupt:
+            await self.io.write("\n会話を中断します")
+        except Exception as e:
+            await self.io.write(f"\nエラーが発生しました: {str(e)}")
+        finally:
+            self.close()
+
+
+async def main():
+    """
+    コンソールでAsyncManagerを実行する関数
+    """
+    manager = AsyncManager()
+    try:
+        await manager.run()
+    finally:
+        await close_async_session()
+
+
+# テスト用コード（直接実行された場合のみ実行）
+if __name__ == "__main__":
+    asyncio.run(main())
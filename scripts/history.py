@@ -0,0 +1,206 @@
+import json
+import sys
+
+# よく使うロールは同じ文字列オブジェクトを共有する
+ROLES = {role: sys.intern(role) for role in ("system", "user", "assistant", "tool")}
+
+# プロンプトキャッシュの区切り（OpenRouter経由でAnthropic / Geminiなどのプロバイダーに渡す）
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def intern_role(role):
+    """
+    ロールの文字列をインターンする関数
+
+    Args:
+        role (str): ロール
+
+    Returns:
+        str: インターンされたロール
+    """
+    return ROLES.get(role) or sys.intern(role)
+
+
+class Message:
+    """
+    会話履歴の1件のメッセージを表すクラス
+
+    - __slots__ により辞書よりも少ないメモリで保持します
+    - ロールはインターンされた文字列を共有します
+    - 送信用のJSONを初回だけエンコードしてキャッシュします（内容は変更しない前提です）
+    - message["role"] や message.get("content") のように辞書と同じ形でも読み出せます
+    """
+
+    __slots__ = ("role", "content", "_encoded")
+
+    def __init__(self, role, content):
+        """
+        Messageクラスのコンストラクタ
+
+        Args:
+            role (str): メッセージのロール（"system" / "user" / "assistant"）
+            content (str): メッセージの内容
+        """
+        self.role = intern_role(role)
+        self.content = content
+        self._encoded = None
+
+    @classmethod
+    def coerce(cls, message):
+        """
+        辞書やMessageをMessageに変換するメソッド
+
+        Args:
+            message (Message or dict): メッセージ
+
+        Returns:
+            Message: メッセージ
+        """
+        if isinstance(message, cls):
+            return message
+        return cls(message["role"], message["content"])
+
+    def encode(self):
+        """
+        送信用のJSONを返すメソッド（2回目以降はキャッシュを返す）
+
+        Returns:
+            bytes: {"role": ..., "content": ...} のJSON
+        """
+        if self._encoded is None:
+            self._encoded = json.dumps(
+                {"role": self.role, "content": self.content}, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+        return self._encoded
+
+    def to_dict(self):
+        """
+        辞書に変換するメソッド
+
+        Returns:
+            dict: {"role": ..., "content": ...}
+        """
+        return {"role": self.role, "content": self.content}
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            return self.role == other.role and self.content == other.content
+        if isinstance(other, dict):
+            return other == self.to_dict()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message(role={self.role!r}, content={self.content!r})"
+
+
+class CachedMessage(Message):
+    """
+    プロンプトキャッシュの区切り（cache_control）を付けて送信するメッセージ
+
+    - contentを複数のテキストパートに分けて送信し、各パートの末尾をキャッシュの区切りにします
+    - 送信するJSONはパートだけから作るため、パートが同じならターンやエージェントが違っても同じバイト列になります
+    - content属性はパートを結合した文字列で、トークン数の推定や要約では通常のメッセージと同じように扱えます
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, role, parts):
+        """
+        CachedMessageクラスのコンストラクタ
+
+        Args:
+            role (str): メッセージのロール（通常は"system"）
+            parts (list): テキストパートのリスト（前から順に、変わりにくいものを並べる）
+        """
+        self.parts = tuple(parts)
+        super().__init__(role, "".join(self.parts))
+
+    def encode(self):
+        """
+        送信用のJSONを返すメソッド（2回目以降はキャッシュを返す）
+
+        Returns:
+            bytes: {"role": ..., "content": [{"type": "text", "text": ..., "cache_control": ...}, ...]} のJSON
+        """
+        if self._encoded is None:
+            content = [{"type": "text", "text": text, "cache_control": CACHE_CONTROL} for text in self.parts]
+            self._encoded = json.dumps(
+                {"role": self.role, "content": content}, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+        return self._encoded
+
+    def __repr__(self):
+        return f"CachedMessage(role={self.role!r}, parts={self.parts!r})"
+
+
+class History(list):
+    """
+    会話履歴を表すリスト
+    追加された辞書は自動でMessageに変換されます
+    """
+
+    __slots__ = ()
+
+    def __init__(self, messages=()):
+        super().__init__(Message.coerce(message) for message in messages)
+
+    def append(self, message):
+        super().append(Message.coerce(message))
+
+    def extend(self, messages):
+        super().extend(Message.coerce(message) for message in messages)
+
+    def insert(self, index, message):
+        super().insert(index, Message.coerce(message))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [Message.coerce(message) for message in value]
+        else:
+            value = Message.coerce(value)
+        super().__setitem__(index, value)
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def encode(self):
+        """
+        送信用のJSON配列を返すメソッド
+        各メッセージのエンコード済みのJSONを1回の結合でまとめます
+
+        Returns:
+            bytes: メッセージのJSON配列
+        """
+        return b"[" + b",".join(message.encode() for message in self) + b"]"
+
+
+def encode_messages(messages):
+    """
+    メッセージのリストを送信用のJSON配列にエンコードする関数
+    Historyの場合はキャッシュ済みのJSONを再利用します
+
+    Args:
+        messages (list): HistoryまたはMessage/辞書のリスト
+
+    Returns:
+        bytes: メッセージのJSON配列
+    """
+    if isinstance(messages, History):
+        return messages.encode()
+    return b"[" + b",".join(Message.coerce(message).encode() for message in messages) + b"]"
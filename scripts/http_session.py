@@ -0,0 +1,159 @@
+import os
+import threading
+
+# requestsとpython-dotenvはインポートに時間がかかるため、最初に使うときに読み込む
+
+# OpenRouterのチャット補完APIのURL（環境変数OPENROUTER_API_URLで差し替え可能）
+DEFAULT_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# デフォルトの接続設定
+DEFAULT_CONFIG = {
+    "pool_connections": 4,     # ホストごとに保持するコネクションプールの数
+    "pool_maxsize": 16,        # 1つのプールで保持するコネクション数の上限
+    "connect_timeout": 10.0,   # 接続タイムアウト（秒）
+    "read_timeout": 120.0,     # 読み込みタイムアウト（秒）
+    "max_retries": 3,          # 429/5xx に対するリトライ回数
+    "backoff_factor": 0.5,     # リトライ間隔の係数（0.5, 1.0, 2.0, ...秒）
+}
+
+# リトライ対象のステータスコード
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_config = dict(DEFAULT_CONFIG)
+_session = None
+_env_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """
+    .envファイルから環境変数を読み込む関数
+    最初のAPI呼び出しの前に1回だけ読み込みます（既に設定されている環境変数は上書きしません）
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def get_api_url():
+    """
+    OpenRouterのチャット補完APIのURLを返す関数
+
+    Returns:
+        str: APIのURL
+    """
+    load_env()
+    return os.getenv("OPENROUTER_API_URL", DEFAULT_API_URL)
+
+
+def _build_session(config):
+    """
+    設定からキープアライブ付きのSessionを作成する関数
+
+    Args:
+        config (dict): 接続設定
+
+    Returns:
+        requests.Session: 作成したセッション
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=config["max_retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=RETRY_STATUS_CODES,
+        # POSTはデフォルトではリトライされないため明示的に許可する
+        allowed_methods=frozenset(["GET", "POST"]),
+        # 送信後の読み込みエラーやタイムアウトでは、サーバーが応答を生成（課金）済みのことがあるため送り直さない
+        # （リトライは429/5xxの応答と、接続できなかった場合だけ）
+        read=0,
+        other=0,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config["pool_connections"],
+        pool_maxsize=config["pool_maxsize"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_session(**options):
+    """
+    共有セッションの接続設定を変更する関数
+    次回のget_session()呼び出しで新しい設定のセッションが作成されます
+
+    Args:
+        **options: DEFAULT_CONFIGのキーと同じ名前の設定値
+
+    Raises:
+        KeyError: 未知の設定名が指定された場合
+    """
+    global _session
+    for key in options:
+        if key not in DEFAULT_CONFIG:
+            raise KeyError(f"未知の接続設定です: {key}")
+    with _lock:
+        _config.update(options)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    """
+    プロセス全体で共有するSessionを取得する関数
+    初回呼び出し時にコネクションプールを作成し、以降は同じものを再利用します
+
+    Returns:
+        requests.Session: 共有セッション
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session(_config)
+    return _session
+
+
+def get_timeout():
+    """
+    requestsに渡す (接続タイムアウト, 読み込みタイムアウト) を返す関数
+
+    Returns:
+        tuple: (connect_timeout, read_timeout)
+    """
+    return (_config["connect_timeout"], _config["read_timeout"])
+
+
+def close_session():
+    """
+    共有セッションを閉じる関数
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_config():
+    """
+    現在の接続設定のコピーを返す関数
+    非同期クライアントも同じ設定でプールやタイムアウトを構成します
+
+    Returns:
+        dict: 接続設定
+    """
+    return dict(_config)
@@ -0,0 +1,385 @@
+import bisect
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+# 実行中のスパン（asyncioのタスクごと・スレッドごとに別々に保持される）
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+# スパンの出力先（空の場合は計測しない）
+_exporters = ()
+_lock = threading.Lock()
+
+# PrometheusExporterのヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# OpenRouterのusageフィールドから記録するトークン数
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+# PrometheusExporterで集計するトークンの種別（スパンの属性 "<種別>_tokens"）
+TOKEN_KINDS = ("prompt", "completion", "cached_prompt")
+
+
+class _NoopSpan:
+    """
+    計測が無効な場合に返す、何もしないスパン
+    """
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    処理の所要時間を計測する区間
+    withブロックで使い、抜けたときに設定済みのすべてのエクスポーターに記録を渡します
+    """
+
+    __slots__ = ("name", "attributes", "span_id", "parent_id", "start", "duration", "error",
+                 "_started", "_token", "_exporters")
+
+    def __init__(self, name, attributes, exporters):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._exporters = exporters
+
+    def set(self, **attributes):
+        """
+        スパンに属性を追加するメソッド
+
+        Args:
+            **attributes: 追加する属性（JSONに変換できる値）
+        """
+        self.attributes.update(attributes)
+
+    def set_error(self, message):
+        """
+        スパンを失敗として記録するメソッド（例外を捕捉してエラーメッセージを返す処理で使う）
+
+        Args:
+            message (str): エラーの内容
+        """
+        self.error = message
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.parent_id = parent.span_id
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc_value}"
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # ジェネレーターが別のコンテキストで閉じられた場合
+            pass
+        record = self.to_dict()
+        for exporter in self._exporters:
+            exporter.export(record)
+        return False
+
+    def to_dict(self):
+        """
+        スパンの記録を辞書で返すメソッド
+
+        Returns:
+            dict: name, span_id, parent_id, start（UNIX時間）, duration（秒）, attributes, error
+        """
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def span(name, **attributes):
+    """
+    処理の所要時間を計測するスパンを作成する関数
+    エクスポーターが設定されていない場合は何もしないスパンを返すため、計測が無効なときの負荷はほぼありません
+
+    Args:
+        name (str): スパンの名前（例: "agent.request"）
+        **attributes: スパンの属性
+
+    Returns:
+        Span: withブロックで使うスパン
+    """
+    exporters = _exporters
+    if not exporters:
+        return _NOOP_SPAN
+    return Span(name, attributes, exporters)
+
+
+def current_span():
+    """
+    実行中のスパンを返す関数（計測が無効な場合や、スパンの外では何もしないスパン）
+
+    Returns:
+        Span: 実行中のスパン
+    """
+    return _current_span.get() or _NOOP_SPAN
+
+
+def record_usage(usage):
+    """
+    OpenRouterのusageフィールドのトークン数を、実行中のスパンの属性に記録する関数
+    prompt_tokens_details.cached_tokensがある場合は、キャッシュされた入力トークン数（cached_prompt_tokens）と
+    キャッシュされていない入力トークン数（uncached_prompt_tokens）も記録します
+
+    Args:
+        usage (dict or None): レスポンスのusageフィールド
+    """
+    if not usage or not _exporters:
+        return
+    attributes = {field: usage[field] for field in USAGE_FIELDS if field in usage}
+    # プロンプトキャッシュから読み込まれた入力トークン数（キャッシュに対応していないプロバイダーでは0）
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is not None:
+        attributes["cached_prompt_tokens"] = cached
+        if "prompt_tokens" in usage:
+            attributes["uncached_prompt_tokens"] = usage["prompt_tokens"] - cached
+    current_span().set(**attributes)
+
+
+def is_enabled():
+    """
+    計測が有効か（エクスポーターが設定されているか）を返す関数
+
+    Returns:
+        bool: 有効な場合はTrue
+    """
+    return bool(_exporters)
+
+
+def configure_instrumentation(*exporters):
+    """
+    スパンの出力先を設定する関数
+    引数を省略すると計測を無効にします
+
+    Args:
+        *exporters: export(record) メソッドを持つエクスポーター
+                    （InMemoryExporter / JsonlExporter / PrometheusExporter など）
+    """
+    global _exporters
+    with _lock:
+        _exporters = tuple(exporters)
+
+
+class InMemoryExporter:
+    """
+    スパンの記録をメモリに保持するエクスポーター（テストや、実行後の集計に使う）
+    """
+
+    def __init__(self, max_spans=None):
+        """
+        InMemoryExporterクラスのコンストラクタ
+
+        Args:
+            max_spans (int, optional): 保持する記録の上限（古いものから捨てる）。Noneの場合は無制限
+        """
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        with self._lock:
+            self.spans.append(record)
+            if self.max_spans is not None and len(self.spans) > self.max_spans:
+                del self.spans[:len(self.spans) - self.max_spans]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def summary(self):
+        """
+        スパンの名前ごとの所要時間とトークン数を集計するメソッド
+
+        Returns:
+            dict: {名前: {count, errors, total, avg, p50, p95, max, prompt_tokens, completion_tokens,
+                  cached_prompt_tokens, uncached_prompt_tokens}}
+        """
+        with self._lock:
+            spans = list(self.spans)
+        groups = {}
+        for record in spans:
+            groups.setdefault(record["name"], []).append(record)
+
+        result = {}
+        for name, records in groups.items():
+            durations = sorted(record["duration"] for record in records)
+            total = sum(durations)
+            result[name] = {
+                "count": len(records),
+                "errors": sum(1 for record in records if record["error"]),
+                "total": total,
+                "avg": total / len(durations),
+                "p50": durations[int(0.50 * (len(durations) - 1))],
+                "p95": durations[int(0.95 * (len(durations) - 1))],
+                "max": durations[-1],
+                "prompt_tokens": sum(record["attributes"].get("prompt_tokens", 0) for record in records),
+                "completion_tokens": sum(record["attributes"].get("completion_tokens", 0) for record in records),
+                "cached_prompt_tokens": sum(record["attributes"].get("cached_prompt_tokens", 0) for record in records),
+                "uncached_prompt_tokens": sum(
+                    record["attributes"].get("uncached_prompt_tokens", record["attributes"].get("prompt_tokens", 0))
+                    for record in records
+                ),
+            }
+        return result
+
+
+class JsonlExporter:
+    """
+    スパンの記録をJSONL形式でファイルに追記するエクスポーター（1スパン1行）
+    """
+
+    def __init__(self, path):
+        """
+        JsonlExporterクラスのコンストラクタ
+
+        Args:
+            path (str): 出力先のファイルのパス（追記モードで開く）
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class PrometheusExporter:
+    """
+    スパンの所要時間とトークン数を集計し、Prometheusのテキスト形式で出力するエクスポーター
+
+    - agent_span_duration_seconds: スパンの名前ごとの所要時間のヒストグラム
+    - agent_span_errors_total: スパンの名前ごとの例外の数
+    - agent_tokens_total: モデルと種別（prompt / completion / cached_prompt）ごとのトークン数
+      （cached_promptはpromptのうちプロンプトキャッシュから読み込まれた分）
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        PrometheusExporterクラスのコンストラクタ
+
+        Args:
+            buckets (tuple): ヒストグラムのバケットの上限（秒、昇順）
+        """
+        self.buckets = tuple(buckets)
+        self._histograms = {}  # スパン名 -> [バケットごとの数..., 合計時間, 数]
+        self._errors = {}
+        self._tokens = {}      # (モデル名, 種別) -> トークン数
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        name = record["name"]
+        attributes = record["attributes"]
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [0] * (len(self.buckets) + 2)
+            index = bisect.bisect_left(self.buckets, record["duration"])
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += record["duration"]
+            histogram[-1] += 1
+            if record["error"]:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            for kind in TOKEN_KINDS:
+                tokens = attributes.get(f"{kind}_tokens")
+                if tokens:
+                    key = (attributes.get("model", ""), kind)
+                    self._tokens[key] = self._tokens.get(key, 0) + tokens
+
+    @staticmethod
+    def _label(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def render(self):
+        """
+        集計結果をPrometheusのテキスト形式で返すメソッド
+
+        Returns:
+            str: メトリクスのテキスト
+        """
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of instrumented spans.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                label = self._label(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    lines.append(f'agent_span_duration_seconds_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'agent_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {histogram[-1]}')
+                lines.append(f'agent_span_duration_seconds_sum{{span="{label}"}} {histogram[-2]}')
+                lines.append(f'agent_span_duration_seconds_count{{span="{label}"}} {histogram[-1]}')
+
+            lines.append("# HELP agent_span_errors_total Spans that ended with an exception.")
+            lines.append("# TYPE agent_span_errors_total counter")
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'agent_span_errors_total{{span="{self._label(name)}"}} {count}')
+
+            lines.append("# HELP agent_tokens_total Tokens reported in the OpenRouter usage field.")
+            lines.append("# TYPE agent_tokens_total counter")
+            for (model, kind), tokens in sorted(self._tokens.items()):
+                lines.append(f'agent_tokens_total{{model="{self._label(model)}",type="{kind}"}} {tokens}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        集計結果をファイルに書き出すメソッド（node_exporterのtextfile collector用に、置き換えはアトミックに行う）
+
+        Args:
+            path (str): 出力先のファイルのパス
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
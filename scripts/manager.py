@@ -1,12 +1,25 @@
+import math
 import os
-import re
 import sys
 from pathlib import Path
 from typing import List, Tuple
 
 # 同じディレクトリ内のモジュールをインポート
-from agent import ContextAwareAgent
-from tool_router import get_tool_list, call_tool
+try:
+    from .agent import ContextAwareAgent
+    from .instrumentation import span
+    from .model_router import PURPOSE_CHAT, PURPOSE_TOOL
+    from .tool_executor import ToolExecutor
+    from .tool_parser import ToolCallParser
+    from .tool_router import get_registry
+except ImportError:
+    from agent import ContextAwareAgent
+    from instrumentation import span
+    from model_router import PURPOSE_CHAT, PURPOSE_TOOL
+    from tool_executor import ToolExecutor
+    from tool_parser import ToolCallParser
+    from tool_router import get_registry
+
 
 class Manager:
     """
@@ -21,20 +34,88 @@ class Manager:
     6. エージェントからの応答に<<END>>が含まれていたら、会話を終了する
     """
     
-    def __init__(self, model: str = "google/gemini-2.5-pro-preview-03-25"):
+    # 会話に使用するエージェントのクラス
+    agent_class = ContextAwareAgent
+
+    # プロセス内のすべてのManagerで共有する、組み立て済みのシステムプロンプト
+    # {システムプロンプトファイルのパス: (ファイルの更新日時, ツール一覧, プロンプト)}
+    _system_prompt_cache = {}
+
+    def __init__(self, model: str = "google/gemini-2.5-pro-preview-03-25", stream: bool = True,
+                 max_tool_workers: int = 4, tool_timeout: float = 30.0, tool_timeouts: dict = None,
+                 tool_pool=None, prompt_caching: bool = False, router=None, tool_executor: ToolExecutor = None):
         """
         Managerクラスのコンストラクタ
         
         Args:
             model (str): 使用するAIモデルの名前
+            stream (bool): Trueの場合、応答をストリーミングで表示し、ツールを逐次実行する
+            max_tool_workers (int): 1つの応答に含まれるツール呼び出しを同時に実行する最大数
+            tool_timeout (float): ツール1回あたりのタイムアウト（秒）
+            tool_timeouts (dict, optional): ツール名ごとのタイムアウト（秒）
+            tool_pool (ToolProcessPool, optional): ツールを別プロセスで実行する場合のプロセスプール
+            prompt_caching (bool): Trueの場合、システムプロンプト（ツール一覧を含む）と要約に
+                                   プロンプトキャッシュの区切りを付けて送信する
+            router (ModelRouter, optional): 用途ごとのモデルの選択・フォールバック・ヘッジングを行うルーター
+                                            （ツール結果を送るターンはPURPOSE_TOOLのモデルを使う）
+            tool_executor (ToolExecutor, optional): 複数のManagerで共有するToolExecutor。
+                                                    指定した場合、max_tool_workers・tool_timeout・tool_timeouts・tool_poolは使わない
         """
-        # システムプロンプトの準備
-        system_prompt_path = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
-        self.system_prompt = self._prepare_system_prompt(system_prompt_path)
-        
-        # エージェントの初期化（システムプロンプトを直接渡す）
-        self.agent = ContextAwareAgent(model=model, system_prompt=self.system_prompt)
+        self.stream = stream
+        # 自分で作成したToolExecutorだけをclose()で終了する（共有のものは作成した側が終了する）
+        self._owns_tool_executor = tool_executor is None
+        if tool_executor is None:
+            tool_executor = ToolExecutor(
+                max_workers=max_tool_workers, timeout=tool_timeout, tool_timeouts=tool_timeouts, backend=tool_pool
+            )
+        self.tool_executor = tool_executor
+
+        self.model = model
+        self.prompt_caching = prompt_caching
+        self.router = router
+        self.system_prompt_path = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
+
+        # ツールの読み込みとエージェントの作成は、最初に使うときまで遅らせる
+        self._system_prompt = None
+        self._agent = None
+
+    @property
+    def system_prompt(self) -> str:
+        """
+        ツールの説明を含むシステムプロンプト（最初に参照したときに準備する）
+        """
+        if self._system_prompt is None:
+            self._system_prompt = self._prepare_system_prompt(self.system_prompt_path)
+        return self._system_prompt
+
+    @property
+    def tool_names(self) -> tuple:
+        """
+        ツール呼び出しとして解釈するツール名（ツール一覧のキャッシュを共有する）
+        """
+        return get_registry().get_manifest().names
+
+    @property
+    def agent(self):
+        """
+        会話に使用するエージェント（最初に参照したときにシステムプロンプトを渡して作成する）
+        """
+        if self._agent is None:
+            self._agent = self.agent_class(
+                model=self.model, system_prompt=self.system_prompt,
+                prompt_caching=self.prompt_caching, cache_summary=self.prompt_caching, router=self.router,
+            )
+        return self._agent
     
+    def close(self):
+        """
+        会話を終了するメソッド（エージェントのバックグラウンドの要約を取り消し、自分で作成したToolExecutorを終了する）
+        """
+        if self._agent is not None:
+            self._agent.close()
+        if self._owns_tool_executor:
+            self.tool_executor.shutdown()
+
     def _prepare_system_prompt(self, system_prompt_path: str) -> str:
         """
         システムプロンプトを準備するメソッド
@@ -45,7 +126,14 @@ class Manager:
         Returns:
             str: 準備されたシステムプロンプト
         """
+        manifest = get_registry().get_manifest()
         try:
+            mtime = os.stat(system_prompt_path).st_mtime_ns
+            # ファイルとツール一覧が変わっていなければ、組み立て済みのプロンプトを再利用する
+            cached = Manager._system_prompt_cache.get(system_prompt_path)
+            if cached is not None and cached[0] == mtime and cached[1] is manifest:
+                return cached[2]
+
             # システムプロンプトファイルを読み込む
             with open(system_prompt_path, 'r', encoding='utf-8') as f:
                 base_prompt = f.read().strip()
@@ -56,11 +144,10 @@ class Manager:
             print(f"エラー: システムプロンプトファイルの読み込み中にエラーが発生しました: {str(e)}")
             sys.exit(1)
         
-        # ツールリストを取得
-        tool_list = get_tool_list()
-        
         # システムプロンプトとツールリストを結合
-        return f"{base_prompt}\n\n{tool_list}"
+        prompt = f"{base_prompt}\n\n{manifest.tool_list}"
+        Manager._system_prompt_cache[system_prompt_path] = (mtime, manifest, prompt)
+        return prompt
     
     def extract_tool_calls(self, message: str) -> List[Tuple[str, str, str]]:
         """
@@ -71,30 +158,106 @@ class Manager:
             
         Returns:
             List[Tuple[str, str, str]]: 抽出されたツール呼び出しのリスト（ツール名, 引数, サブツール名）
-                                       サブツールが指定されていない場合、サブツール名はNone
+                                       呼び出し順に並び、サブツールが指定されていない場合、サブツール名はNone
         """
-        # 通常のツール呼び出しのパターン: <ツール名>引数</ツール名>
-        standard_pattern = r'<([a-zA-Z0-9_]+)>(.*?)</\1>'
-        standard_matches = re.findall(standard_pattern, message, re.DOTALL)
-        
-        # サブツール呼び出しのパターン: <ツール名.サブツール名>引数</ツール名.サブツール名>
-        subtool_pattern = r'<([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)>(.*?)</\1\.\2>'
-        subtool_matches = re.findall(subtool_pattern, message, re.DOTALL)
-        
-        # 結果を統合
-        result = []
-        # 通常のツール呼び出し: (ツール名, 引数, None)
-        for tool_name, arg in standard_matches:
-            result.append((tool_name, arg, None))
-        
-        # サブツール呼び出し: (ツール名, 引数, サブツール名)
-        for tool_name, subtool_name, arg in subtool_matches:
-            result.append((tool_name, arg, subtool_name))
-        
-        return result
+        # 登録済みのツールのタグだけを、応答中に現れた順に1回の走査で抽出する
+        with span("manager.extract_tool_calls", chars=len(message)) as current:
+            tool_calls = ToolCallParser.parse(message, self.tool_names)
+            current.set(tool_calls=len(tool_calls))
+        return tool_calls
     
     # process_messageメソッドは削除（run内で直接処理するように変更）
-    
+
+    def _collect_tool_results(self, pending_calls: list) -> str:
+        """
+        実行中のツール呼び出しの結果を呼び出し順に受け取り、タグでフォーマットするメソッド
+        対話型のツールはここで（呼び出し元のスレッドで）実行されます
+
+        Args:
+            pending_calls (list): ToolExecutor.submit() が返したPendingToolCallのリスト
+
+        Returns:
+            str: <ツール名_result>～</ツール名_result> 形式のツール結果を連結したもの
+        """
+        tool_all_result = ""
+        for pending in pending_calls:
+            result = pending.result()
+
+            # ログ出力
+            if pending.subtool:
+                print(f"[ツール実行: {pending.tool_name}.{pending.subtool}]")
+            else:
+                print(f"[ツール実行: {pending.tool_name}]")
+            print(f"[ツール結果: {result}]")
+
+            # 結果をフォーマット
+            tool_all_result += self._format_tool_result(pending.tool_name, pending.subtool, result)
+        return tool_all_result
+
+    @staticmethod
+    def _format_tool_result(tool_name: str, subtool_name: str, result) -> str:
+        """
+        ツール結果をエージェントに返すタグ形式にフォーマットするメソッド
+
+        Args:
+            tool_name (str): ツール名
+            subtool_name (str): サブツール名（ない場合はNone）
+            result: ツールの実行結果
+
+        Returns:
+            str: <ツール名_result>～</ツール名_result> 形式のツール結果
+        """
+        if subtool_name:
+            return f"<{tool_name}.{subtool_name}_result>{result}</{tool_name}.{subtool_name}_result>"
+        return f"<{tool_name}_result>{result}</{tool_name}_result>"
+
+    def _starts_early(self, tool_name: str) -> bool:
+        """
+        応答のストリーミング中に実行を開始してよいツールかどうかを返すメソッド
+        応答の最後に<<END>>があると結果は使われないため、副作用のないツール（ツール説明が「Cache: pure」）だけを
+        先に開始し、それ以外は応答全体を受け取って<<END>>がないことを確認してから開始します
+
+        Args:
+            tool_name (str): ツール名
+
+        Returns:
+            bool: ストリーミング中に開始してよい場合はTrue
+        """
+        return get_registry().cache_ttl(tool_name) == math.inf
+
+    def _stream_response(self, message: str) -> Tuple[str, list, list]:
+        """
+        エージェントの応答をストリーミングで表示しながら、ツール呼び出しを逐次抽出するメソッド
+        終了タグが届いた副作用のないツールは、その時点でバックグラウンド実行を開始します
+
+        Args:
+            message (str): エージェントに送信するメッセージ
+
+        Returns:
+            Tuple[str, list, list]: 応答全体、ツール呼び出しのリスト（ツール名, 引数, サブツール名）、
+                                    各ツール呼び出しのPendingToolCall（まだ開始していない場合はNone）
+        """
+        parser = ToolCallParser(self.tool_names)
+        tool_calls = []
+        pending_calls = []
+        chunks = []
+
+        def dispatch(calls):
+            for tool_name, arg, subtool_name in calls:
+                tool_calls.append((tool_name, arg, subtool_name))
+                pending_calls.append(
+                    self.tool_executor.submit(tool_name, arg, subtool_name) if self._starts_early(tool_name) else None
+                )
+
+        print("\nAI: ", end="", flush=True)
+        for delta in self.agent.chat_stream(message):
+            print(delta, end="", flush=True)
+            chunks.append(delta)
+            dispatch(parser.feed(delta))
+        print()
+        dispatch(parser.close())
+        return "".join(chunks), tool_calls, pending_calls
+
     def run(self):
         """
         会話ループを実行するメソッド
@@ -113,13 +276,19 @@ class Manager:
                 print("会話を終了します")
                 return
             
-            # 現在のメッセージ（最初はユーザー入力、その後はツール実行結果）
+            # 現在のメッセージ（最初はユーザー入力、その後はツール実行結果）と、その送信の用途
             current_message = user_input
+            purpose = PURPOSE_CHAT
             
             while True:
                 # エージェントにメッセージを送信
-                agent_response = self.agent.chat(current_message)
-                print(f"\nAI: {agent_response}")
+                self.agent.purpose = purpose
+                if self.stream:
+                    agent_response, tool_calls, pending_calls = self._stream_response(current_message)
+                else:
+                    agent_response = self.agent.chat(current_message)
+                    print(f"\nAI: {agent_response}")
+                    tool_calls = None
                 
                 # <<END>>タグがあるか確認
                 if "<<END>>" in agent_response:
@@ -127,11 +296,17 @@ class Manager:
                     print("AIが会話を終了しました")
                     break
                 
-                # ツール呼び出しを抽出
-                tool_calls = self.extract_tool_calls(agent_response)
+                # ツール呼び出しを抽出し、まだ開始していないものを並行して実行を開始
+                if tool_calls is None:
+                    tool_calls = self.extract_tool_calls(agent_response)
+                    pending_calls = [None] * len(tool_calls)
+                pending_calls = [
+                    self.tool_executor.submit(tool_name, arg, subtool_name) if pending is None else pending
+                    for (tool_name, arg, subtool_name), pending in zip(tool_calls, pending_calls)
+                ]
                 
                 # ツール呼び出しがない場合はユーザーに入力を求める
-                if not tool_calls:
+                if not pending_calls:
                     user_input = input("\nユーザー: ")
                     
                     # 終了コマンド
@@ -141,34 +316,19 @@ class Manager:
                     
                     # ユーザー入力を現在のメッセージとして設定
                     current_message = user_input
+                    purpose = PURPOSE_CHAT
                     continue
                 
-                # ツール呼び出しがある場合
-                tool_all_result = ""
-                for tool_name, arg, subtool_name in tool_calls:
-                    # ツールを呼び出し、結果を取得
-                    result = call_tool(tool_name, arg, subtool_name)
-                    
-                    # ログ出力
-                    if subtool_name:
-                        print(f"[ツール実行: {tool_name}.{subtool_name}]")
-                    else:
-                        print(f"[ツール実行: {tool_name}]")
-                    print(f"[ツール結果: {result}]")
-
-                    # 結果をフォーマット
-                    if subtool_name:
-                        tool_all_result += f"<{tool_name}.{subtool_name}_result>{result}</{tool_name}.{subtool_name}_result>"
-                    else:
-                        tool_all_result += f"<{tool_name}_result>{result}</{tool_name}_result>"
-                
-                # ツール結果をフォーマット
-                current_message = tool_all_result
+                # ツール呼び出しがある場合は、結果を呼び出し順にまとめてエージェントに送信する
+                current_message = self._collect_tool_results(pending_calls)
+                purpose = PURPOSE_TOOL
                 
         except KeyboardInterrupt:
             print("\n会話を中断します")
         except Exception as e:
             print(f"\nエラーが発生しました: {str(e)}")
+        finally:
+            self.close()
 
 
 # テスト用コード（直接実行された場合のみ実行）
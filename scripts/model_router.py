@@ -0,0 +1,407 @@
+import collections
+import concurrent.futures
+import contextvars
+import threading
+import time
+
+try:
+    from .instrumentation import current_span
+except ImportError:
+    from instrumentation import current_span
+
+# リクエストの用途
+PURPOSE_CHAT = "chat"        # ユーザーとの対話のターン
+PURPOSE_SUMMARY = "summary"  # 会話の要約
+PURPOSE_TOOL = "tool"        # ツールの実行結果を受け取った後のターン
+
+PURPOSES = (PURPOSE_CHAT, PURPOSE_SUMMARY, PURPOSE_TOOL)
+
+# ヘッジングで送信中のリクエストの中止イベント（スレッドから使う場合）
+_hedge_abort = contextvars.ContextVar("hedge_abort", default=None)
+
+
+class ModelResponseError(Exception):
+    """
+    モデルが応答を返さなかった（エラーのレスポンスを返した）ことを表す例外
+    すべての候補モデルが失敗した場合、最後のレスポンスを呼び出し側に返すために使います
+    """
+
+    def __init__(self, response_data):
+        super().__init__(str(response_data.get("error") or response_data)[:200])
+        self.response_data = response_data
+
+
+class HedgeCancelled(Exception):
+    """
+    ヘッジングで別のモデルが先に応答したため、リクエストを中止したことを表す例外
+    """
+
+
+def hedge_abort_event():
+    """
+    実行中のリクエストがヘッジングで送信されている場合、その中止イベントを返す関数
+    別のモデルが先に応答するとイベントがセットされるため、送信する関数は送信の直前に確認し、
+    セットされていればHedgeCancelledを送出してリクエストを中止します
+    （送信後の応答は生成済みでトークンを消費しているため、読み込んでルーターにトークン数を記録させます）
+
+    Returns:
+        threading.Event or None: 中止イベント。ヘッジングで送信していない場合はNone
+    """
+    return _hedge_abort.get()
+
+
+class _ModelStats:
+    """
+    モデルごとの所要時間と成功・失敗の記録
+    """
+
+    __slots__ = ("latencies", "requests", "errors")
+
+    def __init__(self, window):
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+
+class ModelRouter:
+    """
+    用途ごとのモデルの選択、エラー時のフォールバック、遅い応答へのヘッジングを行うクラス
+
+    - 用途（chat / summary / tool）ごとに使うモデルを指定できます（未指定の用途はchatのモデル）
+    - モデルがエラーを返した場合や例外が発生した場合は、fallbacksのモデルを順に試します
+    - hedge=Trueの場合、モデルの最近の所要時間のp95（hedge_quantile）を過ぎても応答がなければ、
+      次の候補モデルにも同じリクエストを送り、先に成功した応答を使います（もう一方は取り消します）
+      スレッドから使う場合、送信中のリクエストは止められないため、まだ送信していなければ
+      送信する関数がhedge_abort_event()を確認して中止し、送信済みの応答は使わずにトークン数をstats()に記録します
+    スレッドからもasyncioからも使えます。ヘッジングはストリーミングでないリクエストにだけ適用されます
+    """
+
+    def __init__(self, chat, summary=None, tool=None, fallbacks=(), hedge=False, hedge_quantile=0.95,
+                 hedge_min_samples=20, hedge_min_delay=0.05, window=200, max_workers=32):
+        """
+        ModelRouterクラスのコンストラクタ
+
+        Args:
+            chat (str): 対話のターンに使うモデル
+            summary (str, optional): 会話の要約に使うモデル。Noneの場合はchatのモデル
+            tool (str, optional): ツールの実行結果を受け取った後のターンに使うモデル。Noneの場合はchatのモデル
+            fallbacks (list): エラー時に順に試すモデルのリスト
+            hedge (bool): Trueの場合、遅い応答に対して次の候補モデルにも同じリクエストを送る
+            hedge_quantile (float): ヘッジングを始めるまでの待ち時間に使う、所要時間の分位数
+            hedge_min_samples (int): ヘッジングを始めるのに必要な、モデルの所要時間の記録数
+            hedge_min_delay (float): ヘッジングを始めるまでの最短の待ち時間（秒）
+            window (int): モデルごとに保持する直近の所要時間の数
+            max_workers (int): ヘッジングに使うスレッド数の上限（スレッドから使う場合）
+        """
+        self.models = {PURPOSE_CHAT: chat, PURPOSE_SUMMARY: summary or chat, PURPOSE_TOOL: tool or chat}
+        self.fallbacks = tuple(fallbacks)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.window = window
+        self.max_workers = max_workers
+        self._stats = {}
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._hedge_discarded = 0
+        self._hedge_discarded_tokens = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def model_for(self, purpose=PURPOSE_CHAT):
+        """
+        用途に使うモデルを返すメソッド
+
+        Args:
+            purpose (str): 用途（PURPOSE_CHAT / PURPOSE_SUMMARY / PURPOSE_TOOL）
+
+        Returns:
+            str: モデル名
+        """
+        return self.models.get(purpose) or self.models[PURPOSE_CHAT]
+
+    def candidates(self, purpose=PURPOSE_CHAT):
+        """
+        用途に使うモデルと、フォールバックのモデルを試す順に返すメソッド（重複は除く）
+
+        Args:
+            purpose (str): 用途
+
+        Returns:
+            list: モデル名のリスト
+        """
+        models = [self.model_for(purpose)]
+        for model in self.fallbacks:
+            if model not in models:
+                models.append(model)
+        return models
+
+    def _model_stats(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = _ModelStats(self.window)
+        return stats
+
+    def record(self, model, duration=None, ok=True):
+        """
+        モデルへのリクエストの結果を記録するメソッド
+
+        Args:
+            model (str): モデル名
+            duration (float, optional): 所要時間（秒）。Noneの場合は記録しない
+            ok (bool): 成功した場合はTrue
+        """
+        with self._lock:
+            stats = self._model_stats(model)
+            stats.requests += 1
+            if not ok:
+                stats.errors += 1
+            if duration is not None:
+                stats.latencies.append(duration)
+
+    def hedge_delay(self, model):
+        """
+        ヘッジングを始めるまでの待ち時間を返すメソッド
+
+        Args:
+            model (str): 最初に送信するモデル
+
+        Returns:
+            float or None: 待ち時間（秒）。ヘッジングが無効な場合や、所要時間の記録が足りない場合はNone
+        """
+        if not self.hedge:
+            return None
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None or len(stats.latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(stats.latencies)
+        return max(self.hedge_min_delay, latencies[int(self.hedge_quantile * (len(latencies) - 1))])
+
+    def stats(self):
+        """
+        モデルごとのリクエスト数・エラー数・所要時間と、ヘッジングの回数を返すメソッド
+
+        Returns:
+            dict: {"models": {モデル名: {requests, errors, p50, p95}}, "hedges": ヘッジングした回数,
+                   "hedge_wins": 後から送ったモデルの応答を使った回数,
+                   "hedge_discarded": 中止できずに届き、使わなかった応答の数,
+                   "hedge_discarded_tokens": 使わなかった応答のトークン数の合計}
+        """
+        with self._lock:
+            models = {}
+            for model, stats in self._stats.items():
+                latencies = sorted(stats.latencies)
+                models[model] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "p50": latencies[int(0.50 * (len(latencies) - 1))] if latencies else None,
+                    "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+                }
+            return {"models": models, "hedges": self._hedges, "hedge_wins": self._hedge_wins,
+                    "hedge_discarded": self._hedge_discarded,
+                    "hedge_discarded_tokens": self._hedge_discarded_tokens}
+
+    def _count_hedge(self, won):
+        with self._lock:
+            if won is None:
+                self._hedges += 1
+            elif won:
+                self._hedge_wins += 1
+
+    def _count_discarded(self, future):
+        # 中止できなかったリクエストの応答は使わないが、消費したトークン数は記録する
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        usage = result.get("usage") if isinstance(result, dict) else None
+        with self._lock:
+            self._hedge_discarded += 1
+            self._hedge_discarded_tokens += (usage or {}).get("total_tokens") or 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="model_router"
+                )
+            return self._executor
+
+    def _timed(self, model, send):
+        started = time.perf_counter()
+        try:
+            result = send(model)
+        except HedgeCancelled:
+            # 中止したリクエストは失敗として数えない
+            raise
+        except Exception:
+            # 失敗したリクエストの所要時間はヘッジングの待ち時間を短くしてしまうため、記録しない
+            self.record(model, ok=False)
+            raise
+        self.record(model, time.perf_counter() - started)
+        return result
+
+    def _submit(self, model, send, abort):
+        # スパンの親子関係を保つため、呼び出し元のコンテキストでスレッドを実行する
+        context = contextvars.copy_context()
+        context.run(_hedge_abort.set, abort)
+        return self._get_executor().submit(context.run, self._timed, model, send)
+
+    def _call_hedged(self, primary, backup, delay, send):
+        """
+        primaryに送信し、delay秒以内に応答がなければbackupにも送信して、先に成功した応答を返す内部メソッド
+        primaryがdelay秒以内に失敗した場合は、すぐにbackupに送信します
+
+        Returns:
+            tuple: (応答したモデル名, 応答)
+        """
+        aborts = {}
+        future = self._submit(primary, send, aborts.setdefault(primary, threading.Event()))
+        futures = {future: primary}
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if done and next(iter(done)).exception() is None:
+            return primary, next(iter(done)).result()
+        hedged = not done
+        if hedged:
+            self._count_hedge(None)
+            current_span().set(hedged=True)
+        futures[self._submit(backup, send, aborts.setdefault(backup, threading.Event()))] = backup
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 実行中のスレッドは止められないため、送信する関数に中止を知らせ、
+                    # 中止が間に合わずに届いた応答は使わずにトークン数だけを記録する
+                    for other in pending:
+                        aborts[futures[other]].set()
+                        if not other.cancel():
+                            other.add_done_callback(self._count_discarded)
+                    if hedged and futures[future] == backup:
+                        self._count_hedge(True)
+                    return futures[future], future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, purpose, send):
+        """
+        用途の候補モデルに順にリクエストを送信するメソッド（スレッド用）
+
+        Args:
+            purpose (str): 用途
+            send (callable): モデル名を受け取ってリクエストを送信し、応答を返す関数（失敗時は例外を送出する）
+
+        Returns:
+            tuple: (応答したモデル名, 応答)
+
+        Raises:
+            Exception: すべての候補モデルが失敗した場合は、最後の例外
+        """
+        models = self.candidates(purpose)
+        error = None
+        index = 0
+        while index < len(models):
+            model = models[index]
+            delay = self.hedge_delay(model) if index + 1 < len(models) else None
+            try:
+                if delay is None:
+                    return model, self._timed(model, send)
+                return self._call_hedged(model, models[index + 1], delay, send)
+            except Exception as e:
+                error = e
+            # ヘッジングした場合は2つのモデルを試している
+            index += 1 if delay is None else 2
+            if index < len(models):
+                current_span().set(fallback=index)
+        raise error
+
+    async def _atimed(self, model, send):
+        # asyncioはインポートに時間がかかるため、asyncioから使われたときに読み込む
+        import asyncio
+
+        started = time.perf_counter()
+        try:
+            result = await send(model)
+        except asyncio.CancelledError:
+            # 取り消したリクエストは、成功とも失敗とも数えない（途中で打ち切った所要時間も記録しない）
+            raise
+        except Exception:
+            self.record(model, ok=False)
+            raise
+        self.record(model, time.perf_counter() - started)
+        return result
+
+    async def _acall_hedged(self, primary, backup, delay, send):
+        """
+        _call_hedgedのasyncio版（遅かった方のリクエストは取り消す）
+        """
+        import asyncio
+
+        tasks = {asyncio.ensure_future(self._atimed(primary, send)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done and next(iter(done)).exception() is None:
+            return primary, next(iter(done)).result()
+        hedged = not done
+        if hedged:
+            self._count_hedge(None)
+            current_span().set(hedged=True)
+        tasks[asyncio.ensure_future(self._atimed(backup, send))] = backup
+
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged and tasks[task] == backup:
+                            self._count_hedge(True)
+                        return tasks[task], task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, purpose, send):
+        """
+        用途の候補モデルに順にリクエストを送信するメソッド（asyncio用）
+
+        Args:
+            purpose (str): 用途
+            send (callable): モデル名を受け取ってリクエストを送信し、応答を返すコルーチン関数
+
+        Returns:
+            tuple: (応答したモデル名, 応答)
+
+        Raises:
+            Exception: すべての候補モデルが失敗した場合は、最後の例外
+        """
+        models = self.candidates(purpose)
+        error = None
+        index = 0
+        while index < len(models):
+            model = models[index]
+            delay = self.hedge_delay(model) if index + 1 < len(models) else None
+            try:
+                if delay is None:
+                    return model, await self._atimed(model, send)
+                return await self._acall_hedged(model, models[index + 1], delay, send)
+            except Exception as e:
+                error = e
+            index += 1 if delay is None else 2
+            if index < len(models):
+                current_span().set(fallback=index)
+        raise error
+
+    def close(self):
+        """
+        ヘッジングに使うスレッドプールを終了するメソッド
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレート制限クラス
+    1秒あたりrate個のトークンが補充され、最大capacity個まで貯まります
+    スレッドからもasyncioからも使えます
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        TokenBucketクラスのコンストラクタ
+
+        Args:
+            rate (float): 1秒あたりに補充されるトークン数（リクエスト数）
+            capacity (float, optional): 貯められるトークンの上限（瞬間的に許すリクエスト数）。デフォルトはrate（最低1）
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount=1.0):
+        """
+        トークンを消費せずに、取得できるまでの待ち時間を返すメソッド
+
+        Args:
+            amount (float): 取得するトークン数
+
+        Returns:
+            float: 待ち時間（秒）。今すぐ取得できる場合は0
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (amount - self._tokens) / self.rate)
+
+    def try_acquire(self, amount=1.0):
+        """
+        トークンを取得できるか試すメソッド
+
+        Args:
+            amount (float): 取得するトークン数
+
+        Returns:
+            float: 取得できた場合は0、できなかった場合は取得できるまでの待ち時間（秒）
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount=1.0):
+        """
+        トークンを取得できるまで待つメソッド（スレッド用）
+
+        Args:
+            amount (float): 取得するトークン数
+        """
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, amount=1.0):
+        """
+        トークンを取得できるまで待つメソッド（asyncio用）
+
+        Args:
+            amount (float): 取得するトークン数
+        """
+        # asyncioは実行中のイベントループから呼ばれたときだけ必要なので、ここで読み込む
+        import asyncio
+
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    決定的なリクエストに対するAIの応答をキャッシュするクラス
+
+    - キーはリクエスト（モデル名とメッセージ）のJSONのSHA-256ハッシュです
+    - メモリ上のLRUキャッシュと、SQLiteによるディスク上のキャッシュの2段構成です
+    - 有効期限（TTL）と件数の上限で古いエントリを削除します
+    - ヒット数とミス数を記録します
+    """
+
+    # ディスク上の件数の上限を確認する間隔（書き込み回数）
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, max_entries=1024, ttl=None, db_path=None, max_db_entries=100_000):
+        """
+        ResponseCacheクラスのコンストラクタ
+
+        Args:
+            max_entries (int): メモリ上に保持するエントリ数の上限
+            ttl (float, optional): エントリの有効期限（秒）。Noneの場合は無期限
+            db_path (str, optional): SQLiteファイルのパス。Noneの場合はメモリ上のキャッシュのみ
+            max_db_entries (int): ディスク上に保持するエントリ数の上限
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self._memory = OrderedDict()  # キー -> (応答, 作成時刻)
+        self._lock = threading.Lock()  # メモリ上のキャッシュと統計情報
+        self._db_lock = threading.Lock()  # ディスク上のキャッシュ
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+
+    @property
+    def persistent(self):
+        """
+        ディスク上のキャッシュ（SQLite）を使う場合はTrue
+        """
+        return self._db is not None
+
+    @staticmethod
+    def make_key(payload):
+        """
+        リクエストからキャッシュのキーを作成するメソッド
+
+        Args:
+            payload (bytes or dict): エージェントがシリアライズしたリクエストのJSON（streamフラグを除く）、
+                                     またはリクエストデータの辞書（正規化してからハッシュする）
+
+        Returns:
+            str: キー（SHA-256の16進数文字列）
+        """
+        if isinstance(payload, dict):
+            # ストリーミングかどうかは応答の内容に影響しないため、キーには含めない
+            data = {key: value for key, value in payload.items() if key != "stream"}
+            payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        """
+        キャッシュから応答を取得するメソッド
+
+        Args:
+            key (str): キー
+
+        Returns:
+            str or None: キャッシュされた応答（ない場合はNone）
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                content, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return content
+                del self._memory[key]
+            if self._db is None:
+                self.misses += 1
+                return None
+
+        # ディスクを読んでいる間も、メモリ上のキャッシュは他のスレッドから使える
+        row = self._read_disk(key, now)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            content, created = row
+            self._remember(key, content, created)
+            self.hits += 1
+            self.disk_hits += 1
+            return content
+
+    def set(self, key, content, persist=True):
+        """
+        応答をキャッシュに保存するメソッド
+
+        Args:
+            key (str): キー
+            content (str): AIからの応答
+            persist (bool): Falseの場合はメモリ上にだけ保存する（ディスクへの書き込みはpersist()で別に行う）
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, content, now)
+        if persist:
+            self._write_disk(key, content, now)
+
+    def persist(self, key, content):
+        """
+        応答をディスク上のキャッシュにだけ書き込むメソッド
+        set(..., persist=False)と組み合わせて、ディスクへの書き込みを別のスレッドで行うために使います
+
+        Args:
+            key (str): キー
+            content (str): AIからの応答
+        """
+        self._write_disk(key, content, time.time())
+
+    def _read_disk(self, key, now):
+        """
+        ディスク上のキャッシュからエントリを読み込む内部メソッド（期限切れのエントリは削除する）
+
+        Returns:
+            tuple or None: (応答, 作成時刻)。ない場合や期限切れの場合はNone
+        """
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not self._expired(row[1], now):
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                return row
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+
+    def _write_disk(self, key, content, now):
+        """
+        ディスク上のキャッシュにエントリを書き込む内部メソッド
+        """
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, content, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, content, created):
+        """
+        メモリ上のLRUキャッシュに保存する内部メソッド（上限を超えたら古いものから削除）
+        """
+        self._memory[key] = (content, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        """
+        ディスク上の期限切れのエントリと、上限を超えた古いエントリを削除する内部メソッド
+        """
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_db_entries,),
+        )
+
+    def stats(self):
+        """
+        キャッシュの統計情報を返すメソッド
+
+        Returns:
+            dict: hits, misses, disk_hits, hit_rate, memory_entries
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self):
+        """
+        キャッシュの内容をすべて削除するメソッド
+        """
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self):
+        """
+        ディスク上のキャッシュを閉じるメソッド
+        """
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
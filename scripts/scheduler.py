@@ -0,0 +1,321 @@
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+try:
+    from .rate_limit import TokenBucket
+except ImportError:
+    from rate_limit import TokenBucket
+
+# 優先度（値が小さいほど先に送信される）
+PRIORITY_INTERACTIVE = 0   # ユーザーとの対話のターン
+PRIORITY_BACKGROUND = 10   # 会話の要約などのバックグラウンド処理
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# デフォルトのスケジューラ設定
+DEFAULT_CONFIG = {
+    "max_concurrency": 64,      # 同時に送信中にできるリクエスト数の上限
+    "key_rate": None,           # APIキーごとのリクエスト数の上限（毎秒）。Noneの場合は制限しない
+    "key_burst": None,          # APIキーごとに瞬間的に許すリクエスト数
+    "model_rates": {},          # モデルごとのリクエスト数の上限（毎秒） {モデル名: 上限}
+}
+
+_config = {key: (dict(value) if isinstance(value, dict) else value) for key, value in DEFAULT_CONFIG.items()}
+_scheduler = None
+_lock = threading.Lock()
+
+
+class _Waiter:
+    """
+    送信枠を待っているリクエストを表す内部クラス
+    """
+
+    __slots__ = ("priority", "wake", "buckets", "granted", "cancelled")
+
+    def __init__(self, priority, wake, buckets):
+        self.priority = priority
+        self.wake = wake
+        self.buckets = buckets  # 送信前にトークンを得る必要があるトークンバケット
+        self.granted = False
+        self.cancelled = False
+
+
+class RequestScheduler:
+    """
+    プロセス内のすべてのエージェントが共有するリクエストスケジューラ
+
+    - 同時に送信中のリクエスト数を max_concurrency に制限します
+    - 送信枠は優先度の高い順（同じ優先度なら到着順）に割り当てます
+    - 送信枠は、APIキーごと・モデルごとのトークンバケットの両方からトークンを得られたリクエストにだけ割り当てます
+      （レート制限で待つ間も優先度の順は保たれ、待っている間は送信枠を使いません）
+    - キューの長さ（レート制限で待っているリクエストを含む）と、優先度ごとの待ち時間を記録します
+    スレッド（slot）からもasyncio（aslot）からも使えます
+    """
+
+    def __init__(self, max_concurrency=64, key_rate=None, key_burst=None, model_rates=None):
+        """
+        RequestSchedulerクラスのコンストラクタ
+
+        Args:
+            max_concurrency (int): 同時に送信中にできるリクエスト数の上限
+            key_rate (float, optional): APIキーごとのリクエスト数の上限（毎秒）
+            key_burst (float, optional): APIキーごとに瞬間的に許すリクエスト数
+            model_rates (dict, optional): モデルごとのリクエスト数の上限（毎秒）
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.model_rates = dict(model_rates or {})
+        self._lock = threading.Lock()
+        self._queue = []  # (優先度, 到着順, _Waiter) のヒープ
+        self._counter = itertools.count()
+        self._active = 0
+        self._key_buckets = {}
+        self._model_buckets = {}
+        self._max_queue_depth = 0
+        self._class_stats = {}
+        self._timer = None  # トークンが補充されたときに割り当てをやり直すタイマー
+        self._timer_at = None
+
+    def _buckets_for(self, api_key, model):
+        """
+        リクエストに適用するトークンバケットを返す内部メソッド（ロックを取得した状態で呼ぶ）
+        """
+        buckets = []
+        if self.key_rate:
+            bucket = self._key_buckets.get(api_key)
+            if bucket is None:
+                bucket = self._key_buckets[api_key] = TokenBucket(self.key_rate, self.key_burst)
+            buckets.append(bucket)
+        rate = self.model_rates.get(model)
+        if rate:
+            bucket = self._model_buckets.get(model)
+            if bucket is None:
+                bucket = self._model_buckets[model] = TokenBucket(rate)
+            buckets.append(bucket)
+        return buckets
+
+    def _enqueue(self, priority, wake, api_key=None, model=None):
+        """
+        送信枠の待ち行列に追加する内部メソッド
+        空きがあり、トークンを得られればすぐに枠を割り当てます
+        """
+        with self._lock:
+            waiter = _Waiter(priority, wake, self._buckets_for(api_key, model))
+            heapq.heappush(self._queue, (priority, next(self._counter), waiter))
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._dispatch()
+        return waiter
+
+    def _grant(self, waiter):
+        for bucket in waiter.buckets:
+            bucket.try_acquire()
+        waiter.granted = True
+        self._active += 1
+        waiter.wake()
+
+    def _dispatch(self):
+        """
+        空いている送信枠を優先度の高い順に割り当てる内部メソッド（ロックを取得した状態で呼ぶ）
+        トークンバケットのトークンが足りないリクエストは待ち行列に残し、トークンが補充される時刻に割り当てをやり直します
+        """
+        # レート制限のないリクエストが先頭にある間は、ヒープから順に取り出す
+        while self._queue and self._active < self.max_concurrency:
+            waiter = self._queue[0][2]
+            if waiter.buckets and not waiter.cancelled:
+                break
+            heapq.heappop(self._queue)
+            if not waiter.cancelled:
+                self._grant(waiter)
+        if not self._queue or self._active >= self.max_concurrency:
+            return
+
+        # トークンを待っているリクエストがある場合は、優先度の順に調べる
+        # 優先度の高いリクエストが待っているバケットは、後ろのリクエストには使わせない
+        blocked = set()
+        retry = None
+        for _, _, waiter in sorted(self._queue):
+            if self._active >= self.max_concurrency:
+                break
+            if waiter.cancelled or any(bucket in blocked for bucket in waiter.buckets):
+                continue
+            waits = [(bucket.time_until(), bucket) for bucket in waiter.buckets]
+            empty = [bucket for wait, bucket in waits if wait > 0]
+            if empty:
+                blocked.update(empty)
+                wait = max(wait for wait, _ in waits)
+                retry = wait if retry is None else min(retry, wait)
+                continue
+            self._grant(waiter)
+        self._queue = [entry for entry in self._queue if not entry[2].granted and not entry[2].cancelled]
+        heapq.heapify(self._queue)
+        if retry is not None:
+            self._schedule_dispatch(retry)
+
+    def _schedule_dispatch(self, delay):
+        """
+        delay秒後に割り当てをやり直すタイマーを設定する内部メソッド（ロックを取得した状態で呼ぶ）
+        """
+        deadline = time.monotonic() + delay
+        if self._timer is not None:
+            if self._timer_at <= deadline:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer_at = deadline
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _cancel(self, waiter):
+        """
+        待機を中断したリクエストを取り消す内部メソッド
+        すでに枠が割り当てられていた場合は枠を返却します
+        """
+        with self._lock:
+            if waiter.granted:
+                self._active -= 1
+                self._dispatch()
+            else:
+                waiter.cancelled = True
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                # 取り消したリクエストが待っていたバケットを、後ろのリクエストに使わせる
+                self._dispatch()
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    def _record(self, priority, wait):
+        with self._lock:
+            stats = self._class_stats.setdefault(
+                PRIORITY_NAMES.get(priority, str(priority)),
+                {"requests": 0, "wait_total": 0.0, "wait_max": 0.0},
+            )
+            stats["requests"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+
+    @contextlib.contextmanager
+    def slot(self, model=None, api_key=None, priority=PRIORITY_INTERACTIVE):
+        """
+        送信枠を取得するコンテキストマネージャ（スレッド用）
+        withブロックの中でリクエストを送信し、抜けると枠が返却されます
+
+        Args:
+            model (str, optional): 送信先のモデル名
+            api_key (str, optional): 使用するAPIキー
+            priority (int): 優先度（PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND）
+        """
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set, api_key, model)
+        try:
+            event.wait()
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        self._record(priority, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, model=None, api_key=None, priority=PRIORITY_INTERACTIVE):
+        """
+        送信枠を取得するコンテキストマネージャ（asyncio用）
+
+        Args:
+            model (str, optional): 送信先のモデル名
+            api_key (str, optional): 使用するAPIキー
+            priority (int): 優先度（PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND）
+        """
+        # asyncioは実行中のイベントループから呼ばれたときだけ必要なので、ここで読み込む
+        import asyncio
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            # 別スレッドやイベントループから枠が返却された場合にも起こせるようにする
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, wake, api_key, model)
+        try:
+            await future
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        self._record(priority, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        """
+        スケジューラの統計情報を返すメソッド
+
+        Returns:
+            dict: active（送信中の数）, queue_depth（待ち行列の長さ）, max_queue_depth,
+                  classes（優先度ごとの requests, wait_total, wait_max, wait_avg）
+        """
+        with self._lock:
+            classes = {}
+            for name, stats in self._class_stats.items():
+                classes[name] = dict(stats, wait_avg=stats["wait_total"] / stats["requests"])
+            return {
+                "active": self._active,
+                "queue_depth": sum(1 for entry in self._queue if not entry[2].cancelled),
+                "max_queue_depth": self._max_queue_depth,
+                "classes": classes,
+            }
+
+
+def configure_scheduler(**options):
+    """
+    共有スケジューラの設定を変更する関数
+    次回のget_scheduler()呼び出しで新しい設定のスケジューラが作成されます
+
+    Args:
+        **options: DEFAULT_CONFIGのキーと同じ名前の設定値
+
+    Raises:
+        KeyError: 未知の設定名が指定された場合
+    """
+    global _scheduler
+    for key in options:
+        if key not in DEFAULT_CONFIG:
+            raise KeyError(f"未知のスケジューラ設定です: {key}")
+    with _lock:
+        _config.update(options)
+        _scheduler = None
+
+
+def get_scheduler():
+    """
+    プロセス全体で共有するRequestSchedulerを取得する関数
+
+    Returns:
+        RequestScheduler: 共有スケジューラ
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler(**_config)
+    return _scheduler
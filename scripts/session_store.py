@@ -0,0 +1,238 @@
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """
+    会話履歴を永続化する追記専用のセッションストア（SQLite、WALモード）
+
+    - メッセージは1件ずつ追記され、書き換えられることはありません
+    - メッセージと要約はセッションIDと連番の主キーで索引されます
+    - セッションの再開時は、最新の要約と、その要約以降のメッセージだけを読み込みます
+      （ログ全体を読み直す必要はありません）
+    """
+
+    def __init__(self, db_path, synchronous="NORMAL"):
+        """
+        SessionStoreクラスのコンストラクタ
+
+        Args:
+            db_path (str): SQLiteファイルのパス（":memory:" も可）
+            synchronous (str): SQLiteのsynchronous設定。"FULL"にすると電源断にも耐えるが追記が遅くなる
+        """
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, model TEXT, system_prompt TEXT,
+                created REAL NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,
+                content TEXT NOT NULL, created REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT NOT NULL, upto_seq INTEGER NOT NULL, summary TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (session_id, upto_seq)) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._next_seq = {}  # セッションID -> 次に追記するメッセージの連番
+
+    def _get_next_seq(self, session_id):
+        """
+        次に追記するメッセージの連番を返す内部メソッド（ロックを取得した状態で呼ぶ）
+        """
+        seq = self._next_seq.get(session_id)
+        if seq is None:
+            row = self._db.execute(
+                "SELECT MAX(seq) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            seq = 0 if row[0] is None else row[0] + 1
+        return seq
+
+    def open_session(self, session_id, model=None, system_prompt=None):
+        """
+        セッションを登録するメソッド（既に存在する場合はモデル名とシステムプロンプトを更新する）
+
+        Args:
+            session_id (str): セッションID
+            model (str, optional): 使用するAIモデルの名前
+            system_prompt (str, optional): システムプロンプト
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (session_id, model, system_prompt, created, updated) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET"
+                " model = COALESCE(excluded.model, model),"
+                " system_prompt = COALESCE(excluded.system_prompt, system_prompt),"
+                " updated = excluded.updated",
+                (session_id, model, system_prompt, now, now),
+            )
+            self._db.commit()
+
+    def get_session(self, session_id):
+        """
+        セッションの情報を取得するメソッド
+
+        Args:
+            session_id (str): セッションID
+
+        Returns:
+            dict or None: session_id, model, system_prompt, created, updated（存在しない場合はNone）
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT session_id, model, system_prompt, created, updated FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("session_id", "model", "system_prompt", "created", "updated"), row))
+
+    def append(self, session_id, role, content):
+        """
+        メッセージを1件追記するメソッド
+
+        Args:
+            session_id (str): セッションID
+            role (str): メッセージのロール（"user" / "assistant"）
+            content (str): メッセージの内容
+
+        Returns:
+            int: 追記したメッセージの連番
+        """
+        return self.append_many(session_id, [(role, content)])
+
+    def append_many(self, session_id, messages):
+        """
+        複数のメッセージをまとめて追記するメソッド（1回のコミットで書き込む）
+
+        Args:
+            session_id (str): セッションID
+            messages (list): (ロール, 内容) のタプル、または {"role", "content"} の辞書・Messageのリスト
+
+        Returns:
+            int: 最後に追記したメッセージの連番
+        """
+        now = time.time()
+        with self._lock:
+            seq = self._get_next_seq(session_id)
+            rows = []
+            for message in messages:
+                role, content = message if isinstance(message, tuple) else (message["role"], message["content"])
+                rows.append((session_id, seq, role, content, now))
+                seq += 1
+            self._db.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, created) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._db.execute("UPDATE sessions SET updated = ? WHERE session_id = ?", (now, session_id))
+            self._db.commit()
+            self._next_seq[session_id] = seq
+            return seq - 1
+
+    def next_seq(self, session_id):
+        """
+        次に追記されるメッセージの連番（これまでに追記したメッセージ数）を返すメソッド
+
+        Args:
+            session_id (str): セッションID
+
+        Returns:
+            int: 次の連番
+        """
+        with self._lock:
+            seq = self._get_next_seq(session_id)
+            self._next_seq[session_id] = seq
+            return seq
+
+    def save_summary(self, session_id, summary, upto_seq):
+        """
+        要約を保存するメソッド
+
+        Args:
+            session_id (str): セッションID
+            summary (str): 要約
+            upto_seq (int): 要約に含まれないメッセージの最初の連番（これ以降のメッセージが再開時に読み込まれる）
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (session_id, upto_seq, summary, created) VALUES (?, ?, ?, ?)",
+                (session_id, upto_seq, summary, time.time()),
+            )
+            self._db.commit()
+
+    def load(self, session_id, max_messages=None):
+        """
+        セッションを再開するために、最新の要約とそれ以降のメッセージを読み込むメソッド
+
+        Args:
+            session_id (str): セッションID
+            max_messages (int, optional): 読み込むメッセージ数の上限（末尾から数える）。Noneの場合は要約以降のすべて
+
+        Returns:
+            tuple: (最新の要約（ない場合はNone）, {"role", "content"} の辞書のリスト)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, upto_seq FROM summaries WHERE session_id = ? ORDER BY upto_seq DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            summary, upto_seq = row if row is not None else (None, 0)
+            if max_messages is None:
+                rows = self._db.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                    (session_id, upto_seq),
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ?"
+                    " ORDER BY seq DESC LIMIT ?",
+                    (session_id, upto_seq, max_messages),
+                ).fetchall()
+                rows.reverse()
+        return summary, [{"role": role, "content": content} for role, content in rows]
+
+    def iter_messages(self, session_id, start=0):
+        """
+        セッションのメッセージを連番の順にすべて返すメソッド（エクスポート用）
+
+        Args:
+            session_id (str): セッションID
+            start (int): 読み込みを開始する連番
+
+        Yields:
+            dict: {"seq", "role", "content", "created"}
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, role, content, created FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, start),
+            ).fetchall()
+        for seq, role, content, created in rows:
+            yield {"seq": seq, "role": role, "content": content, "created": created}
+
+    def list_sessions(self):
+        """
+        保存されているセッションIDの一覧を返すメソッド（更新が新しい順）
+
+        Returns:
+            list: セッションIDのリスト
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT session_id FROM sessions ORDER BY updated DESC").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        """
+        ストアを閉じるメソッド
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+複数の2者会話シミュレーションを同時に実行するバッチエンジン
+
+sample1/magic_conversation.py の会話ループを一般化したもので、
+シナリオ（役割のプロンプト、最初の発言、最大ターン数、終了タグ）をN個受け取り、
+asyncioで同時に実行します。APIへのリクエストは全体でレート制限され、
+終了した会話から順にJSONL形式でファイルへ書き出します。
+
+使い方:
+    python scripts/simulation.py sample1/scenarios.json --output transcripts.jsonl --concurrency 16 --rps 5
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+try:
+    from .async_agent import AsyncContextAwareAgent, close_async_session
+    from .scheduler import configure_scheduler, get_scheduler
+except ImportError:
+    from async_agent import AsyncContextAwareAgent, close_async_session
+    from scheduler import configure_scheduler, get_scheduler
+
+DEFAULT_MODEL = "google/gemini-2.0-flash-lite-001"
+
+
+class Scenario:
+    """
+    1つの会話シミュレーションの定義を表すクラス
+
+    roles[0] が opening_line を発言し、以降は roles[1] と roles[0] が交互に応答します。
+    応答の末尾に end_tag がある場合、その応答で会話を終了します。
+    """
+
+    def __init__(self, name, roles, opening_line, max_turns=20, end_tag="<end>", model=DEFAULT_MODEL):
+        """
+        Scenarioクラスのコンストラクタ
+
+        Args:
+            name (str): シナリオ名（出力の識別に使う）
+            roles (list): 2人の役割。各要素は {"name": 話者名, "system_prompt": プロンプト} の辞書
+            opening_line (str): roles[0] の最初の発言
+            max_turns (int): 応答の最大回数
+            end_tag (str, optional): 会話の終了を示すタグ。Noneの場合は最大ターン数まで続ける
+            model (str): 使用するAIモデル
+        """
+        if len(roles) != 2:
+            raise ValueError(f"シナリオ '{name}' の役割は2つ必要です（{len(roles)}個指定されています）")
+        self.name = name
+        self.roles = roles
+        self.opening_line = opening_line
+        self.max_turns = max_turns
+        self.end_tag = end_tag
+        self.model = model
+
+    @classmethod
+    def from_dict(cls, data, base_dir=None):
+        """
+        辞書からシナリオを作成するメソッド
+        役割のプロンプトは "system_prompt"（テキスト）または "system_prompt_path"（ファイルのパス）で指定します
+
+        Args:
+            data (dict): シナリオの定義
+            base_dir (Path, optional): system_prompt_path の相対パスの基準ディレクトリ
+
+        Returns:
+            Scenario: シナリオ
+        """
+        roles = []
+        for role in data["roles"]:
+            prompt = role.get("system_prompt")
+            if prompt is None and role.get("system_prompt_path"):
+                path = Path(role["system_prompt_path"])
+                if base_dir is not None and not path.is_absolute():
+                    path = Path(base_dir) / path
+                prompt = path.read_text(encoding="utf-8")
+            roles.append({"name": role["name"], "system_prompt": prompt})
+
+        return cls(
+            name=data.get("name", "scenario"),
+            roles=roles,
+            opening_line=data["opening_line"],
+            max_turns=data.get("max_turns", 20),
+            end_tag=data.get("end_tag", "<end>"),
+            model=data.get("model", DEFAULT_MODEL),
+        )
+
+    def split_end_tag(self, response):
+        """
+        応答から終了タグを取り除くメソッド
+
+        Args:
+            response (str): AIからの応答
+
+        Returns:
+            tuple: (終了タグを除いた応答, 終了タグがあったかどうか)
+        """
+        if self.end_tag:
+            stripped = response.rstrip()
+            if stripped.endswith(self.end_tag):
+                return stripped[:-len(self.end_tag)].rstrip(), True
+        return response, False
+
+
+def load_scenarios(path):
+    """
+    シナリオファイルを読み込む関数
+    JSON（シナリオのリスト）またはJSONL（1行に1シナリオ）に対応しています
+
+    Args:
+        path (str): シナリオファイルのパス
+
+    Returns:
+        list: Scenarioのリスト
+    """
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = [items]
+    return [Scenario.from_dict(item, base_dir=path.parent) for item in items]
+
+
+class SimulationRunner:
+    """
+    複数のシナリオを同時に実行するクラス
+
+    - 同時に進行する会話の数は concurrency で制限します
+    - APIへのリクエストは、共有スケジューラのAPIキーごとのレート制限で全体を制限します
+      （会話のターンだけでなく、要約や自動圧縮のリクエストも含めて数えます）
+    - 終了した会話から順に、1行1会話のJSONLで出力ファイルに追記します
+    """
+
+    def __init__(self, output_path, concurrency=8, requests_per_second=None, burst=None, agent_options=None):
+        """
+        SimulationRunnerクラスのコンストラクタ
+
+        Args:
+            output_path (str): 会話記録を書き出すJSONLファイルのパス
+            concurrency (int): 同時に実行する会話の数
+            requests_per_second (float, optional): 全体でのAPIリクエストの上限（毎秒）。
+                                                   Noneの場合はスケジューラの設定のまま
+            burst (float, optional): 瞬間的に許すリクエスト数（トークンバケットの容量）
+            agent_options (dict, optional): AsyncContextAwareAgentに渡す追加の引数（token_budgetなど）
+        """
+        self.output_path = Path(output_path)
+        self.concurrency = max(1, concurrency)
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.agent_options = agent_options or {}
+
+    def _create_agent(self, scenario, role):
+        return AsyncContextAwareAgent(
+            model=scenario.model, system_prompt=role["system_prompt"], **self.agent_options
+        )
+
+    async def run_scenario(self, scenario):
+        """
+        1つのシナリオを最後まで実行するメソッド
+
+        Args:
+            scenario (Scenario): 実行するシナリオ
+
+        Returns:
+            dict: 会話記録（name, transcript, turns, ended_by, error, elapsed）
+                  ended_by は "end_tag"、"max_turns"、"error" のいずれか
+        """
+        started = time.perf_counter()
+        agents = [self._create_agent(scenario, role) for role in scenario.roles]
+        speaker = 0
+        message = scenario.opening_line
+        transcript = [{"speaker": scenario.roles[0]["name"], "content": message}]
+        turns = 0
+        ended_by = "max_turns"
+        error = None
+
+        try:
+            while turns < scenario.max_turns:
+                # 次の話者に現在のメッセージを送信し、応答を取得
+                speaker = 1 - speaker
+                response = await agents[speaker].chat(message)
+                turns += 1
+                if response.startswith("エラー:"):
+                    ended_by, error = "error", response
+                    break
+
+                message, ended = scenario.split_end_tag(response)
+                transcript.append({"speaker": scenario.roles[speaker]["name"], "content": message})
+                if ended:
+                    ended_by = "end_tag"
+                    break
+        except Exception as e:
+            ended_by, error = "error", str(e)
+
+        return {
+            "name": scenario.name,
+            "transcript": transcript,
+            "turns": turns,
+            "ended_by": ended_by,
+            "error": error,
+            "elapsed": time.perf_counter() - started,
+        }
+
+    async def run(self, scenarios):
+        """
+        すべてのシナリオを同時に実行するメソッド
+
+        Args:
+            scenarios (list): Scenarioのリスト
+
+        Returns:
+            dict: 統計情報（conversations, turns, errors, elapsed, conversations_per_minute）
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        stats = {"conversations": 0, "turns": 0, "errors": 0}
+        previous = None
+        if self.requests_per_second:
+            # 実行中だけ共有スケジューラのレート制限を変更し、終了後に元に戻す
+            previous = get_scheduler()
+            configure_scheduler(key_rate=self.requests_per_second, key_burst=self.burst)
+
+        with open(self.output_path, "a", encoding="utf-8") as output:
+
+            async def run_one(scenario):
+                async with semaphore:
+                    record = await self.run_scenario(scenario)
+                # 終了した会話からすぐに書き出す（イベントループは1スレッドなので行が混ざることはない）
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                stats["conversations"] += 1
+                stats["turns"] += record["turns"]
+                stats["errors"] += record["ended_by"] == "error"
+
+            try:
+                await asyncio.gather(*(run_one(scenario) for scenario in scenarios))
+            finally:
+                await close_async_session()
+                if previous is not None:
+                    configure_scheduler(key_rate=previous.key_rate, key_burst=previous.key_burst)
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed"] = elapsed
+        stats["conversations_per_minute"] = stats["conversations"] / elapsed * 60 if elapsed else 0.0
+        return stats
+
+
+def run_simulations(scenarios, output_path, **options):
+    """
+    シナリオを同時に実行する関数（asyncioを使わない呼び出し元向け）
+
+    Args:
+        scenarios (list): Scenarioのリスト
+        output_path (str): 会話記録を書き出すJSONLファイルのパス
+        **options: SimulationRunnerに渡す引数
+
+    Returns:
+        dict: 統計情報
+    """
+    return asyncio.run(SimulationRunner(output_path, **options).run(scenarios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会話シミュレーションを同時に実行する")
+    parser.add_argument("scenarios", help="シナリオファイル（JSONまたはJSONL）")
+    parser.add_argument("--output", "-o", default="transcripts.jsonl", help="会話記録の出力先（JSONL、追記）")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="同時に実行する会話の数")
+    parser.add_argument("--rps", type=float, default=None, help="全体でのAPIリクエストの上限（毎秒）")
+    parser.add_argument("--repeat", type=int, default=1, help="各シナリオを実行する回数")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios) * args.repeat
+    print(f"{len(scenarios)}件の会話を開始します（同時実行数: {args.concurrency}）")
+    stats = run_simulations(
+        scenarios, args.output, concurrency=args.concurrency, requests_per_second=args.rps
+    )
+    print(
+        f"完了: {stats['conversations']}件（エラー {stats['errors']}件）、"
+        f"{stats['turns']}ターン、{stats['elapsed']:.1f}秒、"
+        f"{stats['conversations_per_minute']:.1f}会話/分"
+    )
+    print(f"会話記録は {args.output} に保存されました。")
+
+
+if __name__ == "__main__":
+    main()
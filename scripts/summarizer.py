@@ -0,0 +1,209 @@
+import time
+
+try:
+    from .tokens import estimate_tokens
+except ImportError:
+    from tokens import estimate_tokens
+
+# 文の区切りとみなす文字
+SENTENCE_ENDINGS = "。！？!?.\n"
+
+
+def truncate_at_sentence(text, max_length):
+    """
+    テキストを最大文字数以内に、できるだけ文の区切りで切り詰める関数
+
+    Args:
+        text (str): テキスト
+        max_length (int): 最大文字数
+
+    Returns:
+        str: 切り詰めたテキスト
+    """
+    if len(text) <= max_length:
+        return text
+    head = text[:max_length]
+    cut = max(head.rfind(ending) for ending in SENTENCE_ENDINGS)
+    if cut <= 0:
+        # 区切りが見つからない場合は文字数で切る
+        return head
+    return head[:cut + 1].rstrip()
+
+
+class Summarizer:
+    """
+    要約を作成するパイプラインの段階を表すクラス
+
+    - 要約用のエージェントは呼び出しごとに会話履歴をリセットし、状態を持ちません
+      （文字数の修正依頼では直前の要約だけを送信します）
+    - 文字数の修正は最大max_attempts回までで、それでも長すぎる場合は文の区切りで切り詰めます
+    - 呼び出しごとに試行回数・トークン数・所要時間を記録します
+    - cancelledを指定した場合、依頼の合間に確認し、設定されていれば要約を中止します（バックグラウンドでの要約用）
+    """
+
+    def __init__(self, agent, max_attempts=3, tolerance=0.3, cancelled=None):
+        """
+        Summarizerクラスのコンストラクタ
+
+        Args:
+            agent (ChatAgent): 要約に使用するエージェント
+            max_attempts (int): 要約の依頼回数の上限（最初の依頼を含む）
+            tolerance (float): 目標文字数に対して許容する誤差の割合
+            cancelled (threading.Event, optional): 設定されると要約を中止するイベント
+        """
+        self.agent = agent
+        self.max_attempts = max(1, max_attempts)
+        self.tolerance = tolerance
+        self.cancelled = cancelled
+
+    def is_cancelled(self):
+        """
+        要約が中止されたかを返すメソッド
+
+        Returns:
+            bool: cancelledが設定されている場合はTrue
+        """
+        return self.cancelled is not None and self.cancelled.is_set()
+
+    def needs_adjustment(self, summary, target_length):
+        """
+        要約の文字数が目標から許容範囲以上ずれているかを判定するメソッド
+
+        Args:
+            summary (str): 要約
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            bool: 修正が必要な場合はTrue
+        """
+        return abs(len(summary) - target_length) / target_length > self.tolerance
+
+    @staticmethod
+    def build_adjustment_prompt(summary, target_length):
+        """
+        要約の文字数の修正を依頼するプロンプトを作成するメソッド
+
+        Args:
+            summary (str): 直前の要約
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            str: 修正指示のプロンプト
+        """
+        return f"""
+以下の要約の文字数は{len(summary)}文字です。
+目標は{target_length}文字です。
+{'より短く' if len(summary) > target_length else 'より詳細に'}要約し直してください。
+
+元の要約：
+{summary}
+"""
+
+    def _new_metrics(self):
+        return {
+            "attempts": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency": 0.0,
+            "truncated": False,
+            "succeeded": False,
+        }
+
+    def _record(self, metrics, prompt, response, started):
+        """
+        1回の依頼の結果をメトリクスに記録する内部メソッド
+        APIがusageを返した場合はその値を、返さなかった場合は推定値を使います
+        """
+        metrics["attempts"] += 1
+        metrics["latency"] += time.perf_counter() - started
+        usage = getattr(self.agent, "last_usage", None) or {}
+        metrics["prompt_tokens"] += usage.get("prompt_tokens", estimate_tokens(prompt))
+        metrics["completion_tokens"] += usage.get("completion_tokens", estimate_tokens(response))
+
+    def _finish(self, summary, target_length, metrics):
+        """
+        試行回数の上限に達した後の仕上げを行う内部メソッド
+        長すぎる要約は文の区切りで切り詰めます
+        """
+        if summary is None:
+            return None, metrics
+        if self.needs_adjustment(summary, target_length) and len(summary) > target_length:
+            summary = truncate_at_sentence(summary, target_length)
+            metrics["truncated"] = True
+        metrics["succeeded"] = True
+        return summary, metrics
+
+    def _ask(self, prompt, metrics):
+        # 毎回会話履歴をリセットし、今回のプロンプトだけを送信する
+        self.agent.reset_conversation()
+        started = time.perf_counter()
+        response = self.agent.chat(prompt)
+        self._record(metrics, prompt, response, started)
+        return response
+
+    def summarize(self, prompt, target_length):
+        """
+        要約を作成するメソッド
+
+        Args:
+            prompt (str): 要約を依頼するプロンプト
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            tuple: (要約（失敗した場合はNone）, メトリクスの辞書)
+                   メトリクスは attempts, prompt_tokens, completion_tokens, latency, truncated, succeeded を含みます
+                   中止された場合、要約はNoneです
+        """
+        metrics = self._new_metrics()
+        summary = None
+        next_prompt = prompt
+        while metrics["attempts"] < self.max_attempts:
+            if self.is_cancelled():
+                return None, metrics
+            response = self._ask(next_prompt, metrics)
+            if response.startswith("エラー:"):
+                break
+            summary = response
+            if not self.needs_adjustment(summary, target_length):
+                break
+            next_prompt = self.build_adjustment_prompt(summary, target_length)
+        return self._finish(summary, target_length, metrics)
+
+
+class AsyncSummarizer(Summarizer):
+    """
+    Summarizerのasyncio版（AsyncChatAgentを使用する）
+    """
+
+    async def _ask(self, prompt, metrics):
+        self.agent.reset_conversation()
+        started = time.perf_counter()
+        response = await self.agent.chat(prompt)
+        self._record(metrics, prompt, response, started)
+        return response
+
+    async def summarize(self, prompt, target_length):
+        """
+        要約を作成するメソッド
+
+        Args:
+            prompt (str): 要約を依頼するプロンプト
+            target_length (int): 要約の目標文字数
+
+        Returns:
+            tuple: (要約（失敗した場合はNone）, メトリクスの辞書)
+        """
+        metrics = self._new_metrics()
+        summary = None
+        next_prompt = prompt
+        while metrics["attempts"] < self.max_attempts:
+            if self.is_cancelled():
+                return None, metrics
+            response = await self._ask(next_prompt, metrics)
+            if response.startswith("エラー:"):
+                break
+            summary = response
+            if not self.needs_adjustment(summary, target_length):
+                break
+            next_prompt = self.build_adjustment_prompt(summary, target_length)
+        return self._finish(summary, target_length, metrics)
@@ -0,0 +1,27 @@
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算する関数
+    APIを呼ばずにローカルで見積もるため、英数字は4文字で1トークン、
+    日本語などの非ASCII文字は1文字で1トークンとして数えます
+
+    Args:
+        text (str): テキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    ascii_count = len(text.encode("ascii", "ignore"))
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+
+def estimate_messages_tokens(messages):
+    """
+    メッセージのリストのトークン数を概算する関数（1メッセージあたり4トークンの付加分を含む）
+
+    Args:
+        messages (list): {"role": ..., "content": ...} のリスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    return sum(estimate_tokens(message["content"]) + 4 for message in messages)
@@ -0,0 +1,249 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Tuple
+
+try:
+    from .agent_logging import get_logger
+    from .instrumentation import span
+    from .tool_router import call_cached, call_tool
+except ImportError:
+    from agent_logging import get_logger
+    from instrumentation import span
+    from tool_router import call_cached, call_tool
+
+logger = get_logger("tools")
+
+# コンソールで入力を求めるため、呼び出し元のスレッドで1つずつ実行するツール
+INTERACTIVE_TOOLS = {"ask_user"}
+
+
+class PendingToolCall:
+    """
+    ToolExecutor.submit() が返す、実行中（または実行待ち）のツール呼び出し
+    """
+
+    def __init__(self, executor, tool_name, arg, subtool, future=None, deadline=None):
+        self.executor = executor
+        self.tool_name = tool_name
+        self.arg = arg
+        self.subtool = subtool
+        self.future = future      # Noneの場合は result() 呼び出し時に呼び出し元スレッドで実行する
+        self.deadline = deadline  # タイムアウトの期限（time.monotonic()基準、Noneは無制限）
+
+    def result(self):
+        """
+        ツールの実行結果を取得するメソッド
+        タイムアウトした場合はエラーメッセージを返します
+
+        Returns:
+            ツールの実行結果
+        """
+        if self.future is None:
+            return self.executor._invoke(self.tool_name, self.arg, self.subtool)
+
+        timeout = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+        try:
+            return self.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.executor._abandon(self.future)
+            return self.executor._timeout_message(self.tool_name)
+
+
+class ToolExecutor:
+    """
+    1つの応答に含まれる複数のツール呼び出しを並行に実行するクラス
+
+    - 独立したツール呼び出しはスレッドプールで同時に実行します
+    - 結果は常に呼び出し順に返します
+    - ツールごとにタイムアウトを設定できます
+    - ask_userなどの対話型ツールはコンソールを共有するため、1つずつ実行します
+    - backendにToolProcessPoolを指定すると、対話型以外のツールを別プロセスで実行します
+
+    スレッドで実行中のツールは止められないため、タイムアウトしたツールのスレッドは終了するまで動き続けます。
+    その分だけ後続のツールが待たされないよう、実行中のツールがタイムアウトした場合はスレッドプールを新しく作り直します
+    （止まったままのスレッドは残るため、応答しなくなる可能性のあるツールはbackendで実行してください。
+    ToolProcessPoolはタイムアウトしたツールをプロセスごと終了させます）。
+    backendで実行する場合のタイムアウトはプロセスプールに任せ、スレッドプールは作り直しません。
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: Optional[float] = 30.0,
+                 tool_timeouts: Optional[dict] = None, serial_tools=INTERACTIVE_TOOLS, backend=None):
+        """
+        ToolExecutorクラスのコンストラクタ
+
+        Args:
+            max_workers (int): 同時に実行するツールの最大数
+            timeout (float, optional): ツール1回あたりのタイムアウト（秒）。Noneの場合は無制限
+            tool_timeouts (dict, optional): ツール名ごとのタイムアウト（秒）。timeoutより優先される
+            serial_tools (set): 呼び出し元のスレッドで1つずつ実行するツール名
+            backend (ToolProcessPool, optional): ツールを実行するプロセスプール。Noneの場合はこのプロセス内で実行する
+                                                 （同時に実行されるのは max_workers とプロセス数の小さい方まで）
+        """
+        self.timeout = timeout
+        self.tool_timeouts = dict(tool_timeouts or {})
+        self.serial_tools = set(serial_tools)
+        self.backend = backend
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._pool_lock = threading.Lock()
+        self._serial_lock = threading.Lock()
+        self.abandoned = 0  # タイムアウトしたまま実行中のツールのためにスレッドプールを作り直した回数
+
+    def _abandon(self, future):
+        """
+        タイムアウトした呼び出しを打ち切る内部メソッド
+        実行待ちの場合は取り消し、実行中の場合はそのスレッドを使わないようスレッドプールを作り直します
+        """
+        if future.cancel() or future.done():
+            return
+        with self._pool_lock:
+            pool, self._pool = self._pool, ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            self.abandoned += 1
+        # 古いプールの実行待ちの呼び出しは、それぞれのタイムアウトで打ち切られる
+        pool.shutdown(wait=False)
+        logger.warning("実行中のツールがタイムアウトしたため、スレッドプールを作り直しました（%d回目）", self.abandoned)
+
+    def get_timeout(self, tool_name: str) -> Optional[float]:
+        """
+        ツールのタイムアウト（秒）を返すメソッド
+        対話型ツールはユーザーの入力を待つため、個別に指定されていない限り無制限です
+
+        Args:
+            tool_name (str): ツール名
+
+        Returns:
+            Optional[float]: タイムアウト（秒）。Noneの場合は無制限
+        """
+        if tool_name in self.tool_timeouts:
+            return self.tool_timeouts[tool_name]
+        if tool_name in self.serial_tools:
+            return None
+        return self.timeout
+
+    def _invoke(self, tool_name, arg, subtool):
+        """
+        ツールを実行する内部メソッド（対話型ツールは排他的に実行する）
+        """
+        if tool_name in self.serial_tools:
+            with self._serial_lock:
+                return call_tool(tool_name, arg, subtool)
+        if self.backend is not None:
+            # 実行結果のキャッシュはこのプロセスで確認し、ヒットした場合はワーカーに送らない
+            return call_cached(tool_name, arg, subtool, lambda: self._invoke_backend(tool_name, arg, subtool))
+        return call_tool(tool_name, arg, subtool)
+
+    def _invoke_backend(self, tool_name, arg, subtool):
+        """
+        ツールをプロセスプールで実行する内部メソッド
+        """
+        # タイムアウトした場合はプロセスごと終了させる（ワーカー内の計測は無効なので、ここで計測する）
+        with span("tool.call", tool=tool_name, subtool=subtool, backend="process"):
+            return self.backend.call(tool_name, arg, subtool, timeout=self.get_timeout(tool_name))
+
+    def _submit(self, tool_name, arg, subtool):
+        """
+        ツールの実行をスレッドプールに投入する内部メソッド
+        _abandonがプールを作り直している最中に、終了した古いプールへ投入しないようロックを取得して行います
+        """
+        with self._pool_lock:
+            return self._pool.submit(self._invoke, tool_name, arg, subtool)
+
+    def _thread_timeout(self, tool_name):
+        """
+        スレッドで結果を待つ時間の上限（秒）を返す内部メソッド
+        backendで実行する場合は、プロセスプールがタイムアウトしたワーカーを終了させてエラーを返すため、
+        スレッド側では打ち切りません（同じ時間で打ち切ると、プロセスより先にスレッドの期限が切れてしまうため）
+        """
+        if self.backend is not None:
+            return None
+        return self.get_timeout(tool_name)
+
+    @staticmethod
+    def _timeout_message(tool_name):
+        return f"エラー: ツール '{tool_name}' の実行がタイムアウトしました"
+
+    def submit(self, tool_name: str, arg, subtool: str = None) -> PendingToolCall:
+        """
+        ツールの実行を開始するメソッド
+        対話型ツールはここでは開始せず、result() を呼んだ時点で呼び出し元のスレッドで実行します
+
+        Args:
+            tool_name (str): ツール名
+            arg: ツールに渡す引数
+            subtool (str, optional): サブツール名
+
+        Returns:
+            PendingToolCall: 実行中のツール呼び出し
+        """
+        if tool_name in self.serial_tools:
+            return PendingToolCall(self, tool_name, arg, subtool)
+
+        timeout = self._thread_timeout(tool_name)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = self._submit(tool_name, arg, subtool)
+        return PendingToolCall(self, tool_name, arg, subtool, future, deadline)
+
+    def run(self, tool_calls: List[Tuple[str, str, str]]) -> list:
+        """
+        複数のツール呼び出しを並行に実行し、呼び出し順に結果を返すメソッド
+
+        Args:
+            tool_calls (List[Tuple[str, str, str]]): ツール呼び出しのリスト（ツール名, 引数, サブツール名）
+
+        Returns:
+            list: 各ツールの実行結果（呼び出し順）
+        """
+        pending_calls = [self.submit(tool_name, arg, subtool) for tool_name, arg, subtool in tool_calls]
+        return [pending.result() for pending in pending_calls]
+
+    async def arun_call(self, tool_name: str, arg, subtool: str = None):
+        """
+        ツールを1つ実行するメソッド（asyncio版）
+        ツールはスレッドプールで実行し、イベントループはブロックしません
+
+        Args:
+            tool_name (str): ツール名
+            arg: ツールに渡す引数
+            subtool (str, optional): サブツール名
+
+        Returns:
+            ツールの実行結果
+        """
+        # asyncioは実行中のイベントループから呼ばれたときだけ必要なので、ここで読み込む
+        import asyncio
+
+        future = self._submit(tool_name, arg, subtool)
+        try:
+            # タイムアウト時、実行待ちの呼び出しはwait_forが取り消し、実行中の場合は_abandonでプールを作り直す
+            return await asyncio.wait_for(asyncio.wrap_future(future), self._thread_timeout(tool_name))
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            return self._timeout_message(tool_name)
+
+    async def arun(self, tool_calls: List[Tuple[str, str, str]]) -> list:
+        """
+        複数のツール呼び出しを並行に実行し、呼び出し順に結果を返すメソッド（asyncio版）
+
+        Args:
+            tool_calls (List[Tuple[str, str, str]]): ツール呼び出しのリスト（ツール名, 引数, サブツール名）
+
+        Returns:
+            list: 各ツールの実行結果（呼び出し順）
+        """
+        import asyncio
+
+        return await asyncio.gather(
+            *(self.arun_call(tool_name, arg, subtool) for tool_name, arg, subtool in tool_calls)
+        )
+
+    def shutdown(self, wait: bool = False):
+        """
+        スレッドプールを終了するメソッド
+
+        Args:
+            wait (bool): Trueの場合、実行中のツールの終了を待つ
+        """
+        with self._pool_lock:
+            pool = self._pool
+        pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,146 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    from .tool_router import get_tool_names
+except ImportError:
+    from tool_router import get_tool_names
+
+
+@lru_cache(maxsize=32)
+def _compile_open_pattern(tool_names: frozenset):
+    """
+    登録済みのツール名だけに一致する開始タグのパターンをコンパイルする関数
+    ツール名の組み合わせごとにキャッシュされます
+
+    Args:
+        tool_names (frozenset): ツール名の集合
+
+    Returns:
+        re.Pattern: <ツール名> または <ツール名.サブツール名> に一致するパターン
+    """
+    if not tool_names:
+        # どの文字列にも一致しないパターン
+        return re.compile(r'(?!)')
+    names = "|".join(re.escape(name) for name in sorted(tool_names, key=len, reverse=True))
+    return re.compile(rf'<({names})(?:\.([a-zA-Z0-9_]+))?>')
+
+
+class ToolCallParser:
+    """
+    エージェントの応答からツール呼び出しを1回の走査で抽出するクラス
+
+    - 登録済みのツール名のタグだけを対象にします（それ以外のタグは通常の文字列として扱います）
+    - ツール呼び出しは応答中に現れた順に返します
+    - 引数の中にある別のタグは入れ子として解釈せず、引数の一部として扱います
+    - 終了タグのない開始タグは通常の文字列として扱い、その後のツール呼び出しを取りこぼしません
+    - feed() で応答の断片を渡すと、終了タグが届いた時点でツール呼び出しを返します
+    """
+
+    def __init__(self, tool_names: Optional[Iterable[str]] = None):
+        """
+        ToolCallParserクラスのコンストラクタ
+
+        Args:
+            tool_names (Iterable[str], optional): 対象とするツール名。Noneの場合はtoolsフォルダのツールすべて
+        """
+        if tool_names is None:
+            tool_names = get_tool_names()
+        self._open_pattern = _compile_open_pattern(frozenset(tool_names))
+        self._buffer = ""
+        # 終了タグ待ちの開始タグ: (開始タグの開始位置, 引数の開始位置, ツール名, サブツール名, 終了タグ)
+        self._pending = None
+        self._close_search_from = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, str]]:
+        """
+        応答の断片を追加し、新たに完成したツール呼び出しを返すメソッド
+
+        Args:
+            chunk (str): 応答の断片
+
+        Returns:
+            List[Tuple[str, str, str]]: 完成したツール呼び出しのリスト（ツール名, 引数, サブツール名）
+        """
+        self._buffer += chunk
+        return self._scan(final=False)
+
+    def close(self) -> List[Tuple[str, str, str]]:
+        """
+        応答の終わりを通知し、残りのツール呼び出しを返すメソッド
+        終了タグが届かなかった開始タグは通常の文字列として扱います
+
+        Returns:
+            List[Tuple[str, str, str]]: 残りのツール呼び出しのリスト（ツール名, 引数, サブツール名）
+        """
+        return self._scan(final=True)
+
+    @classmethod
+    def parse(cls, text: str, tool_names: Optional[Iterable[str]] = None) -> List[Tuple[str, str, str]]:
+        """
+        応答全体からツール呼び出しを抽出するメソッド
+
+        Args:
+            text (str): エージェントからの応答
+            tool_names (Iterable[str], optional): 対象とするツール名
+
+        Returns:
+            List[Tuple[str, str, str]]: ツール呼び出しのリスト（ツール名, 引数, サブツール名）
+        """
+        parser = cls(tool_names)
+        return parser.feed(text) + parser.close()
+
+    def _scan(self, final: bool) -> List[Tuple[str, str, str]]:
+        """
+        バッファを走査してツール呼び出しを取り出す内部メソッド
+        """
+        buffer = self._buffer
+        position = 0
+        calls = []
+
+        while True:
+            if self._pending is None:
+                match = self._open_pattern.search(buffer, position)
+                if match is None:
+                    if final:
+                        position = len(buffer)
+                    else:
+                        # 末尾に途中までの開始タグがあれば、次の断片のために残しておく
+                        last_open = buffer.rfind("<", position)
+                        if last_open != -1 and ">" not in buffer[last_open:]:
+                            position = last_open
+                        else:
+                            position = len(buffer)
+                    break
+
+                tool_name, subtool_name = match.group(1), match.group(2)
+                close_tag = f"</{tool_name}.{subtool_name}>" if subtool_name else f"</{tool_name}>"
+                self._pending = (match.start(), match.end(), tool_name, subtool_name, close_tag)
+                self._close_search_from = match.end()
+
+            start, arg_start, tool_name, subtool_name, close_tag = self._pending
+            end = buffer.find(close_tag, self._close_search_from)
+            if end == -1:
+                if final:
+                    # 終了タグのない開始タグは読み飛ばし、その直後から探索を続ける
+                    self._pending = None
+                    position = arg_start
+                    continue
+                # 終了タグを待つ（次回は今回探索した範囲を読み直さない）
+                position = start
+                self._close_search_from = max(arg_start, len(buffer) - len(close_tag) + 1)
+                break
+
+            calls.append((tool_name, buffer[arg_start:end], subtool_name))
+            self._pending = None
+            position = end + len(close_tag)
+
+        # 処理済みの部分をバッファから取り除く
+        if position:
+            self._buffer = buffer[position:]
+            if self._pending is not None:
+                start, arg_start, tool_name, subtool_name, close_tag = self._pending
+                self._pending = (start - position, arg_start - position, tool_name, subtool_name, close_tag)
+                self._close_search_from -= position
+        return calls
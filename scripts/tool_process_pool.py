@@ -0,0 +1,277 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+
+try:
+    from .tool_router import ToolRegistry, call_tool
+except ImportError:
+    from tool_router import ToolRegistry, call_tool
+
+# call() でタイムアウトを指定しなかったことを表す値（Noneは「無制限」の意味で使う）
+_DEFAULT = object()
+
+
+def _address_space_size():
+    """
+    現在のプロセスの仮想メモリサイズ（バイト）を返す関数（取得できない環境では0）
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _worker_main(conn, tools_dir, preload):
+    """
+    ワーカープロセスのメインループ
+    ツールモジュールを読み込んでおき、パイプから (ツール名, 引数, サブツール名, メモリ上限) を受け取って実行します
+    """
+    # Ctrl+Cは親プロセスが処理する（ワーカーは親から終了させる）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        import resource
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    except (ImportError, AttributeError, ValueError):
+        resource = None  # Windowsなどメモリ上限を設定できない環境
+
+    registry = ToolRegistry(tools_dir)
+    if preload:
+        for tool_name in registry.list_tools():
+            try:
+                registry.get_function(tool_name)
+            except Exception:
+                pass  # 読み込めないツールは呼び出し時にエラーを返す
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        tool_name, arg, subtool, memory_limit = request
+
+        limited = resource is not None and memory_limit is not None
+        if limited:
+            # 呼び出し時点の使用量に上限を加えた値を、仮想メモリの上限とする
+            soft_limit = _address_space_size() + memory_limit
+            if hard_limit != resource.RLIM_INFINITY:
+                soft_limit = min(soft_limit, hard_limit)
+            resource.setrlimit(resource.RLIMIT_AS, (soft_limit, hard_limit))
+        try:
+            # 実行結果のキャッシュは呼び出し元のプロセスで扱う
+            result = call_tool(tool_name, arg, subtool, registry=registry, use_cache=False)
+        finally:
+            if limited:
+                resource.setrlimit(resource.RLIMIT_AS, (hard_limit, hard_limit))
+
+        try:
+            conn.send(result)
+        except Exception:
+            # pickleできない結果は文字列にして返す（Managerは結果を文字列としてエージェントに渡す）
+            conn.send(str(result))
+
+
+class _Worker:
+    """
+    ワーカープロセスと、それにつながるパイプを表す内部クラス
+    """
+
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class ToolProcessPool:
+    """
+    ツールを別プロセスで実行するワーカープロセスのプール（ToolExecutorのバックエンド）
+
+    - ワーカーは起動時にツールモジュールを読み込んでおき、呼び出しごとの読み込みは行いません
+    - 呼び出しごとに実行時間（壁時計時間）とメモリの上限を設定できます
+      時間切れになったワーカーは強制終了し、次に使うときに起動し直します
+    - ツールが異常終了してもエラーメッセージを返すだけで、呼び出し元のプロセスには影響しません
+    - CPUを使うツールもGILに縛られず、複数のコアで同時に実行されます
+    引数と結果はワーカーごとのパイプでやり取りします。
+    ask_userのように標準入力を使うツールは、ToolExecutorが呼び出し元のプロセスで実行します。
+    """
+
+    def __init__(self, processes: int = None, timeout: float = 30.0, memory_limit: int = None,
+                 tool_memory_limits: dict = None, tools_dir: str = None, preload: bool = True,
+                 start_method: str = "spawn"):
+        """
+        ToolProcessPoolクラスのコンストラクタ
+        ワーカーは最初の呼び出し時（またはstart()）に起動します
+
+        Args:
+            processes (int, optional): ワーカープロセス数。デフォルトはCPUのコア数
+            timeout (float, optional): 1回の呼び出しのタイムアウト（秒）。Noneの場合は無制限
+            memory_limit (int, optional): 1回の呼び出しで新たに確保できるメモリ（バイト）。Noneの場合は無制限
+                                          （仮想メモリの上限として設定するため、Linuxなどresourceモジュールが使える環境のみ）
+            tool_memory_limits (dict, optional): ツール名ごとのメモリ上限（バイト）。memory_limitより優先される
+            tools_dir (str, optional): ツールフォルダのパス。デフォルトはscripts/tools
+            preload (bool): Trueの場合、ワーカーの起動時にすべてのツールモジュールを読み込む
+            start_method (str): multiprocessingの起動方式（"spawn" / "forkserver" / "fork"）
+        """
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.tool_memory_limits = dict(tool_memory_limits or {})
+        self.tools_dir = tools_dir
+        self.preload = preload
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._started = False
+        self._stats = {"calls": 0, "timeouts": 0, "crashes": 0, "restarts": 0}
+
+    def _spawn(self):
+        """
+        ワーカープロセスを1つ起動する内部メソッド
+        """
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.tools_dir, self.preload),
+            name="tool-worker", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def start(self):
+        """
+        ワーカープロセスを起動するメソッド（最初の呼び出しを待たずに準備しておく場合に使う）
+
+        Returns:
+            ToolProcessPool: このプール
+        """
+        with self._lock:
+            if not self._started:
+                for _ in range(self.processes):
+                    worker = self._spawn()
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+                self._started = True
+        return self
+
+    def get_memory_limit(self, tool_name: str):
+        """
+        ツールのメモリ上限（バイト）を返すメソッド
+
+        Args:
+            tool_name (str): ツール名
+
+        Returns:
+            Optional[int]: メモリ上限（バイト）。Noneの場合は無制限
+        """
+        return self.tool_memory_limits.get(tool_name, self.memory_limit)
+
+    def _kill(self, worker):
+        """
+        ワーカープロセスを強制終了する内部メソッド（次に使うときに起動し直される）
+        """
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+
+    def _checkout(self):
+        """
+        空いているワーカーを取り出す内部メソッド
+        終了していたワーカーはここで起動し直します
+        """
+        worker = self._idle.get()
+        if worker.process.is_alive():
+            return worker
+        if not worker.conn.closed:
+            worker.conn.close()
+        replacement = self._spawn()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+            self._stats["restarts"] += 1
+        return replacement
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def call(self, tool_name: str, arg, subtool: str = None, timeout=_DEFAULT):
+        """
+        ツールをワーカープロセスで実行し、結果を返すメソッド
+        すべてのワーカーが使用中の場合は、空くまで待ちます
+
+        Args:
+            tool_name (str): ツール名
+            arg: ツールに渡す引数
+            subtool (str, optional): サブツール名
+            timeout (float, optional): タイムアウト（秒）。省略した場合はプールの設定、Noneの場合は無制限
+
+        Returns:
+            ツールの実行結果（タイムアウトや異常終了の場合はエラーメッセージ）
+        """
+        if not self._started:
+            self.start()
+        if timeout is _DEFAULT:
+            timeout = self.timeout
+
+        self._count("calls")
+        worker = self._checkout()
+        try:
+            try:
+                worker.conn.send((tool_name, arg, subtool, self.get_memory_limit(tool_name)))
+                ready = worker.conn.poll(timeout)
+            except (BrokenPipeError, EOFError, OSError):
+                ready = True  # 下のrecv()で異常終了として扱う
+            if not ready:
+                self._kill(worker)
+                self._count("timeouts")
+                return f"エラー: ツール '{tool_name}' の実行がタイムアウトしました"
+            try:
+                return worker.conn.recv()
+            except (EOFError, OSError):
+                self._kill(worker)
+                self._count("crashes")
+                return (f"エラー: ツール '{tool_name}' の実行中にプロセスが異常終了しました"
+                        f"（終了コード {worker.process.exitcode}）")
+        finally:
+            self._idle.put(worker)
+
+    def stats(self):
+        """
+        プールの統計情報を返すメソッド
+
+        Returns:
+            dict: processes（ワーカー数）, calls, timeouts, crashes, restarts（起動し直したワーカー数）
+        """
+        with self._lock:
+            return dict(self._stats, processes=self.processes)
+
+    def close(self):
+        """
+        すべてのワーカープロセスを終了するメソッド
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle = queue.Queue()
+            self._started = False
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=1.0)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,44 +1,498 @@
 import os
 import re
 import importlib.util
+import json
+import math
 import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .instrumentation import span
+except ImportError:
+    from instrumentation import span
 
 tools = []
 
+# <RM_AGENT_TOOL>～</RM_AGENT_TOOL> の部分を取得する正規表現
+TOOL_BLOCK_PATTERN = re.compile(r'<RM_AGENT_TOOL>(.*?)</RM_AGENT_TOOL>', re.DOTALL)
+
+# <RM_AGENT_TOOL>ブロック内の「# Cache: pure / 秒数 / never」の行を取得する正規表現
+CACHE_LINE_PATTERN = re.compile(r'^[ \t]*#?[ \t]*Cache:[ \t]*(\S*)[ \t]*\n?', re.MULTILINE | re.IGNORECASE)
+
+# デプロイ時に作成するツール一覧のファイル名（toolsフォルダに置く）
+MANIFEST_FILENAME = 'manifest.json'
+
+# ツール結果のキャッシュの設定
+CACHE_PURE = 'pure'    # 引数が同じなら結果も常に同じ（無期限にキャッシュする）
+CACHE_NEVER = 'never'  # キャッシュしない（現在時刻やユーザーへの問い合わせなど）
+
+
 def get_tool_list():
-    # toolsフォルダのファイルリストを取得する
-    tools_dir = os.path.join(os.path.dirname(__file__), 'tools')
-    files = os.listdir(tools_dir)
-    
-    # 拡張子が.pyのファイルのみをフィルタリング
-    py_files = [f for f in files if f.endswith('.py')]
-    
-    tool_descriptions = []
-    
-    # フォルダ内のpyファイルを開く
-    for py_file in py_files:
-        file_path = os.path.join(tools_dir, py_file)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-            # <RM_AGENT_TOOL>～</RM_AGENT_TOOL> の部分を取得する
-            pattern = r'<RM_AGENT_TOOL>(.*?)</RM_AGENT_TOOL>'
-            matches = re.findall(pattern, content, re.DOTALL)
-            
-            if matches:
-                tool_descriptions.append(matches[0])
-    
-    # 取得したツール説明を１つの文字列に結合して返す
-    return '\n'.join(tool_descriptions)
+    """
+    すべてのツールの説明（<RM_AGENT_TOOL>ブロック）を結合した文字列を返す関数
+    ツール一覧はレジストリにキャッシュされ、toolsフォルダが変更されない限り読み込み直しません
+
+    Returns:
+        str: ツール説明を改行で結合した文字列
+    """
+    return _registry.get_manifest().tool_list
+
+
+def scan_tools(tools_dir):
+    """
+    toolsフォルダの.pyファイルを読み込み、ツール名と説明の一覧を作成する関数
+
+    Args:
+        tools_dir (str): ツールフォルダのパス
+
+    Returns:
+        list: (ツール名, 説明) のタプルのリスト（ツール名の順）。説明がないツールの説明はNone
+    """
+    entries = []
+    for py_file in sorted(f for f in os.listdir(tools_dir) if f.endswith('.py')):
+        with open(os.path.join(tools_dir, py_file), 'r', encoding='utf-8') as f:
+            match = TOOL_BLOCK_PATTERN.search(f.read())
+        entries.append((py_file[:-3], match.group(1) if match else None))
+    return entries
+
+
+def parse_cache_policy(description):
+    """
+    ツール説明の「Cache:」の行から、結果をキャッシュする期間を取得する関数
+
+        # Cache: pure   引数が同じなら結果も同じ（無期限）
+        # Cache: 60     60秒間キャッシュする
+        # Cache: never  キャッシュしない（行がない場合も同じ）
+
+    Args:
+        description (str): <RM_AGENT_TOOL>ブロックの中身（Noneも可）
 
-def call_tool(tool_name, arg, subtool=None):
+    Returns:
+        float or None: キャッシュの有効期限（秒、pureの場合はmath.inf）。キャッシュしない場合はNone
+    """
+    match = CACHE_LINE_PATTERN.search(description or '')
+    if match is None:
+        return None
+    value = match.group(1).lower()
+    if value == CACHE_PURE:
+        return math.inf
+    try:
+        ttl = float(value)
+    except ValueError:
+        return None  # neverと未知の値はキャッシュしない
+    return ttl if ttl > 0 else None
+
+
+class ToolManifest:
+    """
+    ツール名と説明の一覧を表すクラス
+    ツール説明を結合した文字列も作成時に1回だけ組み立てます
+    （「Cache:」の行はツール結果のキャッシュの設定のため、エージェントに渡す説明からは除きます）
+    """
+
+    __slots__ = ('signature', 'tools', 'names', 'tool_list', 'cache_ttls')
+
+    def __init__(self, signature, tools):
+        """
+        ToolManifestクラスのコンストラクタ
+
+        Args:
+            signature (int): 作成時のtoolsフォルダの更新日時（ナノ秒）
+            tools (list): (ツール名, 説明) のタプルのリスト
+        """
+        self.signature = signature
+        self.tools = tuple(tools)
+        self.names = tuple(name for name, _ in self.tools)
+        # 取得したツール説明を１つの文字列に結合する
+        self.tool_list = '\n'.join(
+            CACHE_LINE_PATTERN.sub('', description) for _, description in self.tools if description is not None
+        )
+        # ツール名 -> 結果のキャッシュの有効期限（秒）。キャッシュしないツールは含まない
+        self.cache_ttls = {}
+        for name, description in self.tools:
+            ttl = parse_cache_policy(description)
+            if ttl is not None:
+                self.cache_ttls[name] = ttl
+
+
+class ToolResultCache:
+    """
+    ツールの実行結果をキャッシュするクラス
+
+    - キーは (ツール名, サブツール名, 引数) です
+    - 件数の上限を超えた場合は、最も長く使われていないエントリから削除します（LRU）
+    - 有効期限はツールごとに、取得時に指定します（ToolManifest.cache_ttls）
+    - ヒット数とミス数を記録します
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        ToolResultCacheクラスのコンストラクタ
+
+        Args:
+            max_entries (int): 保持するエントリ数の上限
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # キー -> (結果, 作成時刻)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, ttl=math.inf):
+        """
+        キャッシュから結果を取得するメソッド
+
+        Args:
+            key (tuple): (ツール名, サブツール名, 引数)
+            ttl (float): 有効期限（秒）
+
+        Returns:
+            tuple: (見つかったかどうか, 結果)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, created = entry
+                if now - created <= ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, result):
+        """
+        結果をキャッシュに保存するメソッド
+
+        Args:
+            key (tuple): (ツール名, サブツール名, 引数)
+            result: ツールの実行結果
+        """
+        with self._lock:
+            self._entries[key] = (result, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tool_name=None):
+        """
+        キャッシュを破棄するメソッド
+
+        Args:
+            tool_name (str, optional): 破棄するツール名。Noneの場合はすべて破棄する
+        """
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == tool_name]:
+                del self._entries[key]
+
+    def stats(self):
+        """
+        キャッシュの統計を返すメソッド
+
+        Returns:
+            dict: {entries, hits, misses, hit_rate}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class ToolRegistry:
+    """
+    toolsフォルダのツールモジュールを一度だけ読み込み、関数をキャッシュするクラス
+    ツール関数は (ツール名, サブツール名) をキーとして保持し、
+    ファイルの更新日時が変わった場合か、明示的にリロードした場合のみモジュールを読み込み直します
+
+    ツールの一覧（ToolManifest）もキャッシュし、toolsフォルダの更新日時が変わった場合
+    （ツールの追加・削除・置き換え）か、明示的にリロードした場合のみ作成し直します。
+    toolsフォルダにmanifest.jsonがあり、フォルダより新しい場合は、ファイルを読まずにそれを使います。
+
+    ツールの実行結果のキャッシュ（ToolResultCache）も持ち、ツールを読み込み直したときに破棄します。
+    """
+
+    def __init__(self, tools_dir=None, auto_reload=True, max_cached_results=1024):
+        """
+        ToolRegistryクラスのコンストラクタ
+
+        Args:
+            tools_dir (str, optional): ツールフォルダのパス。デフォルトはscripts/tools
+            auto_reload (bool): Trueの場合、呼び出しごとにファイルの更新日時を確認して自動でリロードする
+            max_cached_results (int): キャッシュするツールの実行結果の件数の上限
+        """
+        self.tools_dir = tools_dir or os.path.join(os.path.dirname(__file__), 'tools')
+        self.auto_reload = auto_reload
+        self.results = ToolResultCache(max_cached_results)
+        self._modules = {}    # ツール名 -> (モジュール, 更新日時)
+        self._functions = {}  # (ツール名, サブツール名) -> 関数
+        self._manifest = None
+        self._lock = threading.Lock()
+
+    def _load_module(self, tool_name, module_path, mtime):
+        """
+        ツールモジュールを読み込み、キャッシュする内部メソッド
+        """
+        # モジュールを動的にインポート
+        spec = importlib.util.spec_from_file_location(tool_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        self._modules[tool_name] = (module, mtime)
+        # 古いモジュールの関数と実行結果を破棄
+        for key in [key for key in self._functions if key[0] == tool_name]:
+            del self._functions[key]
+        self.results.invalidate(tool_name)
+        return module
+
+    def get_function(self, tool_name, subtool=None, reload=False):
+        """
+        ツール関数を取得するメソッド
+
+        Args:
+            tool_name (str): ツールのファイル名
+            subtool (str, optional): サブツール名。デフォルトはNone（tool_nameと同じ関数）
+            reload (bool): Trueの場合、キャッシュを無視してモジュールを読み込み直す
+
+        Returns:
+            callable: ツール関数
+
+        Raises:
+            ImportError: ツールが見つからない場合
+            AttributeError: ツール内に指定された関数が見つからない場合
+        """
+        key = (tool_name, subtool)
+        entry = self._modules.get(tool_name)
+
+        # 自動リロードが無効なら、読み込み済みの関数をそのまま返す
+        if entry is not None and not reload and not self.auto_reload:
+            function = self._functions.get(key)
+            if function is not None:
+                return function
+
+        with self._lock:
+            module_path = os.path.join(self.tools_dir, f"{tool_name}.py")
+
+            # モジュールが存在するか確認し、更新日時を取得
+            try:
+                mtime = os.stat(module_path).st_mtime_ns
+            except FileNotFoundError:
+                self.invalidate(tool_name)
+                raise ImportError(f"ツール '{tool_name}' が見つかりません")
+
+            entry = self._modules.get(tool_name)
+            if reload or entry is None or entry[1] != mtime:
+                module = self._load_module(tool_name, module_path, mtime)
+            else:
+                module = entry[0]
+
+            function = self._functions.get(key)
+            if function is None:
+                # サブツールが指定されていない場合は、tool_nameと同じ関数を呼び出す
+                function_name = subtool if subtool else tool_name
+
+                # ツール関数を取得
+                if not hasattr(module, function_name):
+                    raise AttributeError(f"ツール '{tool_name}' に関数 '{function_name}' が見つかりません")
+                function = getattr(module, function_name)
+                self._functions[key] = function
+            return function
+
+    def cache_ttl(self, tool_name):
+        """
+        ツールの実行結果をキャッシュする期間を返すメソッド
+
+        Args:
+            tool_name (str): ツール名
+
+        Returns:
+            float or None: 有効期限（秒、pureの場合はmath.inf）。キャッシュしない場合はNone
+        """
+        return self.get_manifest().cache_ttls.get(tool_name)
+
+    def list_tools(self):
+        """
+        toolsフォルダにあるツール名の一覧を返すメソッド
+
+        Returns:
+            list: ツール名（拡張子を除いたファイル名）のリスト
+        """
+        return list(self.get_manifest().names)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.tools_dir, MANIFEST_FILENAME)
+
+    def get_manifest(self):
+        """
+        ツールの一覧を取得するメソッド
+        toolsフォルダの更新日時だけを確認し、変わっていなければキャッシュを返します
+        （ツールファイルをその場で書き換えた場合はreload_tools()で作り直してください）
+
+        Returns:
+            ToolManifest: ツールの一覧
+        """
+        signature = os.stat(self.tools_dir).st_mtime_ns
+        manifest = self._manifest
+        if manifest is not None and manifest.signature == signature:
+            return manifest
+
+        with self._lock:
+            manifest = self._manifest
+            if manifest is None or manifest.signature != signature:
+                manifest = self._load_manifest_file(signature)
+                if manifest is None:
+                    manifest = ToolManifest(signature, scan_tools(self.tools_dir))
+                self._manifest = manifest
+            return manifest
+
+    def _load_manifest_file(self, signature):
+        """
+        デプロイ時に作成したmanifest.jsonを読み込む内部メソッド
+        ファイルがない場合や、作成後にtoolsフォルダが変更された場合はNoneを返します
+        """
+        try:
+            if os.stat(self.manifest_path).st_mtime_ns < signature:
+                return None
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return ToolManifest(signature, [(tool['name'], tool.get('description')) for tool in data['tools']])
+
+    def build_manifest(self):
+        """
+        toolsフォルダを読み込んでmanifest.jsonを作成するメソッド（デプロイ時に実行する）
+
+        Returns:
+            str: 作成したファイルのパス
+        """
+        data = {'tools': [
+            {'name': name, 'description': description} for name, description in scan_tools(self.tools_dir)
+        ]}
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        with self._lock:
+            self._manifest = None
+        return self.manifest_path
+
+    def invalidate(self, tool_name=None):
+        """
+        キャッシュを破棄するメソッド（次回の呼び出し時に読み込み直される）
+
+        Args:
+            tool_name (str, optional): 破棄するツール名。Noneの場合はすべて破棄する
+        """
+        # ツールの説明も変わっている可能性があるため、一覧は常に作り直す
+        self._manifest = None
+        self.results.invalidate(tool_name)
+        if tool_name is None:
+            self._modules.clear()
+            self._functions.clear()
+            return
+        self._modules.pop(tool_name, None)
+        for key in [key for key in self._functions if key[0] == tool_name]:
+            del self._functions[key]
+
+
+# プロセス全体で共有するツールレジストリ
+_registry = ToolRegistry()
+
+
+def get_registry():
+    """
+    共有のツールレジストリを取得する関数
+
+    Returns:
+        ToolRegistry: ツールレジストリ
+    """
+    return _registry
+
+
+def get_tool_names():
+    """
+    呼び出し可能なツール名の一覧を返す関数
+
+    Returns:
+        list: ツール名のリスト
+    """
+    return _registry.list_tools()
+
+
+def reload_tools(tool_name=None):
+    """
+    ツールを明示的にリロードする関数（ホットリロード）
+
+    Args:
+        tool_name (str, optional): リロードするツール名。Noneの場合はすべてのツール
+    """
+    with _registry._lock:
+        _registry.invalidate(tool_name)
+
+
+def _is_error(result):
+    # call_toolはツールのエラーを「エラー: 」で始まる文字列で返す
+    return isinstance(result, str) and result.startswith("エラー: ")
+
+
+def call_cached(tool_name, arg, subtool, call, registry=None):
+    """
+    ツールの実行結果のキャッシュを確認し、なければcallを呼び出して結果を保存する関数
+    ツール説明の「Cache:」でキャッシュが有効になっているツールだけが対象で、エラーの結果は保存しません
+
+    Args:
+        tool_name (str): ツール名
+        arg: ツールに渡す引数
+        subtool (str, optional): サブツール名
+        call (callable): 引数なしでツールを実行し、結果を返す関数
+        registry (ToolRegistry, optional): キャッシュを持つレジストリ。デフォルトは共有のレジストリ
+
+    Returns:
+        ツールの実行結果
+    """
+    registry = registry or _registry
+    try:
+        ttl = registry.cache_ttl(tool_name)
+        key = (tool_name, subtool, arg)
+        hash(key)
+    except (OSError, TypeError):
+        # ツールフォルダが読めない場合や、引数がキーにできない場合はキャッシュしない
+        ttl = None
+    if ttl is None:
+        return call()
+
+    found, result = registry.results.get(key, ttl)
+    if found:
+        return result
+    result = call()
+    if not _is_error(result):
+        registry.results.set(key, result)
+    return result
+
+
+def call_tool(tool_name, arg, subtool=None, reload=False, registry=None, use_cache=True):
     """
     指定されたツール名に対応するツールを呼び出し、引数を渡して結果を返す関数
+    ツール関数はレジストリにキャッシュされ、ファイルが更新されない限り再読み込みしません
+    ツール説明で「Cache: pure」または「Cache: 秒数」を指定したツールは、同じ引数の結果をキャッシュから返します
     
     Args:
         tool_name (str): 呼び出すツールのファイル名
         arg: ツールに渡す引数
         subtool (str, optional): 呼び出すサブツール名。デフォルトはNone（tool_nameと同じ関数を呼び出す）
+        reload (bool): Trueの場合、ツールモジュールを読み込み直してから呼び出す
+        registry (ToolRegistry, optional): ツールを取得するレジストリ。デフォルトは共有のレジストリ
+        use_cache (bool): Falseの場合、実行結果のキャッシュを使わない
         
     Returns:
         ツールの実行結果
@@ -48,39 +502,38 @@ def call_tool(tool_name, arg, subtool=None):
         AttributeError: ツール内に指定された関数が見つからない場合
         Exception: ツールの実行中にエラーが発生した場合
     """
+    registry = registry or _registry
+    if reload or not use_cache:
+        return _call_tool(tool_name, arg, subtool, reload, registry)
+    return call_cached(tool_name, arg, subtool, lambda: _call_tool(tool_name, arg, subtool, reload, registry),
+                       registry)
+
+
+def _call_tool(tool_name, arg, subtool, reload, registry):
+    """
+    ツールを実行する内部関数（エラーは「エラー: 」で始まる文字列で返す）
+    """
     try:
-        # ツールのパスを構築
-        tools_dir = os.path.join(os.path.dirname(__file__), 'tools')
-        module_path = os.path.join(tools_dir, f"{tool_name}.py")
-        
-        # モジュールが存在するか確認
-        if not os.path.exists(module_path):
-            raise ImportError(f"ツール '{tool_name}' が見つかりません")
-        
-        # モジュールを動的にインポート
-        spec = importlib.util.spec_from_file_location(tool_name, module_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        # サブツールが指定されていない場合は、tool_nameと同じ関数を呼び出す
-        function_name = subtool if subtool else tool_name
-        
         # ツール関数を取得
-        if not hasattr(module, function_name):
-            raise AttributeError(f"ツール '{tool_name}' に関数 '{function_name}' が見つかりません")
-        
-        tool_function = getattr(module, function_name)
+        tool_function = registry.get_function(tool_name, subtool, reload=reload)
         
         # ツール関数を実行
-        return tool_function(arg)
+        with span("tool.call", tool=tool_name, subtool=subtool):
+            return tool_function(arg)
         
     except ImportError as e:
         return f"エラー: {str(e)}"
     except AttributeError as e:
         return f"エラー: {str(e)}"
+    except MemoryError:
+        return f"エラー: ツール '{tool_name}' の実行中にメモリが不足しました"
     except Exception as e:
         return f"エラー: ツール '{tool_name}' の実行中にエラーが発生しました: {str(e)}"
 
 if __name__ == "__main__":
-    time_str = call_tool('gettime', None)
-    print(time_str)
+    # デプロイ時: python scripts/tool_router.py --build-manifest
+    if '--build-manifest' in sys.argv[1:]:
+        print(f"{_registry.build_manifest()} を作成しました。")
+    else:
+        time_str = call_tool('gettime', None)
+        print(time_str)
@@ -3,6 +3,7 @@
 # Description: ユーザーに質問や会話をするためのツールです。
 # Input: ユーザーに対する質問の文
 # Output: ユーザーからの回答
+# Cache: never
 # </RM_AGENT_TOOL>
 
 def ask_user(arg):
@@ -3,6 +3,7 @@
 # Description: 現在時刻を取得します。
 # Input: None
 # Output: 現在時刻
+# Cache: never
 # </RM_AGENT_TOOL>
 
 def gettime(arg):
@@ -6,6 +6,7 @@
 #   - anothername: 別名義を返します
 # Input: None
 # Output: エージェントの名前
+# Cache: pure
 # </RM_AGENT_TOOL>
 
 def myname(arg):